@@ -1,12 +1,29 @@
-from typing import List, Optional
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from llm_utils import call_llm, parse_json_from_llm
+from fast_meal_plan import build_meal_plan, dish_key, rank_foods
+from fast_workout_plan import build_workout_plan
+from food_image import image_results
+from food_retrieval import food_table_for_diet, is_food_allowed
+from job_queue import job_kind, job_queue
+from llm_cache import cache_bypass
+from llm_utils import call_llm_json_async, llm_http_error, llm_metrics, stream_llm_json_async
+from plan_templates import (PLAN_TEMPLATE_KCAL_STEP, PLAN_TEMPLATE_MINUTES_STEP, bucket_calories,
+                            bucket_minutes, meal_bucket, plan_templates, rescale_meal_plan,
+                            rescale_workout_plan, workout_bucket)
 
 router = APIRouter(prefix="/api/ai", tags=["ai-planner"])
 
+# mode=llm 调大模型；mode=fast 本地规则生成，毫秒级返回。
+# 大模型调用失败时也用本地结果兜底，响应头 X-Plan-Source 标明来源：llm / fast / fallback
+PLAN_MODE = Query("llm", pattern="^(llm|fast)$", description="llm: 大模型生成；fast: 本地规则生成")
+
 
 # ========= 数据模型 =========
 
@@ -25,7 +42,7 @@ class BodyProfile(BaseModel):
 
 class DietPreferences(BaseModel):
     goal: str = Field(..., description="lose / gain / maintain")
-    calories_budget: int
+    calories_budget: int = Field(..., gt=0, description="每日热量预算 kcal")
     diet_type: str = "none"          # none / vegetarian / vegan / low-carb ...
     restrictions: List[str] = []
     tastes: List[str] = []
@@ -82,33 +99,38 @@ class WorkoutPlanResponse(BaseModel):
     sessions: List[WorkoutSession]
 
 
-FOOD_SHORT_TABLE = """
-以下是一些常见食物的大致热量信息（每 100g 或一份）：
-- 燕麦片: 389 kcal
-- 鸡胸肉: 165 kcal
-- 三文鱼: 208 kcal
-- 鸡蛋: 155 kcal
-- 牛油果: 160 kcal
-- 西兰花: 34 kcal
-- 西红柿: 18 kcal
-- 糙米饭: 111 kcal
-- 苹果: 52 kcal
-- 香蕉: 89 kcal
-- 希腊酸奶: 59 kcal
-- 豆腐: 76 kcal
-- 虾仁: 99 kcal
-- 土豆: 77 kcal
-- 西兰花炒鸡胸（家常做法，一份约）: 260-320 kcal
-- 鸡胸肉沙拉（去皮）: 250-350 kcal
-"""
+class WeeklyPlanRequest(BaseModel):
+    profile: BodyProfile
+    diet: Optional[DietPreferences] = None          # 不传则不生成食谱
+    workout: Optional[WorkoutPreferences] = None    # 不传则不生成训练
+
+
+class DayMealPlan(BaseModel):
+    day: str
+    status: str        # llm / fast / fallback / timeout / error
+    plan: Optional[MealPlanResponse] = None
+
+
+class DayWorkoutPlan(BaseModel):
+    day: str
+    focus: str         # upper / lower / core
+    status: str
+    plan: Optional[WorkoutPlanResponse] = None
+
+
+class WeeklyPlanResponse(BaseModel):
+    meal_days: List[DayMealPlan] = []
+    workout_days: List[DayWorkoutPlan] = []
+    complete: bool     # 有任何一天超时 / 失败时为 False
 
 
 # ========= 食谱推荐 =========
 
-@router.post("/meal-plan", response_model=MealPlanResponse)
-def generate_meal_plan(req: MealPlanRequest):
+def _meal_prompts(req: MealPlanRequest) -> Tuple[str, str]:
     profile = req.profile
     prefs = req.preferences
+    # 按饮食类型 / 禁忌 / 目标挑出的常见食材，条数和 token 都有上限
+    food_table = food_table_for_diet(prefs.diet_type, prefs.restrictions, prefs.goal, prefs.tastes)
 
     system_prompt = (
         "你是一名专业的运动营养师，请为用户规划一整天的饮食方案（早餐、午餐、晚餐、加餐）。"
@@ -142,32 +164,27 @@ def generate_meal_plan(req: MealPlanRequest):
 要求：
 1. 必须包含 早餐、午餐、晚餐、加餐 四顿。
 2. 总热量尽量接近用户预算。
-3. 优先使用下面表格里的常见食材，便于用户估算：
+3. 优先使用下面表格里的常见食材（每 100g / 100ml 热量），便于用户估算：
 
-{FOOD_SHORT_TABLE}
+{food_table}
 
 4. 避开饮食禁忌，考虑饮食类型（素食等）。
 """
+    return system_prompt, user_prompt
+
+
+def _to_meal_item(m: dict, prefs: DietPreferences) -> MealItem:
+    return MealItem(
+        meal_type=m.get("meal_type", "早餐"),
+        name=m.get("name", "健康餐"),
+        calories=int(m.get("calories", prefs.calories_budget // 4)),
+        tags=m.get("tags", []),
+        description=m.get("description", ""),
+        suggestion=m.get("suggestion", ""),
+    )
 
-    try:
-        raw = call_llm(system_prompt, user_prompt)
-        data = parse_json_from_llm(raw)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"LLM 调用失败: {e}")
-
-    meals: List[MealItem] = []
-    for m in data.get("meals", []):
-        meals.append(
-            MealItem(
-                meal_type=m.get("meal_type", "早餐"),
-                name=m.get("name", "健康餐"),
-                calories=int(m.get("calories", prefs.calories_budget // 4)),
-                tags=m.get("tags", []),
-                description=m.get("description", ""),
-                suggestion=m.get("suggestion", ""),
-            )
-        )
 
+def _to_meal_plan(data: dict, meals: List[MealItem], prefs: DietPreferences) -> MealPlanResponse:
     return MealPlanResponse(
         daily_calorie_target=int(data.get("daily_calorie_target", prefs.calories_budget)),
         goal=data.get("goal", prefs.goal),
@@ -175,10 +192,102 @@ def generate_meal_plan(req: MealPlanRequest):
     )
 
 
+def _parse_meal_plan(data: dict, prefs: DietPreferences) -> MealPlanResponse:
+    """整体解析结果转成 MealPlanResponse，格式不对时抛异常，由 call_llm_json_async 重新请求。"""
+    meals = [_to_meal_item(m, prefs) for m in data["meals"]]
+    if not meals:
+        raise ValueError("meals 为空")
+    return _to_meal_plan(data, meals, prefs)
+
+
+def _fast_meal_plan(req: MealPlanRequest, avoid=(), exclude=()) -> MealPlanResponse:
+    """本地生成；avoid / exclude 见 build_meal_plan（一周计划里用来避免重复）。"""
+    prefs = req.preferences
+    try:
+        data = build_meal_plan(prefs.calories_budget, prefs.goal, prefs.diet_type,
+                               prefs.restrictions, prefs.tastes, weight_kg=req.profile.weight,
+                               avoid=avoid, exclude=exclude)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return _parse_meal_plan(data, prefs)
+
+
+@router.post("/meal-plan", response_model=MealPlanResponse)
+async def generate_meal_plan(req: MealPlanRequest, response: Response, mode: str = PLAN_MODE,
+                             bypass_cache: bool = Depends(cache_bypass)):
+    if mode == "fast":
+        response.headers["X-Plan-Source"] = "fast"
+        return _fast_meal_plan(req)
+
+    template = _meal_template(req, bypass_cache)
+    if template is not None:
+        response.headers["X-Plan-Source"] = "template"
+        return template
+
+    system_prompt, user_prompt = _meal_prompts(req)
+    try:
+        plan = await call_llm_json_async(
+            system_prompt, user_prompt, use_cache=not bypass_cache, endpoint="meal-plan",
+            validate=lambda data: _parse_meal_plan(data, req.preferences),
+        )
+    except Exception as e:
+        # 大模型不可用：返回本地生成的食谱，本地也生成不了再报原来的错
+        try:
+            plan = _fast_meal_plan(req)
+        except HTTPException:
+            raise llm_http_error(e)
+        response.headers["X-Plan-Source"] = "fallback"
+        return plan
+    _save_meal_template(req, plan)
+    response.headers["X-Plan-Source"] = "llm"
+    return plan
+
+
+@router.post("/meal-plan/stream")
+async def stream_meal_plan(req: MealPlanRequest, bypass_cache: bool = Depends(cache_bypass)):
+    """
+    流式版本（text/event-stream）：每生成完一顿饭就推送一个 `meal` 事件，
+    最后推送 `done` 事件（完整的 MealPlanResponse）；出错时推送 `error` 事件。
+    """
+    system_prompt, user_prompt = _meal_prompts(req)
+    template = _meal_template(req, bypass_cache)
+
+    async def events() -> AsyncIterator[str]:
+        if template is not None:
+            for meal in template.meals:
+                yield _sse("meal", meal.model_dump())
+            yield _sse("done", template.model_dump())
+            return
+
+        meals: List[MealItem] = []
+        try:
+            async for kind, obj in stream_llm_json_async(
+                system_prompt, user_prompt, "meals", use_cache=not bypass_cache, endpoint="meal-plan"
+            ):
+                if kind == "item":
+                    meal = _to_meal_item(obj, req.preferences)
+                    meals.append(meal)
+                    yield _sse("meal", meal.model_dump())
+                else:
+                    plan = _to_meal_plan(obj, meals, req.preferences)
+                    if meals:
+                        _save_meal_template(req, plan)
+                    yield _sse("done", plan.model_dump())
+        except Exception:
+            # 还没推送任何一顿时大模型出错：改推本地生成的食谱
+            if meals:
+                raise
+            plan = _fast_meal_plan(req)
+            for meal in plan.meals:
+                yield _sse("meal", meal.model_dump())
+            yield _sse("done", plan.model_dump())
+
+    return _sse_response(events())
+
+
 # ========= 运动计划 =========
 
-@router.post("/workout-plan", response_model=WorkoutPlanResponse)
-def generate_workout_plan(req: WorkoutPlanRequest):
+def _workout_prompts(req: WorkoutPlanRequest) -> Tuple[str, str]:
     profile = req.profile
     prefs = req.preferences
 
@@ -216,37 +325,427 @@ def generate_workout_plan(req: WorkoutPlanRequest):
 3. 每个 session 给出 3-6 个具体动作名称。
 4. target_heart_rate 用区间字符串表示，例如 "120-140 bpm"。
 """
+    return system_prompt, user_prompt
+
+
+def _to_workout_session(s: dict, prefs: WorkoutPreferences) -> WorkoutSession:
+    return WorkoutSession(
+        name=s.get("name", "训练小节"),
+        type=s.get("type", "cardio"),
+        duration_minutes=int(s.get("duration_minutes", prefs.available_minutes // 3)),
+        intensity=s.get("intensity", "medium"),
+        target_heart_rate=s.get("target_heart_rate"),
+        description=s.get("description", ""),
+        exercises=s.get("exercises", []),
+        tips=s.get("tips", ""),
+    )
 
-    try:
-        raw = call_llm(system_prompt, user_prompt)
-        data = parse_json_from_llm(raw)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"LLM 调用失败: {e}")
-
-    sessions: List[WorkoutSession] = []
-    total_duration = 0
-
-    for s in data.get("sessions", []):
-        duration = int(s.get("duration_minutes", prefs.available_minutes // 3))
-        total_duration += duration
-        sessions.append(
-            WorkoutSession(
-                name=s.get("name", "训练小节"),
-                type=s.get("type", "cardio"),
-                duration_minutes=duration,
-                intensity=s.get("intensity", "medium"),
-                target_heart_rate=s.get("target_heart_rate"),
-                description=s.get("description", ""),
-                exercises=s.get("exercises", []),
-                tips=s.get("tips", ""),
-            )
-        )
-
-    total_duration = int(data.get("total_duration", total_duration))
 
+def _to_workout_plan(data: dict, sessions: List[WorkoutSession],
+                     prefs: WorkoutPreferences) -> WorkoutPlanResponse:
+    total_duration = sum(s.duration_minutes for s in sessions)
     return WorkoutPlanResponse(
         day=data.get("day", "今天"),
         goal=data.get("goal", prefs.goal),
-        total_duration=total_duration,
+        total_duration=int(data.get("total_duration", total_duration)),
         sessions=sessions,
     )
+
+
+def _parse_workout_plan(data: dict, prefs: WorkoutPreferences) -> WorkoutPlanResponse:
+    sessions = [_to_workout_session(s, prefs) for s in data["sessions"]]
+    if not sessions:
+        raise ValueError("sessions 为空")
+    return _to_workout_plan(data, sessions, prefs)
+
+
+def _fast_workout_plan(req: WorkoutPlanRequest) -> WorkoutPlanResponse:
+    prefs = req.preferences
+    data = build_workout_plan(req.profile.age, prefs.goal, prefs.available_minutes,
+                              prefs.equipment, prefs.limitations)
+    return _parse_workout_plan(data, prefs)
+
+
+@router.post("/workout-plan", response_model=WorkoutPlanResponse)
+async def generate_workout_plan(req: WorkoutPlanRequest, response: Response, mode: str = PLAN_MODE,
+                                bypass_cache: bool = Depends(cache_bypass)):
+    if mode == "fast":
+        response.headers["X-Plan-Source"] = "fast"
+        return _fast_workout_plan(req)
+
+    template = _workout_template(req, bypass_cache)
+    if template is not None:
+        response.headers["X-Plan-Source"] = "template"
+        return template
+
+    system_prompt, user_prompt = _workout_prompts(req)
+    try:
+        plan = await call_llm_json_async(
+            system_prompt, user_prompt, use_cache=not bypass_cache, endpoint="workout-plan",
+            validate=lambda data: _parse_workout_plan(data, req.preferences),
+        )
+    except Exception:
+        # 大模型不可用：返回按规则生成的训练
+        response.headers["X-Plan-Source"] = "fallback"
+        return _fast_workout_plan(req)
+    _save_workout_template(req, plan)
+    response.headers["X-Plan-Source"] = "llm"
+    return plan
+
+
+@router.post("/workout-plan/stream")
+async def stream_workout_plan(req: WorkoutPlanRequest, bypass_cache: bool = Depends(cache_bypass)):
+    """流式版本：每个 session 生成完就推送一个 `session` 事件，最后推送 `done` 事件。"""
+    system_prompt, user_prompt = _workout_prompts(req)
+    template = _workout_template(req, bypass_cache)
+
+    async def events() -> AsyncIterator[str]:
+        if template is not None:
+            for session in template.sessions:
+                yield _sse("session", session.model_dump())
+            yield _sse("done", template.model_dump())
+            return
+
+        sessions: List[WorkoutSession] = []
+        try:
+            async for kind, obj in stream_llm_json_async(
+                system_prompt, user_prompt, "sessions", use_cache=not bypass_cache, endpoint="workout-plan"
+            ):
+                if kind == "item":
+                    session = _to_workout_session(obj, req.preferences)
+                    sessions.append(session)
+                    yield _sse("session", session.model_dump())
+                else:
+                    plan = _to_workout_plan(obj, sessions, req.preferences)
+                    if sessions:
+                        _save_workout_template(req, plan)
+                    yield _sse("done", plan.model_dump())
+        except Exception:
+            if sessions:
+                raise
+            plan = _fast_workout_plan(req)
+            for session in plan.sessions:
+                yield _sse("session", session.model_dump())
+            yield _sse("done", plan.model_dump())
+
+    return _sse_response(events())
+
+
+# ========= 计划模板 =========
+# 同一个桶（见 plan_templates）里生成过的计划直接缩放复用；
+# 新生成的计划存为模板，PLAN_TEMPLATE_PREFILL 打开时还在后台生成相邻的桶
+
+def _meal_template(req: MealPlanRequest, bypass_cache: bool) -> Optional[MealPlanResponse]:
+    if bypass_cache:
+        return None
+    template = plan_templates.get(meal_bucket(req.profile, req.preferences))
+    if template is None:
+        return None
+    return MealPlanResponse(**rescale_meal_plan(template, req.preferences.calories_budget))
+
+
+def _save_meal_template(req: MealPlanRequest, plan: MealPlanResponse) -> None:
+    plan_templates.put(meal_bucket(req.profile, req.preferences), plan.model_dump())
+    center = bucket_calories(req.preferences.calories_budget)
+    for calories in (center - PLAN_TEMPLATE_KCAL_STEP, center + PLAN_TEMPLATE_KCAL_STEP):
+        if calories <= 0:
+            continue
+        neighbor = MealPlanRequest(
+            profile=req.profile,
+            preferences=req.preferences.model_copy(update={"calories_budget": calories}),
+        )
+        plan_templates.fill_in_background(
+            meal_bucket(neighbor.profile, neighbor.preferences),
+            lambda neighbor=neighbor: _generate_meal_template(neighbor),
+        )
+
+
+async def _generate_meal_template(req: MealPlanRequest) -> dict:
+    system_prompt, user_prompt = _meal_prompts(req)
+    plan = await call_llm_json_async(
+        system_prompt, user_prompt, endpoint="meal-plan",
+        validate=lambda data: _parse_meal_plan(data, req.preferences),
+    )
+    return plan.model_dump()
+
+
+def _workout_template(req: WorkoutPlanRequest, bypass_cache: bool) -> Optional[WorkoutPlanResponse]:
+    if bypass_cache:
+        return None
+    template = plan_templates.get(workout_bucket(req.profile, req.preferences))
+    if template is None:
+        return None
+    return WorkoutPlanResponse(**rescale_workout_plan(template, req.preferences.available_minutes))
+
+
+def _save_workout_template(req: WorkoutPlanRequest, plan: WorkoutPlanResponse) -> None:
+    plan_templates.put(workout_bucket(req.profile, req.preferences), plan.model_dump())
+    center = bucket_minutes(req.preferences.available_minutes)
+    for minutes in (center - PLAN_TEMPLATE_MINUTES_STEP, center + PLAN_TEMPLATE_MINUTES_STEP):
+        if minutes <= 0:
+            continue
+        neighbor = WorkoutPlanRequest(
+            profile=req.profile,
+            preferences=req.preferences.model_copy(update={"available_minutes": minutes}),
+        )
+        plan_templates.fill_in_background(
+            workout_bucket(neighbor.profile, neighbor.preferences),
+            lambda neighbor=neighbor: _generate_workout_template(neighbor),
+        )
+
+
+async def _generate_workout_template(req: WorkoutPlanRequest) -> dict:
+    system_prompt, user_prompt = _workout_prompts(req)
+    plan = await call_llm_json_async(
+        system_prompt, user_prompt, endpoint="workout-plan",
+        validate=lambda data: _parse_workout_plan(data, req.preferences),
+    )
+    return plan.model_dump()
+
+
+# ========= 一周计划 =========
+# 每天一个大模型调用，全部并发发出（仍受 llm_limiter 的全局并发上限约束），
+# 总耗时约等于最慢的一天，而不是 7 天相加。WEEKLY_PLAN_TIMEOUT 秒内没生成完的天
+# 标记为 timeout、plan 为空，其余照常返回；单天调用失败时用本地规则生成的计划代替。
+
+WEEKLY_PLAN_TIMEOUT = float(os.getenv("WEEKLY_PLAN_TIMEOUT", "60"))
+WEEKDAYS = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+# 每周训练 n 天时排在哪几天，尽量隔天
+TRAINING_DAYS = {
+    1: (0,), 2: (0, 3), 3: (0, 2, 4), 4: (0, 1, 3, 4),
+    5: (0, 1, 2, 4, 5), 6: (0, 1, 2, 3, 4, 5), 7: (0, 1, 2, 3, 4, 5, 6),
+}
+# 相邻训练日轮换训练部位
+FOCUS_ROTATION = {"gain": ("upper", "lower"), "default": ("lower", "upper", "core")}
+FOCUS_LABELS = {"upper": "上肢", "lower": "下肢", "core": "核心", "full": "全身"}
+# 每天午餐 / 晚餐主菜的蛋白质来源轮换，按饮食类型和禁忌过滤
+PROTEIN_THEMES = ("鸡肉", "鱼虾", "牛肉", "豆腐豆制品", "鸡蛋", "猪瘦肉", "菌菇杂豆")
+MAIN_MEALS = ("午餐", "晚餐")
+
+
+def _day_themes(prefs: DietPreferences) -> List[Optional[str]]:
+    themes = [t for t in PROTEIN_THEMES
+              if is_food_allowed({"cn_name": t, "category": ""}, prefs.diet_type, prefs.restrictions)]
+    return [themes[i % len(themes)] if themes else None for i in range(len(WEEKDAYS))]
+
+
+def _day_focuses(prefs: WorkoutPreferences) -> List[Tuple[int, str]]:
+    days = TRAINING_DAYS[max(1, min(7, prefs.frequency_per_week))]
+    rotation = FOCUS_ROTATION.get(prefs.goal, FOCUS_ROTATION["default"])
+    return [(day, rotation[i % len(rotation)]) for i, day in enumerate(days)]
+
+
+LOCAL_AVOID_DAYS = 2     # 本地生成时尽量避开前几天用过的食材
+
+
+def _local_meal_week(req: MealPlanRequest) -> List[MealPlanResponse]:
+    """
+    本地生成 7 天食谱：每天尽量避开前 LOCAL_AVOID_DAYS 天用过的食材，
+    午餐 / 晚餐不用前面几天出现过的主菜。
+    """
+    prefs = req.preferences
+    plans, recent, seen = [], [], set()
+    # 过滤、排序整张食物表只做一次，7 天共用
+    ranked = rank_foods(prefs.diet_type, prefs.restrictions, prefs.goal, prefs.tastes)
+    for _ in WEEKDAYS:
+        avoid = [i for ids in recent[-LOCAL_AVOID_DAYS:] for i in ids]
+        data = build_meal_plan(prefs.calories_budget, prefs.goal, prefs.diet_type, prefs.restrictions,
+                               prefs.tastes, weight_kg=req.profile.weight, avoid=avoid, exclude=seen,
+                               ranked=ranked)
+        recent.append([i for m in data["meals"] for i in m["food_ids"]])
+        seen.update(dish_key(m["name"]) for m in data["meals"] if m["meal_type"] in MAIN_MEALS)
+        plans.append(_parse_meal_plan(data, prefs))
+    return plans
+
+
+def _local_workout_day(req: WorkoutPlanRequest, day: int, focus: str) -> WorkoutPlanResponse:
+    prefs = req.preferences
+    data = build_workout_plan(req.profile.age, prefs.goal, prefs.available_minutes, prefs.equipment,
+                              prefs.limitations, focus=focus, day=WEEKDAYS[day])
+    return _parse_workout_plan(data, prefs)
+
+
+async def _llm_meal_day(req: MealPlanRequest, day: int, theme: Optional[str], use_cache: bool,
+                        local_day: Callable[[int], MealPlanResponse]):
+    system_prompt, user_prompt = _meal_prompts(req)
+    user_prompt += f"5. 这是一周计划中的{WEEKDAYS[day]}，菜名要具体，避免家常套餐式的重复。\n"
+    if theme:
+        user_prompt += f"6. 今天午餐和晚餐的主菜以「{theme}」为主要蛋白质来源。\n"
+    try:
+        return "llm", await call_llm_json_async(
+            system_prompt, user_prompt, use_cache=use_cache, endpoint="meal-plan",
+            validate=lambda data: _parse_meal_plan(data, req.preferences),
+        )
+    except Exception:
+        # 用本地一周计划里的同一天，几天同时失败时也不会是同一份
+        return "fallback", local_day(day)
+
+
+async def _llm_workout_day(req: WorkoutPlanRequest, day: int, focus: str, use_cache: bool):
+    system_prompt, user_prompt = _workout_prompts(req)
+    user_prompt += (f"5. 这是一周计划中的{WEEKDAYS[day]}，今天主训练重点练{FOCUS_LABELS[focus]}，"
+                    "与前后训练日错开训练部位。\n")
+    try:
+        plan = await call_llm_json_async(
+            system_prompt, user_prompt, use_cache=use_cache, endpoint="workout-plan",
+            validate=lambda data: _parse_workout_plan(data, req.preferences),
+        )
+    except Exception:
+        return "fallback", _local_workout_day(req, day, focus)
+    plan.day = WEEKDAYS[day]
+    return "llm", plan
+
+
+async def _fan_out(jobs: Dict[str, Callable[[], Awaitable[tuple]]], timeout: float) -> Dict[str, tuple]:
+    """并发执行所有任务，timeout 秒后没完成的取消，结果记为 ("timeout", None)。"""
+    tasks = {key: asyncio.ensure_future(job()) for key, job in jobs.items()}
+    if not tasks:
+        return {}
+    _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    results = {}
+    for key, task in tasks.items():
+        if task in pending:
+            results[key] = ("timeout", None)
+        elif task.exception() is not None:
+            results[key] = ("error", None)
+        else:
+            results[key] = task.result()
+    return results
+
+
+def _dedupe_main_dishes(days: List[DayMealPlan], req: MealPlanRequest) -> None:
+    """
+    同一道午餐 / 晚餐主菜在一周里出现第二次时，本地重新生成一份（exclude 掉已出现的主菜），
+    换上同一餐次。
+    """
+    seen = set()
+    for day in days:
+        if day.plan is None:
+            continue
+        for j, meal in enumerate(day.plan.meals):
+            if meal.meal_type not in MAIN_MEALS:
+                continue
+            key = dish_key(meal.name)
+            if key in seen:
+                try:
+                    fresh = _fast_meal_plan(req, exclude=seen)
+                except HTTPException:
+                    # 本地也生成不出来（例如忌口排除了所有食材），只能保留重复的这道
+                    seen.add(key)
+                    continue
+                replacement = next((m for m in fresh.meals if m.meal_type == meal.meal_type), None)
+                if replacement is not None:
+                    meal = day.plan.meals[j] = replacement
+                    key = dish_key(meal.name)
+            seen.add(key)
+
+
+@router.post("/weekly-plan", response_model=WeeklyPlanResponse)
+async def generate_weekly_plan(req: WeeklyPlanRequest, mode: str = PLAN_MODE,
+                               bypass_cache: bool = Depends(cache_bypass)):
+    """
+    一周的食谱（7 天）和训练（frequency_per_week 天）。
+    相邻训练日轮换训练部位，每天主菜轮换蛋白质来源，合并后重复的主菜换掉。
+    """
+    if req.diet is None and req.workout is None:
+        raise HTTPException(status_code=422, detail="diet 和 workout 至少提供一个")
+    meal_req = MealPlanRequest(profile=req.profile, preferences=req.diet) if req.diet else None
+    workout_req = WorkoutPlanRequest(profile=req.profile, preferences=req.workout) if req.workout else None
+    focuses = _day_focuses(req.workout) if req.workout else []
+
+    if mode == "fast":
+        try:
+            meal_week = _local_meal_week(meal_req) if meal_req else []
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        meal_days = [DayMealPlan(day=WEEKDAYS[i], status="fast", plan=plan) for i, plan in enumerate(meal_week)]
+        if meal_req:
+            _dedupe_main_dishes(meal_days, meal_req)
+        workout_days = [DayWorkoutPlan(day=WEEKDAYS[d], focus=f, status="fast",
+                                       plan=_local_workout_day(workout_req, d, f)) for d, f in focuses]
+        return WeeklyPlanResponse(meal_days=meal_days, workout_days=workout_days, complete=True)
+
+    use_cache = not bypass_cache
+    jobs: Dict[str, Callable[[], Awaitable[tuple]]] = {}
+    if meal_req:
+        local_week: List[MealPlanResponse] = []
+
+        def local_day(i: int) -> MealPlanResponse:
+            # 有一天回退时才生成本地一周，多天回退共用同一份
+            if not local_week:
+                local_week.extend(_local_meal_week(meal_req))
+            return local_week[i]
+
+        for i, theme in enumerate(_day_themes(req.diet)):
+            jobs[f"meal-{i}"] = lambda i=i, theme=theme: _llm_meal_day(meal_req, i, theme, use_cache, local_day)
+    for d, f in focuses:
+        jobs[f"workout-{d}"] = lambda d=d, f=f: _llm_workout_day(workout_req, d, f, use_cache)
+    results = await _fan_out(jobs, WEEKLY_PLAN_TIMEOUT)
+
+    meal_days = []
+    if meal_req:
+        for i, day in enumerate(WEEKDAYS):
+            status, plan = results[f"meal-{i}"]
+            meal_days.append(DayMealPlan(day=day, status=status, plan=plan))
+        _dedupe_main_dishes(meal_days, meal_req)
+    workout_days = []
+    for d, f in focuses:
+        status, plan = results[f"workout-{d}"]
+        workout_days.append(DayWorkoutPlan(day=WEEKDAYS[d], focus=f, status=status, plan=plan))
+
+    complete = all(x.plan is not None for x in meal_days + workout_days)
+    return WeeklyPlanResponse(meal_days=meal_days, workout_days=workout_days, complete=complete)
+
+
+# ========= 后台任务 =========
+# POST /api/ai/jobs/{kind}（见 job_queue）：与同步接口相同，固定走大模型（带兜底）
+
+@job_kind("meal-plan", MealPlanRequest)
+async def _meal_plan_job(req: MealPlanRequest) -> MealPlanResponse:
+    return await generate_meal_plan(req, Response(), mode="llm", bypass_cache=False)
+
+
+@job_kind("workout-plan", WorkoutPlanRequest)
+async def _workout_plan_job(req: WorkoutPlanRequest) -> WorkoutPlanResponse:
+    return await generate_workout_plan(req, Response(), mode="llm", bypass_cache=False)
+
+
+@job_kind("weekly-plan", WeeklyPlanRequest)
+async def _weekly_plan_job(req: WeeklyPlanRequest) -> WeeklyPlanResponse:
+    return await generate_weekly_plan(req, mode="llm", bypass_cache=False)
+
+
+# ========= SSE =========
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """
+    包装成 text/event-stream。响应头发出后就不能再改状态码，
+    所以生成过程中的异常改为推送一个 `error` 事件。
+    """
+    async def guarded() -> AsyncIterator[str]:
+        try:
+            async for chunk in events:
+                yield chunk
+        except Exception as e:
+            yield _sse("error", {"detail": f"LLM 调用失败: {e}"})
+
+    return StreamingResponse(
+        guarded(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ========= 运行指标 =========
+
+@router.get("/llm-metrics")
+def get_llm_metrics():
+    """大模型缓存命中率、计划模板命中率、后台任务队列等运行指标"""
+    return {**llm_metrics(), "plan_templates": plan_templates.stats(), "jobs": job_queue.stats(),
+            "image_cache": image_results.stats()}
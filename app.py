@@ -1,5 +1,15 @@
 # app.py
+import os
+
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run("backend:app", host="0.0.0.0", port=8000, reload=True)
+    # 多 worker 部署：UVICORN_WORKERS=4 python app.py（多 worker 时不启用热重载）
+    workers = int(os.getenv("UVICORN_WORKERS", "1"))
+    uvicorn.run(
+        "backend:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=workers == 1,
+        workers=workers,
+    )
@@ -1,14 +1,32 @@
 # backend.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
+from dotenv import load_dotenv
+
+# 各模块在导入时读取配置（存储后端、缓存、限流、模型路由等），先加载 .env
+load_dotenv()
 
 from ai_planner import router as ai_planner_router
 from user_data import router as user_data_router
 from llm_image_calorie import router as food_ai_router
+from job_queue import job_queue, router as job_router
+from llm_utils import aclose_llm_clients
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 后台任务的 worker（POST /api/ai/jobs/*）
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    # 关闭大模型异步客户端的连接池
+    await aclose_llm_clients()
 
 
-app = FastAPI(title="健康魔方 Backend")
+app = FastAPI(title="健康魔方 Backend", lifespan=lifespan)
 
 # CORS，方便前端用 http://localhost:5173 等域名访问
 app.add_middleware(
@@ -23,6 +41,7 @@ app.add_middleware(
 app.include_router(user_data_router)
 app.include_router(ai_planner_router)
 app.include_router(food_ai_router)
+app.include_router(job_router)
 
 
 # 直接把 health-cube.html 当首页返回（可选）
@@ -0,0 +1,280 @@
+# body_stats.py
+"""
+身体数据的趋势与聚合统计（给 /api/user/body-data/stats 用）
+
+所有统计都是「增量」维护的：
+- save_body_data 写入后调用 on_record_added，delete_record 后调用 on_record_deleted，
+  只更新这条记录所在的 日 / 周 / 月 桶以及线性回归的累加量；
+- 读取时只遍历桶（天数级别），不再遍历原始记录。
+
+多 worker 部署时其他进程的写入不会通知到本进程，所以读取前会用
+store.summary() 返回的 (记录数, 最大 id) 对一下账，对不上就整体重建一次。
+id 单调递增且记录不会被修改，这两个数相同就说明数据集没变。
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from body_store import get_store
+
+METRICS = ("weight", "bmi", "whr", "body_fat")
+PERIODS = ("daily", "weekly", "monthly")
+MA_WINDOWS = (7, 30)   # 移动平均窗口（自然日）
+# 最多为多少个用户保留统计，超出后丢掉最久没看的，下次读取时重建
+MAX_USERS = int(os.getenv("BODY_STATS_MAX_USERS", "256"))
+
+# 回归的 x 取「距这一天的天数」，数值小一些，避免大序数平方后丢精度
+_ORIGIN = date(2020, 1, 1).toordinal()
+
+
+# 记录在桶里的 key：(日期, "HH:MM", id)，按测量时间排序，同一时刻再按 id
+_RecordKey = Tuple[str, str, int]
+
+
+def _bucket_key(period: str, d: date) -> str:
+    if period == "daily":
+        return d.isoformat()
+    if period == "weekly":
+        year, week, _ = d.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{d.year}-{d.month:02d}"
+
+
+class _Agg:
+    """
+    单个桶里某个指标的 count / sum / min / max / last，支持删除。
+    记录用 (日期, 时间, id) 作 key，last 取测量时间最晚的一条，补录的旧数据不会顶掉它。
+    """
+
+    __slots__ = ("values", "sum", "min", "max", "last_key")
+
+    def __init__(self):
+        self.values: Dict[_RecordKey, float] = {}
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.last_key: Optional[_RecordKey] = None
+
+    def add(self, key: _RecordKey, value: float) -> None:
+        self.values[key] = value
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if self.last_key is None or key > self.last_key:
+            self.last_key = key
+
+    def remove(self, key: _RecordKey) -> None:
+        value = self.values.pop(key)
+        self.sum -= value
+        if not self.values:
+            self.sum = 0.0
+            self.min = self.max = self.last_key = None
+            return
+        # 只有删掉的恰好是极值 / 最新值时才需要在桶内重算
+        if value == self.min:
+            self.min = min(self.values.values())
+        if value == self.max:
+            self.max = max(self.values.values())
+        if key == self.last_key:
+            self.last_key = max(self.values)
+
+    def to_dict(self) -> dict:
+        n = len(self.values)
+        return {
+            "count": n,
+            "mean": round(self.sum / n, 2),
+            "min": self.min,
+            "max": self.max,
+            "last": self.values[self.last_key],
+        }
+
+
+class _Regression:
+    """按天做最小二乘线性回归的累加量，x 为整数天数（x 的累加用 int，精确），y 为指标值。"""
+
+    __slots__ = ("n", "sx", "sy", "sxy", "sxx")
+
+    def __init__(self):
+        self.n = self.sx = self.sxx = 0
+        self.sy = self.sxy = 0.0
+
+    def add(self, x: int, y: float, sign: int = 1) -> None:
+        self.n += sign
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxy += sign * x * y
+        self.sxx += sign * x * x
+
+    def slope(self) -> Optional[float]:
+        denom = self.n * self.sxx - self.sx * self.sx
+        if self.n < 2 or denom == 0:
+            return None
+        return (self.n * self.sxy - self.sx * self.sy) / denom
+
+
+class BodyStats:
+    """一个用户的全部增量统计。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._buckets: Dict[str, Dict[str, Dict[str, _Agg]]] = {p: {} for p in PERIODS}
+        self._regression = {m: _Regression() for m in METRICS}
+        # id -> (日期, 桶内 key, {指标: 值})，删除时用来定位要更新的桶
+        self._index: Dict[int, Tuple[date, _RecordKey, Dict[str, float]]] = {}
+
+    def _add(self, rec: dict) -> None:
+        if rec["id"] in self._index:
+            return
+        d = date.fromisoformat(rec["date"])
+        key = (rec["date"], rec.get("time") or "", rec["id"])
+        values = {m: rec[m] for m in METRICS if rec.get(m) is not None}
+        self._index[rec["id"]] = (d, key, values)
+        for period in PERIODS:
+            bucket = self._buckets[period].setdefault(_bucket_key(period, d), {})
+            for m, v in values.items():
+                bucket.setdefault(m, _Agg()).add(key, v)
+        for m, v in values.items():
+            self._regression[m].add(d.toordinal() - _ORIGIN, v)
+
+    def _remove(self, record_id: int) -> None:
+        entry = self._index.pop(record_id, None)
+        if entry is None:
+            return
+        d, key, values = entry
+        for period in PERIODS:
+            bucket_key = _bucket_key(period, d)
+            bucket = self._buckets[period][bucket_key]
+            for m in values:
+                bucket[m].remove(key)
+                if not bucket[m].values:
+                    del bucket[m]
+            if not bucket:
+                del self._buckets[period][bucket_key]
+        for m, v in values.items():
+            self._regression[m].add(d.toordinal() - _ORIGIN, v, sign=-1)
+
+    # ----- 对外接口 -----
+
+    def add(self, rec: dict) -> None:
+        with self._lock:
+            self._add(rec)
+
+    def remove(self, record_id: int) -> None:
+        with self._lock:
+            self._remove(record_id)
+
+    def rebuild(self, records: List[dict]) -> None:
+        with self._lock:
+            self._reset()
+            for rec in records:
+                self._add(rec)
+
+    def summary(self) -> Tuple[int, int]:
+        with self._lock:
+            return len(self._index), max(self._index, default=0)
+
+    def snapshot(self, since: Optional[str] = None) -> dict:
+        """since 只过滤返回的序列（按桶起始日期），不影响回归斜率。"""
+        with self._lock:
+            result = {}
+            for period in PERIODS:
+                rows = []
+                for key in sorted(self._buckets[period]):
+                    bucket = self._buckets[period][key]
+                    rows.append({
+                        "period": key,
+                        "metrics": {m: agg.to_dict() for m, agg in bucket.items()},
+                    })
+                result[period] = rows
+
+            daily = result["daily"]
+            result["moving_averages"] = {
+                m: _moving_averages(daily, m) for m in METRICS
+            }
+            result["trend"] = {}
+            for m in METRICS:
+                slope = self._regression[m].slope()
+                result["trend"][m] = {
+                    "n": self._regression[m].n,
+                    "slope_per_day": round(slope, 4) if slope is not None else None,
+                    "slope_per_week": round(slope * 7, 3) if slope is not None else None,
+                }
+
+        if since:
+            for period in PERIODS:
+                result[period] = [r for r in result[period] if _bucket_start(period, r["period"]) >= since]
+            for m in METRICS:
+                result["moving_averages"][m] = [
+                    p for p in result["moving_averages"][m] if p["date"] >= since
+                ]
+        return result
+
+
+def _bucket_start(period: str, key: str) -> str:
+    if period == "weekly":
+        year, week = key.split("-W")
+        return date.fromisocalendar(int(year), int(week), 1).isoformat()
+    if period == "monthly":
+        return key + "-01"
+    return key
+
+
+def _moving_averages(daily: List[dict], metric: str) -> List[dict]:
+    """在日均值序列上按自然日窗口滑动，O(天数)。"""
+    points = [
+        (date.fromisoformat(row["period"]), row["metrics"][metric]["mean"])
+        for row in daily
+        if metric in row["metrics"]
+    ]
+    windows = {w: (deque(), [0.0]) for w in MA_WINDOWS}
+    out = []
+    for d, v in points:
+        point = {"date": d.isoformat()}
+        for w, (q, total) in windows.items():
+            q.append((d, v))
+            total[0] += v
+            while (d - q[0][0]).days >= w:
+                total[0] -= q.popleft()[1]
+            point[f"ma{w}"] = round(total[0] / len(q), 2)
+        out.append(point)
+    return out
+
+
+# ========= 按用户管理 =========
+
+# 用户 -> 统计，按最近读取排序（LRU），最多 MAX_USERS 个
+_stats: "OrderedDict[str, BodyStats]" = OrderedDict()
+_stats_lock = threading.Lock()
+
+
+def get_stats(user: str) -> BodyStats:
+    """取某个用户的统计，和 store 对不上账时重建。"""
+    with _stats_lock:
+        stats = _stats.get(user)
+        if stats is None:
+            stats = _stats[user] = BodyStats()
+        _stats.move_to_end(user)
+        while len(_stats) > max(MAX_USERS, 1):
+            _stats.popitem(last=False)
+    store = get_store(user)
+    if stats.summary() != store.summary():
+        stats.rebuild(store.list_records())
+    return stats
+
+
+def on_record_added(user: str, rec: dict) -> None:
+    stats = _stats.get(user)
+    if stats is not None:
+        stats.add(rec)
+
+
+def on_record_deleted(user: str, record_id: int) -> None:
+    stats = _stats.get(user)
+    if stats is not None:
+        stats.remove(record_id)
@@ -0,0 +1,760 @@
+# body_store.py
+"""
+身体数据存储后端
+
+user_data 路由通过 get_store(user) 拿到某个用户的 store，接口为：
+- list_records()             返回全部记录（按 id 升序）
+- query_records(...)         按日期区间分页查询：默认按 id 升序、after_id 游标，
+                             newest_first=True 时按 id 降序、before_id 游标
+- add_record(fields)         分配 id 并写入，返回完整记录
+- add_records(fields_list)   批量写入，整批只落盘一次，返回完整记录列表
+- delete_record(record_id)   删除成功返回 True，记录不存在返回 False
+- summary()                  (记录数, 最大 id)，id 单调且记录不修改，可当作数据版本
+
+后端通过环境变量 BODY_DATA_BACKEND 选择：
+- log  : 追加日志（默认）。每行一条 JSON，新增写 put、删除写墓碑 del，
+         保存是 O(1) 的一次追加；后台线程在垃圾行过多时压缩日志。
+         首次启动时如果只有旧的 user_body_data.json，会自动导入。
+- json : 原来的做法，每次请求整体读写 user_body_data.json
+- sqlite : sqlite3 数据库，(user, date) 上有索引，历史查询不再全量扫描。
+         首次启动时表为空会自动从 user_body_data.json 迁移，
+         也可以手动执行 `python body_store.py migrate` 一次性迁移。
+
+多用户分片：
+- log / json 每个用户一个文件。默认用户沿用原来的 user_body_data.json(.jsonl)，
+  其他用户放在 BODY_DATA_DIRS 指定的目录下（多个目录用 os.pathsep 分隔，
+  按用户名哈希分布，可以把分片放到不同磁盘）。
+- sqlite 所有用户在同一张表里，以 user 列作为分区键，(user, date, id) 索引。
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+BACKEND = os.getenv("BODY_DATA_BACKEND", "log")
+
+DATA_FILE = os.getenv("BODY_DATA_FILE", "user_body_data.json")
+LOG_FILE = os.getenv("BODY_DATA_LOG_FILE", "user_body_data.jsonl")
+DB_FILE = os.getenv("BODY_DATA_DB_FILE", "user_body_data.db")
+
+BODY_DATA_DIRS = [
+    d for d in os.getenv("BODY_DATA_DIRS", "user_body_data").split(os.pathsep) if d
+]
+
+# 请求里没有带用户标识时，记录归到这个用户下（也是旧数据文件所属的用户）
+DEFAULT_USER = "default"
+
+# 用户标识会直接拼进文件名，只允许这些字符，且不能以 . 开头
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_@-][A-Za-z0-9_.@-]{0,63}$")
+
+# 一条记录除 id 外的字段，顺序与 user_data.save_body_data 里构造的一致
+RECORD_FIELDS = (
+    "date", "time", "weight", "height", "chest", "waist", "hip",
+    "body_fat", "gender", "age", "bmi", "whr",
+)
+
+# 垃圾行（被删除的 put + 墓碑）超过 max(COMPACT_MIN_GARBAGE, 存活记录数) 时触发压缩
+COMPACT_MIN_GARBAGE = int(os.getenv("BODY_DATA_COMPACT_MIN_GARBAGE", "1000"))
+# 后台压缩线程的巡检间隔（秒）
+COMPACT_INTERVAL = float(os.getenv("BODY_DATA_COMPACT_INTERVAL", "60"))
+# 进程内最多同时打开多少个用户的 store，超出后关闭最久没用的（log 后端每个都占一个文件句柄和全部记录）
+MAX_OPEN_STORES = int(os.getenv("BODY_DATA_MAX_OPEN_STORES", "256"))
+
+
+def _filter_page(
+    records: List[dict],
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    before_id: Optional[int] = None,
+    newest_first: bool = False,
+) -> Tuple[List[dict], Optional[int]]:
+    """
+    给没有索引的后端用的线性过滤分页，records 按 id 升序。
+    返回 (本页记录, 下一页的游标)，没有下一页时游标为 None；
+    游标升序时是下一页的 after_id，newest_first 时是下一页的 before_id。
+    """
+    page = []
+    for r in reversed(records) if newest_first else records:
+        if after_id is not None and r["id"] <= after_id:
+            continue
+        if before_id is not None and r["id"] >= before_id:
+            continue
+        if since and r["date"] < since:
+            continue
+        if until and r["date"] > until:
+            continue
+        if limit is not None and len(page) == limit:
+            return page, page[-1]["id"]
+        page.append(r)
+    return page, None
+
+
+# ========= 写锁 =========
+
+class _WriteLock:
+    """
+    串行化所有写操作：进程内用 threading.RLock，
+    多 worker 的 uvicorn 之间再用一把 OS 文件锁（POSIX flock / Windows msvcrt）。
+    """
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fh = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        self._depth += 1
+        if self._depth == 1:
+            try:
+                self._fh = open(self.lock_path, "a+b")
+                if os.name == "nt":
+                    self._fh.seek(0)
+                    msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+                else:
+                    fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+            except Exception:
+                self._depth -= 1
+                self._thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if os.name == "nt":
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+        self._thread_lock.release()
+
+
+def _atomic_write(path: str, write) -> None:
+    """先写临时文件并 fsync，再 os.replace，崩溃时不会留下写了一半的文件。"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ========= 进程内记录缓存 =========
+
+class RecordCache:
+    """
+    缓存最近一次解析出的记录列表，key 为数据文件的 (inode, mtime_ns, size)。
+    文件没变就直接返回缓存，不读盘也不做 JSON 解码；
+    本进程的写操作写完后直接把新列表放进来（write-through）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._records: Optional[List[dict]] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[List[dict]]:
+        with self._lock:
+            if self._records is not None and key == self._key:
+                self.hits += 1
+                return self._records
+            self.misses += 1
+            return None
+
+    def put(self, key, records: List[dict]) -> None:
+        with self._lock:
+            self._key = key
+            self._records = records
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "cached_records": len(self._records) if self._records is not None else 0,
+            }
+
+
+def _file_key(path: str):
+    st = os.stat(path)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+# ========= 原 JSON 整文件存储 =========
+
+class JsonFileStore:
+    """
+    每次读写整个 JSON 数组，记录多了以后保存是 O(n) 的。
+    写操作在 _WriteLock 内完成，id 来自旁路的单调计数文件 <path>.seq，
+    删除最后一条记录后也不会复用 id。
+    读操作前面有一层 RecordCache，文件没变时不读盘。
+    返回的列表是缓存本身，调用方只读不改；写操作都会构造新列表。
+    """
+
+    def __init__(self, path: str = DATA_FILE):
+        self.path = path
+        self._seq_path = path + ".seq"
+        self._write_lock = _WriteLock(path + ".lock")
+        self._cache = RecordCache()
+
+    def _load_records(self) -> List[dict]:
+        if not os.path.exists(self.path):
+            return []
+        key = _file_key(self.path)
+        records = self._cache.get(key)
+        if records is not None:
+            return records
+        with open(self.path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self._cache.put(key, records)
+        return records
+
+    def _save_records(self, records: List[dict]) -> None:
+        _atomic_write(
+            self.path, lambda f: json.dump(records, f, ensure_ascii=False, indent=2)
+        )
+        self._cache.put(_file_key(self.path), records)
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats()
+
+    def _allocate_ids(self, records: List[dict], n: int = 1) -> range:
+        last = records[-1]["id"] if records else 0
+        if os.path.exists(self._seq_path):
+            with open(self._seq_path, "r", encoding="utf-8") as f:
+                last = max(last, int(f.read().strip() or 0))
+        _atomic_write(self._seq_path, lambda f: f.write(str(last + n)))
+        return range(last + 1, last + n + 1)
+
+    def list_records(self) -> List[dict]:
+        return self._load_records()
+
+    def query_records(self, since=None, until=None, after_id=None, limit=None,
+                      before_id=None, newest_first=False):
+        return _filter_page(self._load_records(), since, until, after_id, limit,
+                            before_id, newest_first)
+
+    def summary(self) -> Tuple[int, int]:
+        records = self._load_records()
+        return len(records), max((r["id"] for r in records[-1:]), default=0)
+
+    def add_record(self, fields: dict) -> dict:
+        with self._write_lock:
+            records = self._load_records()
+            rec = {"id": self._allocate_ids(records)[0], **fields}
+            self._save_records(records + [rec])
+            return rec
+
+    def add_records(self, fields_list: List[dict]) -> List[dict]:
+        if not fields_list:
+            return []
+        with self._write_lock:
+            records = self._load_records()
+            ids = self._allocate_ids(records, len(fields_list))
+            new = [{"id": i, **fields} for i, fields in zip(ids, fields_list)]
+            self._save_records(records + new)
+            return new
+
+    def delete_record(self, record_id: int) -> bool:
+        with self._write_lock:
+            records = self._load_records()
+            new_records = [r for r in records if r["id"] != record_id]
+            if len(new_records) == len(records):
+                return False
+            self._save_records(new_records)
+            return True
+
+
+# ========= 追加日志存储 =========
+
+class AppendLogStore:
+    """
+    日志格式（每行一个 JSON 对象）：
+        {"op": "seq", "next_id": 42}      压缩快照的第一行，保证 id 单调
+        {"op": "put", "rec": {...完整记录...}}
+        {"op": "del", "id": 3}
+
+    内存里维护 id -> 记录 的有序字典，启动时重放一次日志，
+    之后只增量读取其他 worker 追加的新行，写只追加一行。
+    多 worker 时写操作持有 _WriteLock，写之前先追上日志尾部再分配 id；
+    压缩会换成新文件（inode 变化），其他 worker 发现后整体重放。
+    """
+
+    def __init__(self, path: str = LOG_FILE, legacy_json: Optional[str] = DATA_FILE):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._lock = threading.RLock()
+        self._write_lock = _WriteLock(path + ".lock")
+        self._records: Dict[int, dict] = {}
+        self._next_id = 1
+        self._garbage = 0
+        self._offset = 0
+        self._inode = None
+        self._fh = None
+        self._loaded = False
+
+    # ----- 加载 / 重放 -----
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._write_lock:
+            if self._loaded:
+                return
+            if not os.path.exists(self.path):
+                self._import_legacy_json()
+            self._truncate_partial_line()
+            self._sync()
+            self._loaded = True
+            _register_for_compaction(self)
+
+    def _import_legacy_json(self) -> None:
+        """首次启动：把旧的 JSON 数组一次性转成日志。"""
+        records: List[dict] = []
+        if self.legacy_json and os.path.exists(self.legacy_json):
+            with open(self.legacy_json, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        next_id = max((r["id"] for r in records), default=0) + 1
+        self._write_snapshot(records, next_id)
+
+    def _truncate_partial_line(self) -> None:
+        """上次崩溃可能留下半行，截断到最后一个换行符（需持有写锁）。"""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                f.truncate(end)
+
+    def _sync(self) -> None:
+        """追上磁盘上的日志：文件被压缩替换过就整体重放，否则只读新增的行。"""
+        st = os.stat(self.path)
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._records = {}
+            self._garbage = 0
+            self._next_id = 1
+            self._offset = 0
+            self._inode = st.st_ino
+            if self._fh is not None:
+                self._fh.close()
+            self._fh = open(self.path, "ab")
+        if st.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # 只消费完整的行，别的 worker 正在写的半行留到下次
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8").splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._offset += end
+
+    def _apply(self, entry: dict) -> None:
+        op = entry["op"]
+        if op == "put":
+            rec = entry["rec"]
+            if rec["id"] in self._records:
+                self._garbage += 1
+            self._records[rec["id"]] = rec
+            self._next_id = max(self._next_id, rec["id"] + 1)
+        elif op == "del":
+            if self._records.pop(entry["id"], None) is not None:
+                self._garbage += 1
+            self._garbage += 1
+        elif op == "seq":
+            self._next_id = max(self._next_id, entry["next_id"])
+
+    def _append(self, *entries: dict) -> None:
+        """追加若干行（需持有写锁，且刚 _sync 过）。"""
+        # _sync 只消费完整的行；持有写锁时 _offset 之后还有字节，说明别的 worker
+        # 写到一半崩溃了，先截掉半行，否则新行会接在它后面变成一行坏 JSON
+        if os.fstat(self._fh.fileno()).st_size > self._offset:
+            self._fh.truncate(self._offset)
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        self._fh.write(data)
+        self._fh.flush()
+        self._offset += len(data)
+        for entry in entries:
+            self._apply(entry)
+
+    # ----- 对外接口 -----
+
+    def list_records(self) -> List[dict]:
+        self._ensure_loaded()
+        with self._lock:
+            self._sync()
+            return list(self._records.values())
+
+    def query_records(self, since=None, until=None, after_id=None, limit=None,
+                      before_id=None, newest_first=False):
+        return _filter_page(self.list_records(), since, until, after_id, limit,
+                            before_id, newest_first)
+
+    def summary(self) -> Tuple[int, int]:
+        self._ensure_loaded()
+        with self._lock:
+            self._sync()
+            # put 按 id 递增追加，有序字典的最后一个键就是最大 id
+            return len(self._records), next(reversed(self._records), 0)
+
+    def add_record(self, fields: dict) -> dict:
+        self._ensure_loaded()
+        with self._write_lock, self._lock:
+            self._sync()
+            rec = {"id": self._next_id, **fields}
+            self._append({"op": "put", "rec": rec})
+            return rec
+
+    def add_records(self, fields_list: List[dict]) -> List[dict]:
+        self._ensure_loaded()
+        with self._write_lock, self._lock:
+            self._sync()
+            start = self._next_id
+            new = [{"id": start + i, **fields} for i, fields in enumerate(fields_list)]
+            if new:
+                self._append(*({"op": "put", "rec": rec} for rec in new))
+            return new
+
+    def delete_record(self, record_id: int) -> bool:
+        self._ensure_loaded()
+        with self._write_lock, self._lock:
+            self._sync()
+            if record_id not in self._records:
+                return False
+            self._append({"op": "del", "id": record_id})
+            if self._needs_compaction():
+                _compact_event.set()
+            return True
+
+    # ----- 压缩 -----
+
+    def _needs_compaction(self) -> bool:
+        return self._garbage > max(COMPACT_MIN_GARBAGE, len(self._records))
+
+    def _write_snapshot(self, records: List[dict], next_id: int) -> None:
+        def write(f):
+            f.write(json.dumps({"op": "seq", "next_id": next_id}) + "\n")
+            for rec in records:
+                f.write(json.dumps({"op": "put", "rec": rec}, ensure_ascii=False) + "\n")
+
+        _atomic_write(self.path, write)
+
+    def compact(self) -> None:
+        """把日志重写成只含存活记录的快照，去掉墓碑和被删除的 put。"""
+        self._ensure_loaded()
+        with self._write_lock, self._lock:
+            self._sync()
+            records, next_id = list(self._records.values()), self._next_id
+            # Windows 下文件还开着无法 os.replace，先关掉，_sync 会重新打开并重放
+            self._fh.close()
+            self._fh = None
+            self._inode = None
+            self._write_snapshot(records, next_id)
+            self._sync()
+
+    def close(self) -> None:
+        """
+        关闭日志文件并释放内存里的记录，退出后台压缩。
+        之后如果还有人调用，会像新建的 store 一样重新加载。
+        """
+        with self._write_lock, self._lock:
+            if self._fh is not None:
+                self._fh.close()
+            self._fh = None
+            self._inode = None
+            self._offset = 0
+            self._records = {}
+            self._garbage = 0
+            self._next_id = 1
+            self._loaded = False
+        _unregister_for_compaction(self)
+
+
+# 所有用户的日志共用一个后台压缩线程
+_log_stores: List[AppendLogStore] = []
+_log_stores_lock = threading.Lock()
+_compact_event = threading.Event()
+_compactor: Optional[threading.Thread] = None
+
+
+def _register_for_compaction(store: AppendLogStore) -> None:
+    global _compactor
+    with _log_stores_lock:
+        if store not in _log_stores:
+            _log_stores.append(store)
+        if _compactor is None:
+            _compactor = threading.Thread(
+                target=_compact_loop, name="body-log-compactor", daemon=True
+            )
+            _compactor.start()
+
+
+def _unregister_for_compaction(store: AppendLogStore) -> None:
+    with _log_stores_lock:
+        if store in _log_stores:
+            _log_stores.remove(store)
+
+
+def _compact_loop() -> None:
+    while True:
+        _compact_event.wait(COMPACT_INTERVAL)
+        _compact_event.clear()
+        with _log_stores_lock:
+            stores = list(_log_stores)
+        for store in stores:
+            with store._lock:
+                # 拿到列表之后被关闭的 store 不用再压缩
+                need = store._loaded and store._needs_compaction()
+            if need:
+                store.compact()
+
+
+# ========= SQLite 存储 =========
+
+class SqliteStore:
+    """
+    body_records 表，id 自增，(user, date, id) 上建索引，
+    日期区间 + 游标分页查询只走索引范围扫描。
+    每个 store 对应一个用户，所有用户共用同一个库文件；
+    连接按线程复用（FastAPI 的同步路由跑在线程池里），不随用户数增长。
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS body_records (
+        id       INTEGER PRIMARY KEY AUTOINCREMENT,
+        user     TEXT    NOT NULL DEFAULT 'default',
+        date     TEXT    NOT NULL,
+        time     TEXT    NOT NULL,
+        weight   REAL    NOT NULL,
+        height   REAL    NOT NULL,
+        chest    REAL,
+        waist    REAL,
+        hip      REAL,
+        body_fat REAL,
+        gender   TEXT    NOT NULL,
+        age      INTEGER NOT NULL,
+        bmi      REAL    NOT NULL,
+        whr      REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_body_records_user_date
+        ON body_records (user, date, id);
+    """
+
+    _COLUMNS = ("id",) + RECORD_FIELDS
+
+    def __init__(
+        self,
+        path: str = DB_FILE,
+        user: str = DEFAULT_USER,
+        legacy_json: Optional[str] = DATA_FILE,
+    ):
+        self.path = path
+        self.user = user
+        self.legacy_json = legacy_json
+
+    def _conn(self) -> sqlite3.Connection:
+        return _sqlite_conn(self.path, self.legacy_json)
+
+    def _row_to_record(self, row: sqlite3.Row) -> dict:
+        return {k: row[k] for k in self._COLUMNS}
+
+    def list_records(self) -> List[dict]:
+        return self.query_records()[0]
+
+    def query_records(self, since=None, until=None, after_id=None, limit=None,
+                      before_id=None, newest_first=False):
+        sql = f"SELECT {', '.join(self._COLUMNS)} FROM body_records WHERE user = ?"
+        params: list = [self.user]
+        if since:
+            sql += " AND date >= ?"
+            params.append(since)
+        if until:
+            sql += " AND date <= ?"
+            params.append(until)
+        if after_id is not None:
+            sql += " AND id > ?"
+            params.append(after_id)
+        if before_id is not None:
+            sql += " AND id < ?"
+            params.append(before_id)
+        sql += " ORDER BY id DESC" if newest_first else " ORDER BY id"
+        if limit is not None:
+            # 多取一条用来判断是否还有下一页
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        rows = self._conn().execute(sql, params).fetchall()
+        records = [self._row_to_record(r) for r in rows]
+        if limit is not None and len(records) > limit:
+            records = records[:limit]
+            return records, records[-1]["id"]
+        return records, None
+
+    def summary(self) -> Tuple[int, int]:
+        row = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM body_records WHERE user = ?",
+            (self.user,),
+        ).fetchone()
+        return row[0], row[1]
+
+    def add_record(self, fields: dict) -> dict:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                f"INSERT INTO body_records (user, {', '.join(RECORD_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(RECORD_FIELDS))})",
+                [self.user] + [fields.get(k) for k in RECORD_FIELDS],
+            )
+        return {"id": cur.lastrowid, **fields}
+
+    def add_records(self, fields_list: List[dict]) -> List[dict]:
+        conn = self._conn()
+        new = []
+        with conn:   # 整批一个事务
+            for fields in fields_list:
+                cur = conn.execute(
+                    f"INSERT INTO body_records (user, {', '.join(RECORD_FIELDS)}) "
+                    f"VALUES (?, {', '.join('?' * len(RECORD_FIELDS))})",
+                    [self.user] + [fields.get(k) for k in RECORD_FIELDS],
+                )
+                new.append({"id": cur.lastrowid, **fields})
+        return new
+
+    def delete_record(self, record_id: int) -> bool:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "DELETE FROM body_records WHERE user = ? AND id = ?",
+                (self.user, record_id),
+            )
+        return cur.rowcount > 0
+
+
+_sqlite_local = threading.local()
+_sqlite_ready = set()
+_sqlite_init_lock = threading.Lock()
+
+
+def _sqlite_conn(path: str, legacy_json: Optional[str]) -> sqlite3.Connection:
+    """当前线程到 path 的连接；首次打开库时建表，表为空则迁移旧 JSON。"""
+    conns = getattr(_sqlite_local, "conns", None)
+    if conns is None:
+        conns = _sqlite_local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conns[path] = conn
+    if path not in _sqlite_ready:
+        with _sqlite_init_lock:
+            if path not in _sqlite_ready:
+                conn.executescript(SqliteStore._SCHEMA)
+                empty = conn.execute("SELECT 1 FROM body_records LIMIT 1").fetchone() is None
+                if empty and legacy_json and os.path.exists(legacy_json):
+                    migrate_json_to_sqlite(legacy_json, path)
+                _sqlite_ready.add(path)
+    return conn
+
+
+def migrate_json_to_sqlite(json_path: str = DATA_FILE, db_path: str = DB_FILE) -> int:
+    """
+    一次性把 JSON 数组迁移进 SQLite（归到默认用户），保留原来的 id。
+    已经存在的 id 会被跳过，重复执行是安全的。返回新插入的条数。
+    """
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.executescript(SqliteStore._SCHEMA)
+        columns = ("id", "user") + RECORD_FIELDS
+        with conn:
+            cur = conn.executemany(
+                f"INSERT OR IGNORE INTO body_records ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                [[r["id"], DEFAULT_USER] + [r.get(k) for k in RECORD_FIELDS] for r in records],
+            )
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+# ========= 选择后端 =========
+
+# 用户 -> store，按最近使用排序（LRU），最多 MAX_OPEN_STORES 个
+_stores: "OrderedDict[str, object]" = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def _shard_path(user: str, ext: str) -> str:
+    """非默认用户的分片文件路径：按用户名 crc32 选目录。"""
+    base = BODY_DATA_DIRS[zlib.crc32(user.encode("utf-8")) % len(BODY_DATA_DIRS)]
+    os.makedirs(base, exist_ok=True)
+    return os.path.join(base, user + ext)
+
+
+def _create_store(user: str):
+    is_default = user == DEFAULT_USER
+    if BACKEND == "json":
+        return JsonFileStore(DATA_FILE if is_default else _shard_path(user, ".json"))
+    if BACKEND == "log":
+        if is_default:
+            return AppendLogStore()
+        return AppendLogStore(_shard_path(user, ".jsonl"), legacy_json=None)
+    if BACKEND == "sqlite":
+        return SqliteStore(user=user)
+    raise RuntimeError(f"未知的 BODY_DATA_BACKEND: {BACKEND}")
+
+
+def get_store(user: str = DEFAULT_USER):
+    """
+    按 BODY_DATA_BACKEND 返回该用户的 store 实例。
+    打开的 store 超过 MAX_OPEN_STORES 个时关闭最久没用的，下次访问再重新打开。
+    """
+    if not USER_ID_PATTERN.match(user):
+        raise ValueError(f"非法的用户标识: {user!r}")
+    evicted = []
+    with _stores_lock:
+        store = _stores.get(user)
+        if store is None:
+            store = _stores[user] = _create_store(user)
+        _stores.move_to_end(user)
+        while len(_stores) > max(MAX_OPEN_STORES, 1):
+            evicted.append(_stores.popitem(last=False)[1])
+    # close 要拿 store 的写锁，放到 _stores_lock 外面，不挡住其他用户
+    for old in evicted:
+        if hasattr(old, "close"):
+            old.close()
+    return store
+
+
+if __name__ == "__main__":
+    # 用法: python body_store.py migrate [json_path] [db_path]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        n = migrate_json_to_sqlite(*sys.argv[2:4])
+        print(f"已迁移 {n} 条记录")
+    else:
+        print("用法: python body_store.py migrate [json_path] [db_path]")
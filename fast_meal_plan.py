@@ -0,0 +1,259 @@
+# fast_meal_plan.py
+"""
+不调大模型，直接用食物表生成一天的食谱（/api/ai/meal-plan?mode=fast，大模型不可用时也用它兜底）
+
+1. 热量预算按目标拆出蛋白质 / 脂肪 / 碳水的克数目标，再按 MEAL_SHARES 分到四顿
+2. 每顿有几个「格子」（主食、蛋白质、蔬菜……），每个格子从允许的类别里取打分最高的几种食物
+   （过滤复用 food_retrieval.is_food_allowed，饮食类型 / 禁忌 / 口味偏好都生效）
+3. 每种食物的分量只能是一份（typical_portion_g）的 PORTION_STEPS 倍，
+   在「每格选哪种食物 × 几份」的组合里枚举，取热量和营养素最接近目标的一组
+   ——就是一个很小的整数规划，四顿加起来几毫秒
+4. 前面几顿用过的食物在后面加罚分，尽量不重样；一顿里两格是同一类别（如两样奶制品）也加罚分
+5. 预算很高、几格都给到最大份量仍差得多时，加一格再算一次（增肌 3500 kcal 以上常见）
+6. exclude 里的菜名（一周计划里已经出现过的主菜）不再选，除非实在没有别的组合
+
+返回的 dict 和大模型输出同样的结构（daily_calorie_target / goal / meals），
+由 ai_planner 转成 MealPlanResponse。
+"""
+
+from typing import AbstractSet, Dict, Iterable, List, Optional, Tuple
+
+from food_data import get_food_items
+from food_retrieval import select_foods_for_diet
+
+# 四顿的热量占比
+MEAL_SHARES: Tuple[Tuple[str, float], ...] = (
+    ("早餐", 0.25), ("午餐", 0.35), ("晚餐", 0.30), ("加餐", 0.10),
+)
+
+# 每顿的格子：每个格子可以用哪些类别的食物
+MEAL_SLOTS: Dict[str, Tuple[Tuple[str, ...], ...]] = {
+    "早餐": (("主食",), ("肉蛋鱼", "奶制品", "豆制品"), ("水果", "奶制品")),
+    "午餐": (("主食",), ("肉蛋鱼", "豆制品"), ("蔬菜",)),
+    "晚餐": (("主食",), ("肉蛋鱼", "豆制品"), ("蔬菜",)),
+    "加餐": (("水果", "奶制品"),),
+}
+
+# 蛋白质 / 脂肪 / 碳水占总热量的比例
+MACRO_SPLITS = {
+    "lose": (0.30, 0.25, 0.45),
+    "gain": (0.25, 0.25, 0.50),
+    "maintain": (0.20, 0.30, 0.50),
+}
+# 有体重时蛋白质按 g/kg 算（不超过总热量的 35%）
+PROTEIN_G_PER_KG = {"lose": 1.6, "gain": 1.8, "maintain": 1.2}
+
+# 预算较高时多出来的一格
+EXTRA_SLOTS: Dict[str, Tuple[str, ...]] = {
+    "早餐": ("主食", "肉蛋鱼", "豆制品", "奶制品", "水果"),
+    "午餐": ("主食", "肉蛋鱼", "豆制品", "蔬菜"),
+    "晚餐": ("主食", "肉蛋鱼", "豆制品", "蔬菜"),
+    "加餐": ("水果", "奶制品", "主食"),
+}
+EXTRA_SLOT_GAP = 0.08    # 热量差超过目标的 8% 时才试着加一格
+
+PORTION_STEPS = (0.5, 1, 1.5, 2, 2.5, 3, 4)
+MAX_PORTION_G = 600
+CANDIDATES_PER_SLOT = 3
+# 每个类别只从按目标打分的前一半（至少 GOOD_PER_CATEGORY 种）里选，
+# 不会为了不重样选到炸鸡翅、五花肉这类和目标不符的食物
+GOOD_PER_CATEGORY = 4
+REPEAT_PENALTY = 0.3
+SAME_CATEGORY_PENALTY = 0.5
+CALORIE_WEIGHT = 30      # 热量偏差比营养素偏差重要得多
+
+_SUGGESTIONS = {
+    "lose": "少油少盐，先吃蔬菜和蛋白质，主食放在最后。",
+    "gain": "训练后 1 小时内吃这一顿效果更好，主食不要省。",
+    "maintain": "细嚼慢咽，七八分饱即可。",
+}
+
+
+def macro_targets(calories: float, goal: str, weight_kg: Optional[float] = None) -> Dict[str, float]:
+    """一天（或一顿）热量对应的蛋白质 / 脂肪 / 碳水目标克数。"""
+    p_share, f_share, c_share = MACRO_SPLITS.get(goal, MACRO_SPLITS["maintain"])
+    fat = calories * f_share / 9
+    if weight_kg:
+        # 蛋白质按体重定，剩下的热量给碳水
+        protein = min(weight_kg * PROTEIN_G_PER_KG.get(goal, 1.2), calories * 0.35 / 4)
+        carb = max(0.0, (calories - protein * 4 - fat * 9) / 4)
+    else:
+        protein = calories * p_share / 4
+        carb = calories * c_share / 4
+    return {"calories": calories, "protein_g": protein, "fat_g": fat, "carb_g": carb}
+
+
+def _portion_options(item: dict, penalty: float) -> List[tuple]:
+    """一种食物所有可选的分量：(热量, 蛋白质, 脂肪, 碳水, 重复罚分, 食物, 克数)。"""
+    options = []
+    for step in PORTION_STEPS:
+        grams = item["typical_portion_g"] * step
+        if grams > MAX_PORTION_G and step > 1:
+            break
+        ratio = grams / 100
+        options.append((
+            item["kcal_per_100g"] * ratio,
+            (item.get("protein_per_100g") or 0) * ratio,
+            (item.get("fat_per_100g") or 0) * ratio,
+            (item.get("carb_per_100g") or 0) * ratio,
+            penalty, item, grams,
+        ))
+    return options
+
+
+def _slot_candidates(ranked: List[dict], categories: Iterable[str], used: set) -> List[dict]:
+    """
+    格子的候选食物：每个类别先按打分只留前一半，
+    再把前几顿没用过的排在前面（稳定排序，保持打分顺序）。
+    """
+    good = []
+    for category in categories:
+        in_category = [i for i in ranked if i.get("category") == category]
+        good += in_category[:max(GOOD_PER_CATEGORY, (len(in_category) + 1) // 2)]
+    rank = {id(i): n for n, i in enumerate(ranked)}
+    good.sort(key=lambda i: (i["id"] in used, rank[id(i)]))
+    return good[:CANDIDATES_PER_SLOT]
+
+
+def dish_key(name: str) -> str:
+    """菜名去掉空格，作为「同一道菜」的判断依据（本地生成的菜名是「食物A + 食物B」）。"""
+    return name.replace(" ", "")
+
+
+def _plan_meal(slots: List[List[dict]], target: Dict[str, float], used: set,
+               exclude: AbstractSet[str] = frozenset()) -> Tuple[List[tuple], float]:
+    """
+    枚举每格的 (食物, 分量)，返回代价最小的组合和它的代价。
+    代价：热量相对偏差平方（权重 CALORIE_WEIGHT）+ 各营养素的相对偏差平方 + 重复 / 同类别罚分。
+    菜名在 exclude 里的组合只在没有其他组合时才用。
+    前面几格的组合先累加好，热量已经明显超标的提前剪掉，最后一格在内层循环里算。
+    """
+    per_slot = [[opt for item in cands
+                 for opt in _portion_options(item, REPEAT_PENALTY if item["id"] in used else 0.0)]
+                for cands in slots if cands]
+    if not per_slot:
+        return [], float("inf")
+
+    t_cal = target["calories"]
+    t_p, t_f, t_c = (max(target[k], 1e-6) for k in ("protein_g", "fat_g", "carb_g"))
+    cal_cap = t_cal * 1.5
+
+    def extra_penalty(chosen: tuple, o: tuple) -> Optional[float]:
+        """同一种食物不能选两次（None）；同类别加罚分。"""
+        pen = o[4]
+        for x in chosen:
+            if x[5] is o[5]:
+                return None
+            if x[5].get("category") == o[5].get("category"):
+                pen += SAME_CATEGORY_PENALTY
+        return pen
+
+    # 前 n-1 格的部分和：(热量, 蛋白质, 脂肪, 碳水, 罚分, 已选的选项)
+    partial = [(0.0, 0.0, 0.0, 0.0, 0.0, ())]
+    for options in per_slot[:-1]:
+        partial = [
+            (cal + o[0], p + o[1], f + o[2], c + o[3], pen + extra, chosen + (o,))
+            for cal, p, f, c, pen, chosen in partial
+            for o in options
+            if cal + o[0] <= cal_cap and (extra := extra_penalty(chosen, o)) is not None
+        ]
+
+    # best：不在 exclude 里的最优组合；fallback：不管 exclude 的最优组合
+    best, best_cost = None, float("inf")
+    fallback, fallback_cost = None, float("inf")
+    for cal, p, f, c, pen, chosen in partial:
+        for o in per_slot[-1]:
+            extra = extra_penalty(chosen, o)
+            if extra is None:
+                continue
+            dc = (cal + o[0] - t_cal) / t_cal
+            dp = (p + o[1] - t_p) / t_p
+            df = (f + o[2] - t_f) / t_f
+            dcb = (c + o[3] - t_c) / t_c
+            cost = CALORIE_WEIGHT * dc * dc + dp * dp + df * df + dcb * dcb + pen + extra
+            if cost < best_cost:
+                if exclude and "+".join(x[5]["cn_name"] for x in chosen + (o,)) in exclude:
+                    if cost < fallback_cost:
+                        fallback, fallback_cost = chosen + (o,), cost
+                else:
+                    best, best_cost = chosen + (o,), cost
+    if best is None:
+        return list(fallback or ()), fallback_cost
+    return list(best), best_cost
+
+
+def _to_meal(meal_type: str, combo: List[tuple], goal: str) -> dict:
+    cal, protein, fat, carb = (sum(o[i] for o in combo) for i in range(4))
+    parts = []
+    for o in combo:
+        item, grams = o[5], o[6]
+        unit = "ml" if item.get("unit") == "ml" else "g"
+        parts.append(f"{item['cn_name']} {grams:g}{unit}（{round(o[0])} kcal）")
+
+    tags = []
+    if cal and protein * 4 / cal >= 0.25:
+        tags.append("高蛋白")
+    if cal and fat * 9 / cal <= 0.2:
+        tags.append("低脂")
+    if any(o[5].get("category") == "蔬菜" for o in combo):
+        tags.append("高纤维")
+
+    return {
+        "meal_type": meal_type,
+        "name": " + ".join(o[5]["cn_name"] for o in combo),
+        "calories": round(cal),
+        "tags": tags,
+        "description": "、".join(parts) + f"。蛋白质约 {protein:.0f}g，"
+                       f"脂肪 {fat:.0f}g，碳水 {carb:.0f}g。",
+        "suggestion": _SUGGESTIONS.get(goal, _SUGGESTIONS["maintain"]),
+    }
+
+
+def rank_foods(diet_type: str = "none", restrictions: Iterable[str] = (), goal: str = "maintain",
+               tastes: Iterable[str] = ()) -> List[dict]:
+    """
+    按目标打分排好序、已过滤掉不能吃的食物；饮料和甜点不进食谱。
+    要遍历整张食物表（外部食物库时每次都从库里解码），一周计划只算一次。
+    """
+    items = get_food_items()
+    return [i for i in select_foods_for_diet(diet_type, restrictions, goal, tastes, k=len(items))
+            if i.get("category") not in ("饮料", "甜点")]
+
+
+def build_meal_plan(calories_budget: int, goal: str = "maintain", diet_type: str = "none",
+                    restrictions: Iterable[str] = (), tastes: Iterable[str] = (),
+                    weight_kg: Optional[float] = None, avoid: Iterable[str] = (),
+                    exclude: Iterable[str] = (), ranked: Optional[List[dict]] = None) -> dict:
+    """
+    按热量预算和饮食偏好生成一天四顿，结构同大模型返回的 JSON。
+    avoid 是尽量不用的食物 id（例如前一天用过的），和当天前几顿用过的一样处理。
+    exclude 是不要再出现的菜名（dish_key 之后的），例如一周里前几天的主菜。
+    ranked 是 rank_foods 的结果，连续生成多天时传进来共用，不传则现算。
+    """
+    if calories_budget <= 0:
+        raise ValueError("热量预算必须大于 0")
+    if ranked is None:
+        ranked = rank_foods(diet_type, restrictions, goal, tastes)
+    daily = macro_targets(calories_budget, goal, weight_kg)
+
+    meals, used = [], set(avoid)
+    exclude = frozenset(dish_key(n) for n in exclude)
+    for meal_type, share in MEAL_SHARES:
+        target = {k: v * share for k, v in daily.items()}
+        slots = [_slot_candidates(ranked, cats, used) for cats in MEAL_SLOTS[meal_type]]
+        combo, cost = _plan_meal(slots, target, used, exclude)
+        if abs(sum(o[0] for o in combo) - target["calories"]) > EXTRA_SLOT_GAP * target["calories"]:
+            extra = _slot_candidates(ranked, EXTRA_SLOTS[meal_type], used)
+            more, more_cost = _plan_meal(slots + [extra], target, used, exclude)
+            if more_cost < cost:
+                combo = more
+        if not combo:
+            continue
+        used.update(o[5]["id"] for o in combo)
+        meal = _to_meal(meal_type, combo, goal)
+        meal["food_ids"] = [o[5]["id"] for o in combo]
+        meals.append(meal)
+
+    if not meals:
+        raise ValueError("按当前饮食类型和禁忌，食物表里没有可用的食物")
+    return {"daily_calorie_target": calories_budget, "goal": goal, "meals": meals}
@@ -0,0 +1,318 @@
+# fast_workout_plan.py
+"""
+不调大模型，按规则生成今天的训练（/api/ai/workout-plan?mode=fast，大模型不可用时也用它兜底）
+
+- EXERCISES 动作库：每个动作标注类型、需要的器械、冲击程度、主要部位和禁忌（如 knee_pain）
+- 按用户的器械和身体限制过滤动作；膝 / 踝不适时去掉高冲击动作，高血压等情况强度上限为 medium
+- 按目标安排 2-4 个小节（热身 → 主训练 → 辅助训练 → 拉伸），时长按比例塞进 available_minutes
+- 目标心率按年龄算：最大心率 208 - 0.7 × 年龄（Tanaka 公式），low / medium / high 各对应一个区间
+
+返回的 dict 和大模型输出同样的结构（day / goal / total_duration / sessions），
+由 ai_planner 转成 WorkoutPlanResponse。
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# ========= 动作库 =========
+# equipment: 需要的器械（全部具备才可选，空表示徒手）
+# impact: low / medium / high 冲击程度；avoid: 有这些身体限制时不选
+# muscles: upper / lower / core / full
+
+EXERCISES: List[Dict] = [
+    # ----- 热身 -----
+    {"name": "原地踏步", "type": "mobility", "equipment": (), "impact": "low", "muscles": "full", "avoid": ()},
+    {"name": "手臂绕环", "type": "mobility", "equipment": (), "impact": "low", "muscles": "upper", "avoid": ()},
+    {"name": "髋关节绕环", "type": "mobility", "equipment": (), "impact": "low", "muscles": "lower", "avoid": ()},
+    {"name": "猫牛式", "type": "mobility", "equipment": (), "impact": "low", "muscles": "core", "avoid": ("wrist_pain",)},
+    {"name": "世界上最伟大拉伸", "type": "mobility", "equipment": (), "impact": "low", "muscles": "full",
+     "avoid": ("knee_pain",)},
+    {"name": "动态弓步", "type": "mobility", "equipment": (), "impact": "medium", "muscles": "lower",
+     "avoid": ("knee_pain",)},
+    {"name": "开合跳", "type": "mobility", "equipment": (), "impact": "high", "muscles": "full",
+     "avoid": ("knee_pain", "ankle_pain")},
+    {"name": "弹力带肩部拉开", "type": "mobility", "equipment": ("band",), "impact": "low", "muscles": "upper",
+     "avoid": ()},
+
+    # ----- 有氧 -----
+    {"name": "快走", "type": "cardio", "equipment": (), "impact": "low", "muscles": "lower", "avoid": ()},
+    {"name": "慢跑", "type": "cardio", "equipment": (), "impact": "medium", "muscles": "lower",
+     "avoid": ("knee_pain", "ankle_pain")},
+    {"name": "跑步机坡度快走", "type": "cardio", "equipment": ("treadmill",), "impact": "low", "muscles": "lower",
+     "avoid": ()},
+    {"name": "动感单车", "type": "cardio", "equipment": ("bike",), "impact": "low", "muscles": "lower", "avoid": ()},
+    {"name": "椭圆机", "type": "cardio", "equipment": ("elliptical",), "impact": "low", "muscles": "full",
+     "avoid": ()},
+    {"name": "划船机", "type": "cardio", "equipment": ("rower",), "impact": "low", "muscles": "full",
+     "avoid": ("back_pain",)},
+    {"name": "跳绳", "type": "cardio", "equipment": ("jump_rope",), "impact": "high", "muscles": "full",
+     "avoid": ("knee_pain", "ankle_pain")},
+    {"name": "原地交替提膝", "type": "cardio", "equipment": (), "impact": "low", "muscles": "core", "avoid": ()},
+
+    # ----- HIIT -----
+    {"name": "波比跳", "type": "hiit", "equipment": (), "impact": "high", "muscles": "full",
+     "avoid": ("knee_pain", "back_pain", "wrist_pain", "ankle_pain")},
+    {"name": "深蹲跳", "type": "hiit", "equipment": (), "impact": "high", "muscles": "lower",
+     "avoid": ("knee_pain", "ankle_pain")},
+    {"name": "高抬腿跑", "type": "hiit", "equipment": (), "impact": "high", "muscles": "lower",
+     "avoid": ("knee_pain", "ankle_pain")},
+    {"name": "登山者", "type": "hiit", "equipment": (), "impact": "medium", "muscles": "core",
+     "avoid": ("wrist_pain", "shoulder_pain")},
+    {"name": "快速出拳", "type": "hiit", "equipment": (), "impact": "low", "muscles": "upper", "avoid": ()},
+    {"name": "壶铃摆荡", "type": "hiit", "equipment": ("kettlebell",), "impact": "medium", "muscles": "full",
+     "avoid": ("back_pain",)},
+    {"name": "站姿交叉触膝", "type": "hiit", "equipment": (), "impact": "low", "muscles": "core", "avoid": ()},
+
+    # ----- 力量 -----
+    {"name": "俯卧撑", "type": "strength", "equipment": (), "impact": "low", "muscles": "upper",
+     "avoid": ("wrist_pain", "shoulder_pain")},
+    {"name": "徒手深蹲", "type": "strength", "equipment": (), "impact": "low", "muscles": "lower",
+     "avoid": ("knee_pain",)},
+    {"name": "臀桥", "type": "strength", "equipment": (), "impact": "low", "muscles": "lower", "avoid": ()},
+    {"name": "箭步蹲", "type": "strength", "equipment": (), "impact": "medium", "muscles": "lower",
+     "avoid": ("knee_pain",)},
+    {"name": "侧卧抬腿", "type": "strength", "equipment": (), "impact": "low", "muscles": "lower", "avoid": ()},
+    {"name": "平板支撑", "type": "strength", "equipment": (), "impact": "low", "muscles": "core",
+     "avoid": ("shoulder_pain",)},
+    {"name": "死虫式", "type": "strength", "equipment": (), "impact": "low", "muscles": "core", "avoid": ()},
+    {"name": "鸟狗式", "type": "strength", "equipment": (), "impact": "low", "muscles": "core", "avoid": ()},
+    {"name": "反向撑体", "type": "strength", "equipment": (), "impact": "low", "muscles": "upper",
+     "avoid": ("wrist_pain", "shoulder_pain")},
+    {"name": "哑铃划船", "type": "strength", "equipment": ("dumbbell",), "impact": "low", "muscles": "upper",
+     "avoid": ("back_pain",)},
+    {"name": "哑铃推举", "type": "strength", "equipment": ("dumbbell",), "impact": "low", "muscles": "upper",
+     "avoid": ("shoulder_pain",)},
+    {"name": "哑铃弯举", "type": "strength", "equipment": ("dumbbell",), "impact": "low", "muscles": "upper",
+     "avoid": ("wrist_pain",)},
+    {"name": "哑铃罗马尼亚硬拉", "type": "strength", "equipment": ("dumbbell",), "impact": "low", "muscles": "lower",
+     "avoid": ("back_pain",)},
+    {"name": "高脚杯深蹲", "type": "strength", "equipment": ("dumbbell",), "impact": "low", "muscles": "lower",
+     "avoid": ("knee_pain",)},
+    {"name": "弹力带划船", "type": "strength", "equipment": ("band",), "impact": "low", "muscles": "upper",
+     "avoid": ()},
+    {"name": "弹力带侧向行走", "type": "strength", "equipment": ("band",), "impact": "low", "muscles": "lower",
+     "avoid": ()},
+    {"name": "杠铃深蹲", "type": "strength", "equipment": ("barbell",), "impact": "low", "muscles": "lower",
+     "avoid": ("knee_pain", "back_pain")},
+    {"name": "杠铃卧推", "type": "strength", "equipment": ("barbell", "bench"), "impact": "low", "muscles": "upper",
+     "avoid": ("shoulder_pain",)},
+    {"name": "引体向上", "type": "strength", "equipment": ("pull_up_bar",), "impact": "low", "muscles": "upper",
+     "avoid": ("shoulder_pain",)},
+
+    # ----- 拉伸放松 -----
+    {"name": "股四头肌拉伸", "type": "yoga", "equipment": (), "impact": "low", "muscles": "lower", "avoid": ()},
+    {"name": "腘绳肌拉伸", "type": "yoga", "equipment": (), "impact": "low", "muscles": "lower", "avoid": ()},
+    {"name": "婴儿式", "type": "yoga", "equipment": (), "impact": "low", "muscles": "core", "avoid": ("knee_pain",)},
+    {"name": "胸部门框拉伸", "type": "yoga", "equipment": (), "impact": "low", "muscles": "upper", "avoid": ()},
+    {"name": "肩部交叉拉伸", "type": "yoga", "equipment": (), "impact": "low", "muscles": "upper", "avoid": ()},
+    {"name": "仰卧扭转", "type": "yoga", "equipment": (), "impact": "low", "muscles": "core", "avoid": ()},
+    {"name": "鸽子式", "type": "yoga", "equipment": (), "impact": "low", "muscles": "lower", "avoid": ("knee_pain",)},
+]
+
+# 用户写法 -> 器械标识
+EQUIPMENT_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "dumbbell": ("dumbbell", "哑铃"),
+    "kettlebell": ("kettlebell", "壶铃"),
+    "barbell": ("barbell", "杠铃"),
+    "bench": ("bench", "卧推凳", "训练凳"),
+    "band": ("band", "弹力带", "阻力带"),
+    "treadmill": ("treadmill", "跑步机"),
+    "bike": ("bike", "单车"),
+    "elliptical": ("elliptical", "椭圆机"),
+    "rower": ("rower", "划船机"),
+    "jump_rope": ("jump_rope", "rope", "跳绳"),
+    "pull_up_bar": ("pull_up", "pullup", "单杠", "引体"),
+}
+
+# 用户写法 -> 身体限制标识
+LIMITATION_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "knee_pain": ("knee", "膝"),
+    "back_pain": ("back", "腰", "背"),
+    "shoulder_pain": ("shoulder", "肩"),
+    "wrist_pain": ("wrist", "腕"),
+    "ankle_pain": ("ankle", "踝"),
+    "hypertension": ("hypertension", "blood_pressure", "heart", "高血压", "心脏"),
+}
+
+_LIMITATION_TIPS = {
+    "knee_pain": "膝盖不适：已避开跳跃和深蹲类动作，下肢训练以臀桥、侧卧抬腿为主，出现疼痛立即停止。",
+    "back_pain": "腰背不适：已避开硬拉和负重深蹲，全程收紧核心，避免弯腰负重。",
+    "shoulder_pain": "肩部不适：已避开推举和支撑类动作，手臂不要举过头顶发力。",
+    "wrist_pain": "手腕不适：已避开俯卧撑和手撑地动作。",
+    "ankle_pain": "脚踝不适：已避开跳跃动作，有氧以快走或单车为主。",
+    "hypertension": "血压偏高：强度控制在中等以内，不要憋气发力，感到头晕立即停止。",
+}
+
+INTENSITY_LEVELS = ("low", "medium", "high")
+# 各强度对应最大心率的百分比区间
+HR_ZONES = {"low": (0.50, 0.60), "medium": (0.60, 0.75), "high": (0.75, 0.90)}
+
+
+def max_heart_rate(age: int) -> float:
+    return 208 - 0.7 * age
+
+
+def heart_rate_zone(age: int, intensity: str) -> str:
+    low, high = HR_ZONES.get(intensity, HR_ZONES["medium"])
+    hr_max = max_heart_rate(age)
+    return f"{round(hr_max * low)}-{round(hr_max * high)} bpm"
+
+
+def _normalize(values: Iterable[str], aliases: Dict[str, Tuple[str, ...]]) -> Set[str]:
+    out = set()
+    for v in values:
+        v = v.strip().lower()
+        for key, words in aliases.items():
+            if v == key or any(w in v for w in words):
+                out.add(key)
+    return out
+
+
+def _cap(intensity: str, max_intensity: str) -> str:
+    return min(intensity, max_intensity, key=INTENSITY_LEVELS.index)
+
+
+def _pick(types: Tuple[str, ...], n: int, equipment: Set[str], limitations: Set[str],
+          max_impact: str, focus: Optional[str] = None, used: Set[str] = frozenset()) -> List[str]:
+    """
+    选 n 个动作：用得上的器械优先；有 focus 时先取该部位的动作，
+    其余按部位轮流取，保证搭配均衡。前面小节用过的动作（used）只在不够时才重复。
+    """
+    allowed = [
+        e for e in EXERCISES
+        if e["type"] in types
+        and set(e["equipment"]) <= equipment
+        and not limitations & set(e["avoid"])
+        and INTENSITY_LEVELS.index(e["impact"]) <= INTENSITY_LEVELS.index(max_impact)
+    ]
+    allowed.sort(key=lambda e: (e["name"] in used, not e["equipment"]))
+
+    picked = [e["name"] for e in allowed if e["muscles"] == focus][:n]
+    by_muscle: Dict[str, List[dict]] = {}
+    for e in allowed:
+        if e["name"] not in picked:
+            by_muscle.setdefault(e["muscles"], []).append(e)
+    while len(picked) < n and any(by_muscle.values()):
+        for queue in by_muscle.values():
+            if queue and len(picked) < n:
+                picked.append(queue.pop(0)["name"])
+    return picked
+
+
+def _split_minutes(total: int, with_accessory: bool) -> Tuple[int, int, int, int]:
+    """把总时长分成 热身 / 主训练 / 辅助训练 / 拉伸。"""
+    warmup = max(3, min(10, round(total * 0.15)))
+    cooldown = max(3, min(10, round(total * 0.10)))
+    main = total - warmup - cooldown
+    accessory = 0
+    if with_accessory and main >= 30:
+        accessory = round(main * 0.4)
+        main -= accessory
+    return warmup, main, accessory, cooldown
+
+
+def build_workout_plan(age: int, goal: str, available_minutes: int,
+                       equipment: Iterable[str] = (), limitations: Iterable[str] = (),
+                       focus: Optional[str] = None, day: str = "今天") -> dict:
+    """
+    按目标、可用时间、器械和身体限制生成今天的训练，结构同大模型返回的 JSON。
+    focus 为 upper / lower / core / full 时，主训练和辅助训练优先选该部位的动作。
+    """
+    equipment_set = _normalize(equipment, EQUIPMENT_ALIASES)
+    limitation_set = _normalize(limitations, LIMITATION_ALIASES)
+    max_intensity = "medium" if "hypertension" in limitation_set or age >= 60 else "high"
+    max_impact = "low" if limitation_set & {"knee_pain", "ankle_pain"} else max_intensity
+    total = max(10, available_minutes)
+
+    # 主训练 / 辅助训练的类型和强度
+    if goal == "gain":
+        main = ("strength", ("strength",), "high", "主训练：力量", focus)
+        accessory = ("strength", ("strength",), "medium", "辅助训练：核心", "core")
+    elif goal == "lose":
+        hiit = total <= 35 and max_intensity == "high"
+        main = ("hiit", ("hiit",), "high", "主训练：HIIT 循环", focus) if hiit else \
+            ("cardio", ("cardio",), "medium", "主训练：中等强度有氧", focus)
+        accessory = ("strength", ("strength",), "medium", "辅助训练：全身力量", focus)
+    elif goal == "health":
+        main = ("cardio", ("cardio",), "low", "主训练：低强度有氧", focus)
+        accessory = ("mobility", ("mobility", "yoga"), "low", "辅助训练：灵活性", None)
+    else:
+        main = ("strength", ("strength",), "medium", "主训练：全身力量", focus)
+        accessory = ("cardio", ("cardio",), "medium", "辅助训练：有氧", focus)
+
+    warm_min, main_min, acc_min, cool_min = _split_minutes(total, with_accessory=True)
+    # 可用时间不足 10 分钟时：热身和拉伸各不超过可用时间的 1/4（不够 1 分钟就去掉），
+    # 其余都给主训练，总时长等于可用时间
+    if available_minutes < total:
+        budget = max(1, available_minutes)
+        warm_min = min(warm_min, budget // 4)
+        cool_min = min(cool_min, budget // 4)
+        main_min = budget - warm_min - cool_min
+
+    used: Set[str] = set()
+    pick = dict(equipment=equipment_set, limitations=limitation_set, max_impact=max_impact, used=used)
+    training = []
+    for block, minutes in ((main, main_min), (accessory, acc_min)):
+        if minutes <= 0:
+            continue
+        type_, types, intensity, name, block_focus = block
+        training.append(_session(name, type_, minutes, _cap(intensity, max_intensity), types, age,
+                                 block_focus, pick))
+    sessions = list(training)
+    if warm_min > 0:
+        sessions.insert(0, _session("热身", "mobility", warm_min, "low", ("mobility",), age, None, pick))
+    if cool_min > 0:
+        sessions.append(_session("拉伸放松", "yoga", cool_min, "low", ("yoga",), age, None, pick))
+
+    tips = [_LIMITATION_TIPS[k] for k in LIMITATION_ALIASES if k in limitation_set]
+    if tips:
+        for s in training:
+            s["tips"] = s["tips"] + " " + " ".join(tips)
+
+    return {
+        "day": day,
+        "goal": goal,
+        "total_duration": sum(s["duration_minutes"] for s in sessions),
+        "sessions": sessions,
+    }
+
+
+def _session(name: str, type_: str, minutes: int, intensity: str, types: Tuple[str, ...], age: int,
+             focus: Optional[str], pick: dict) -> dict:
+    if type_ == "strength":
+        # 一组加组间休息约 1.5 分钟，时间少时减组数
+        exercises = _pick(types, max(3, min(6, minutes // 5)), focus=focus, **pick)
+        sets = max(1, min(3, int(minutes / (1.5 * max(1, len(exercises))))))
+        reps = "8-10" if intensity == "high" else "12-15"
+        description = f"每个动作 {sets} 组 × {reps} 次，组间休息 60 秒，动作之间休息 90 秒。"
+        tips = "动作标准优先，最后两次有挑战但能保持姿势的重量最合适。"
+    elif type_ == "hiit":
+        exercises = _pick(types, 4, focus=focus, **pick)
+        # 每个动作 1 分钟（40 秒 + 休息 20 秒），轮间再休息 1 分钟
+        rounds = max(1, (minutes + 1) // (len(exercises) + 1))
+        description = f"每个动作 40 秒、休息 20 秒，{len(exercises)} 个动作为一轮，共 {rounds} 轮，轮间休息 1 分钟。"
+        tips = "保持动作质量，喘不过气时把 40 秒缩短为 30 秒。"
+    elif type_ == "cardio":
+        exercises = _pick(types, 2 if minutes < 20 else 3, focus=focus, **pick)
+        each = max(1, minutes // max(1, len(exercises)))
+        description = f"依次进行，每项约 {each} 分钟，保持在目标心率区间。"
+        tips = "能说话但唱不了歌的强度刚好；心率超出区间就放慢。"
+    elif type_ == "yoga":
+        exercises = _pick(types, max(3, min(6, minutes)), focus=focus, **pick)
+        description = "每个动作静态保持 30-45 秒，左右各一次，配合深呼吸。"
+        tips = "拉伸到有牵拉感即可，不要弹振。"
+    else:
+        exercises = _pick(types, max(3, min(5, minutes)), focus=focus, **pick)
+        description = "每个动作 30-60 秒，由慢到快，让心率和体温逐步升高。"
+        tips = "热身后微微出汗即可，不要消耗太多体力。"
+    pick["used"].update(exercises)
+
+    return {
+        "name": name,
+        "type": type_,
+        "duration_minutes": minutes,
+        "intensity": intensity,
+        "target_heart_rate": heart_rate_zone(age, intensity),
+        "description": description,
+        "exercises": exercises,
+        "tips": tips,
+    }
@@ -0,0 +1,316 @@
+# food_db.py
+"""
+外部食物库（SQLite 文件）
+
+食物表大到上万条（例如全国食物成分表）时不适合再写成 Python 字面量，
+改为放进一个 SQLite 文件，food_data 在第一次用到时才读取。
+
+- 只读打开并一直保持连接，设置 PRAGMA mmap_size：库文件通过 mmap 映射，
+  多个 uvicorn worker 读的是同一份操作系统页缓存，进程里不常驻条目和索引的副本
+- FoodTable 是库上的只读序列，条目在访问时才从映射的页里解码
+- 名称索引（精确查找 + 二元组倒排，见 food_index.py）在写库时一起建成
+  food_names / food_name_grams 两张表，SqliteFoodIndex 直接查这两张表；
+  没有索引表的旧库退回到在进程内构建 FoodIndex
+- 一行一个食物，字段与 FOOD_ITEMS 的条目一致，aliases 存为 JSON 数组
+- 整数热量 / 份量按整数存（NUMERIC 亲和），读出来和内置数据类型一致
+
+代价是遍历全部条目（例如本地生成食谱时按饮食类型过滤）每次都要从库里解码，
+一万条约几十毫秒。
+
+生成 / 导入：
+    python food_db.py build [db_path]              # 把内置的 FOOD_ITEMS 写成食物库
+    python food_db.py import <csv_path> [db_path]  # 从 CSV 导入（追加 / 按 id 覆盖）
+    python food_db.py reindex [db_path]            # 给旧库补建名称索引表
+
+CSV 需要带表头，列名同 FOOD_ITEMS 的字段，aliases 一列用 | 分隔多个别名。
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from food_index import FoodIndex, _bigrams, normalize_chars, normalize_key
+
+FOOD_DB_FILE = os.getenv("FOOD_DB_FILE", "food_data.db")
+# mmap 映射的最大字节数，0 表示不用 mmap（按普通文件读，页缓存仍由系统共享）
+FOOD_DB_MMAP_SIZE = int(os.getenv("FOOD_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# FoodTable 顺序遍历时每次取多少行
+FOOD_DB_SCAN_BATCH = 1000
+# 一条 SQL 里 IN (...) 最多放多少个参数
+_IN_BATCH = 500
+
+FOOD_FIELDS = (
+    "id", "cn_name", "en_name", "aliases", "category", "unit",
+    "kcal_per_100g", "protein_per_100g", "fat_per_100g", "carb_per_100g",
+    "typical_portion_g",
+)
+# 可以为空的字段，读出时为空就不放进条目里
+OPTIONAL_FIELDS = ("protein_per_100g", "fat_per_100g", "carb_per_100g")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS food_items (
+    id TEXT PRIMARY KEY,
+    cn_name TEXT NOT NULL,
+    en_name TEXT NOT NULL DEFAULT '',
+    aliases TEXT NOT NULL DEFAULT '[]',
+    category TEXT NOT NULL DEFAULT '',
+    unit TEXT NOT NULL DEFAULT 'g',
+    kcal_per_100g NUMERIC NOT NULL,
+    protein_per_100g NUMERIC,
+    fat_per_100g NUMERIC,
+    carb_per_100g NUMERIC,
+    typical_portion_g NUMERIC NOT NULL DEFAULT 100
+);
+"""
+
+# 名称索引，内容和 FoodIndex 在内存里建的一致：name_id 顺序相同，同一个 key 只保留先出现的
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS food_names (
+    name_id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,          -- normalize_key，精确查找
+    norm TEXT NOT NULL,                -- normalize_chars 后的名称，在文本里找食物
+    food_rowid INTEGER NOT NULL,
+    gram_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_food_names_norm ON food_names (norm);
+CREATE TABLE IF NOT EXISTS food_name_grams (
+    gram TEXT NOT NULL,
+    name_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, name_id)
+) WITHOUT ROWID;
+"""
+
+
+def _row_to_item(row: tuple) -> Dict:
+    item = dict(zip(FOOD_FIELDS, row))
+    item["aliases"] = json.loads(item["aliases"])
+    for k in OPTIONAL_FIELDS:
+        if item[k] is None:
+            del item[k]
+    return item
+
+
+class FoodTable(Sequence):
+    """
+    食物库上的只读序列，顺序同插入顺序（rowid）。
+    进程里只保存 下标 -> rowid 的数组，条目在访问时按 rowid 从库里解码，
+    每次返回新的 dict，调用方只读不改。连接只读、常开，多线程共用一把锁。
+    """
+
+    def __init__(self, path: str = FOOD_DB_FILE):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        if FOOD_DB_MMAP_SIZE:
+            self._conn.execute(f"PRAGMA mmap_size={FOOD_DB_MMAP_SIZE}")
+        self._select = f"SELECT rowid, {', '.join(FOOD_FIELDS)} FROM food_items"
+        self._rowids = array("q", (r[0] for r in self._conn.execute(
+            "SELECT rowid FROM food_items ORDER BY rowid")))
+
+    def __len__(self) -> int:
+        return len(self._rowids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.by_rowid(self._rowids[index])
+
+    def by_rowid(self, rowid: int) -> Dict:
+        row = self._query(self._select + " WHERE rowid = ?", (rowid,))[0]
+        return _row_to_item(row[1:])
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def __iter__(self) -> Iterator[Dict]:
+        # 按 rowid 分批取，锁只在取一批时持有
+        last = None
+        while True:
+            with self._lock:
+                if last is None:
+                    rows = self._conn.execute(
+                        self._select + " ORDER BY rowid LIMIT ?", (FOOD_DB_SCAN_BATCH,)).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        self._select + " WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                        (last, FOOD_DB_SCAN_BATCH)).fetchall()
+            for row in rows:
+                yield _row_to_item(row[1:])
+            if len(rows) < FOOD_DB_SCAN_BATCH:
+                return
+            last = rows[-1][0]
+
+    def names(self) -> Iterator[tuple]:
+        """(下标, cn_name, en_name, aliases)，给 FoodIndex 构建名称索引用，不解码其他字段。"""
+        rows = self._query("SELECT cn_name, en_name, aliases FROM food_items ORDER BY rowid")
+        for i, (cn, en, aliases) in enumerate(rows):
+            yield i, cn, en, json.loads(aliases)
+
+
+class SqliteFoodIndex(FoodIndex):
+    """
+    查询库里 food_names / food_name_grams 的 FoodIndex，进程里不建自动机和倒排表。
+    食物引用是 food_items 的 rowid；在文本里找食物时把文本的所有子串
+    （长度不超过最长的名称）一次 IN 查询，代替 Aho–Corasick 扫描。
+    """
+
+    def __init__(self, table: FoodTable):
+        self.items = table
+        self._table = table
+        self._max_len = table._query("SELECT COALESCE(MAX(length(norm)), 0) FROM food_names")[0][0]
+
+    def _exact_ref(self, key: str) -> Optional[int]:
+        rows = self._table._query("SELECT food_rowid FROM food_names WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def _name(self, name_id: int) -> Tuple[str, int]:
+        return tuple(self._table._query(
+            "SELECT norm, food_rowid FROM food_names WHERE name_id = ?", (name_id,))[0])
+
+    def _item(self, ref: int) -> dict:
+        return self._table.by_rowid(ref)
+
+    def _scan(self, text: str) -> List[Tuple[int, int, int]]:
+        spans: Dict[str, List[Tuple[int, int]]] = {}
+        for i in range(len(text)):
+            for j in range(i + 1, min(len(text), i + self._max_len) + 1):
+                spans.setdefault(text[i:j], []).append((i, j))
+        subs = list(spans)
+        matches = []
+        for b in range(0, len(subs), _IN_BATCH):
+            chunk = subs[b:b + _IN_BATCH]
+            rows = self._table._query(
+                f"SELECT norm, name_id FROM food_names WHERE norm IN ({', '.join('?' * len(chunk))})",
+                chunk)
+            for norm, name_id in rows:
+                matches.extend((i, j, name_id) for i, j in spans[norm])
+        return matches
+
+    def _candidates(self, grams: Set[str], limit: Optional[int]) -> List[Tuple[int, int, str, int]]:
+        if not grams:
+            return []
+        grams = list(grams)[:_IN_BATCH]
+        sql = (
+            "SELECT g.name_id, COUNT(*) AS shared, n.norm, n.gram_count "
+            "FROM food_name_grams g JOIN food_names n ON n.name_id = g.name_id "
+            f"WHERE g.gram IN ({', '.join('?' * len(grams))}) "
+            "GROUP BY g.name_id ORDER BY shared DESC, g.name_id"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [tuple(r) for r in self._table._query(sql, grams)]
+
+
+def has_name_index(table: FoodTable) -> bool:
+    return bool(table._query(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'food_name_grams'"))
+
+
+def load_food_items(path: str = FOOD_DB_FILE) -> FoodTable:
+    """打开食物库，返回只读的 FoodTable（条目按插入顺序）。库不存在时抛 FileNotFoundError。"""
+    return FoodTable(path)
+
+
+def open_food_index(table: FoodTable) -> FoodIndex:
+    """库里有名称索引表就直接查表，否则（旧库）在进程内构建。"""
+    return SqliteFoodIndex(table) if has_name_index(table) else FoodIndex(table)
+
+
+def _build_name_index(conn: sqlite3.Connection) -> None:
+    """按 food_items 的 rowid 顺序重建 food_names / food_name_grams。"""
+    conn.executescript(_INDEX_SCHEMA)
+    names, grams, seen = [], [], set()
+    for rowid, cn_name, en_name, aliases in conn.execute(
+            "SELECT rowid, cn_name, en_name, aliases FROM food_items ORDER BY rowid"):
+        for name in [cn_name, en_name, *json.loads(aliases)]:
+            key = normalize_key(name)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            norm = normalize_chars(name).strip()
+            name_grams = _bigrams(norm.replace(" ", ""))
+            names.append((len(names), key, norm, rowid, len(name_grams)))
+            grams.extend((g, len(names) - 1) for g in name_grams)
+    with conn:
+        conn.execute("DELETE FROM food_name_grams")
+        conn.execute("DELETE FROM food_names")
+        conn.executemany("INSERT INTO food_names VALUES (?, ?, ?, ?, ?)", names)
+        conn.executemany("INSERT INTO food_name_grams VALUES (?, ?)", grams)
+
+
+def write_food_items(items: Iterable[Dict], path: str = FOOD_DB_FILE) -> int:
+    """写入 / 按 id 覆盖食物条目，返回写入条数。"""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.executescript(_SCHEMA)
+        rows = []
+        for item in items:
+            row = [item.get(k) for k in FOOD_FIELDS]
+            row[FOOD_FIELDS.index("aliases")] = json.dumps(item.get("aliases") or [], ensure_ascii=False)
+            rows.append(row)
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO food_items ({', '.join(FOOD_FIELDS)}) "
+                f"VALUES ({', '.join('?' * len(FOOD_FIELDS))})",
+                rows,
+            )
+        _build_name_index(conn)
+        conn.execute("VACUUM")
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def reindex(path: str = FOOD_DB_FILE) -> None:
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        _build_name_index(conn)
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def _number(value: str):
+    if value in ("", None):
+        return None
+    f = float(value)
+    return int(f) if f.is_integer() else f
+
+
+def read_csv(csv_path: str) -> List[Dict]:
+    items = []
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            item = {k: (row.get(k) or "").strip() for k in FOOD_FIELDS}
+            item["aliases"] = [a.strip() for a in item["aliases"].split("|") if a.strip()]
+            for k in ("kcal_per_100g", "typical_portion_g") + OPTIONAL_FIELDS:
+                item[k] = _number(item[k])
+            item["id"] = item["id"] or item["cn_name"]
+            item["unit"] = item["unit"] or "g"
+            item["typical_portion_g"] = item["typical_portion_g"] or 100
+            items.append(item)
+    return items
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        from food_items_builtin import BUILTIN_FOOD_ITEMS
+        n = write_food_items(BUILTIN_FOOD_ITEMS, *sys.argv[2:3])
+        print(f"已写入 {n} 种食物")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "import":
+        n = write_food_items(read_csv(sys.argv[2]), *sys.argv[3:4])
+        print(f"已导入 {n} 种食物")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "reindex":
+        reindex(*sys.argv[2:3])
+        print("已重建名称索引")
+    else:
+        print("用法: python food_db.py build [db_path] | python food_db.py import <csv_path> [db_path]"
+              " | python food_db.py reindex [db_path]")
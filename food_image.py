@@ -0,0 +1,152 @@
+# food_image.py
+"""
+食物照片的预处理和结果缓存（POST /api/ai/food-calorie/image）
+
+手机照片动辄 3~8 MB、4000 万像素，而视觉模型（Qwen-VL）内部会缩到约 100 万像素，
+原图直接 base64 发过去只是白白增加上传和排队时间。上传后先在本地：
+1. 解码（JPEG 用 draft 直接按 1/2、1/4、1/8 解码，大图解码快很多），按 EXIF 方向转正
+2. 等比缩小到不超过 IMAGE_MAX_PIXELS 像素
+3. 重新编码成 JPEG（IMAGE_JPEG_QUALITY），通常只剩 100~200 KB
+4. 算 64 位 dHash 感知哈希：同一张照片重新上传、被压缩 / 缩放 / 改了格式，哈希基本不变
+
+识别结果按感知哈希缓存，汉明距离不超过 IMAGE_HASH_DISTANCE 的照片视为同一张，
+直接返回上次的结果，不再调视觉模型。
+
+    IMAGE_MAX_UPLOAD_MB=10       上传大小上限
+    IMAGE_MAX_PIXELS=1003520     缩放后的像素上限（qwen-vl 默认 max_pixels = 1280 * 28 * 28）
+    IMAGE_JPEG_QUALITY=85
+    IMAGE_HASH_DISTANCE=4        64 位 dHash 的汉明距离阈值，0 为只认完全相同
+    IMAGE_CACHE_SIZE=512         缓存的识别结果条数，0 为关闭
+    IMAGE_CACHE_TTL=86400        （秒）
+"""
+
+import io
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+IMAGE_MAX_UPLOAD_MB = float(os.getenv("IMAGE_MAX_UPLOAD_MB", "10"))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(1280 * 28 * 28)))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_HASH_DISTANCE = int(os.getenv("IMAGE_HASH_DISTANCE", "4"))
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "512"))
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "86400"))
+
+IMAGE_MAX_UPLOAD_BYTES = int(IMAGE_MAX_UPLOAD_MB * 1024 * 1024)
+
+# 防解压炸弹：像素数超过它的 2 倍时 Pillow 直接抛 DecompressionBombError
+Image.MAX_IMAGE_PIXELS = 100_000_000
+
+
+# ========= 预处理 =========
+
+def _target_size(width: int, height: int, max_pixels: int) -> Tuple[int, int]:
+    if width * height <= max_pixels:
+        return width, height
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def dhash(img: Image.Image) -> int:
+    """差值哈希：缩成 9x8 灰度图，每行相邻像素比较亮度，得到 64 位。"""
+    small = img.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def preprocess_image(data: bytes, max_pixels: int = IMAGE_MAX_PIXELS,
+                     quality: int = IMAGE_JPEG_QUALITY) -> Tuple[bytes, int]:
+    """
+    解码上传的图片，缩放、转正后重新编码成 JPEG，返回 (JPEG 字节, 感知哈希)。
+    不是图片或无法解码时抛 ValueError。CPU 密集，路由里放到线程里跑。
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        # JPEG 解码时直接按 2 的幂缩小，不用先解出整张大图
+        img.draft("RGB", _target_size(img.width, img.height, max_pixels))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError("无法识别的图片格式，请上传 JPEG / PNG / WebP 照片") from e
+
+    size = _target_size(img.width, img.height, max_pixels)
+    if size != img.size:
+        img = img.resize(size, Image.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=quality, optimize=True)
+    return out.getvalue(), dhash(img)
+
+
+# ========= 按感知哈希缓存 =========
+
+class ImageResultCache:
+    """
+    感知哈希 -> 识别结果（dict）。查找时在同一段文字说明下找汉明距离最近且不超过阈值的一条；
+    条数不多（IMAGE_CACHE_SIZE），线性扫描即可。
+    """
+
+    def __init__(self, maxsize: int = IMAGE_CACHE_SIZE, ttl: float = IMAGE_CACHE_TTL,
+                 max_distance: int = IMAGE_HASH_DISTANCE):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Tuple[int, str], tuple]" = OrderedDict()   # (哈希, 说明) -> (过期时间, 结果)
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, phash: int, note: str = "") -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            best, best_distance = None, self.max_distance + 1
+            for key, (expires_at, _) in self._items.items():
+                if key[1] != note or expires_at < now:
+                    continue
+                distance = bin(key[0] ^ phash).count("1")
+                if distance < best_distance:
+                    best, best_distance = key, distance
+            if best is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(best)
+            if best_distance == 0:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            return self._items[best][1]
+
+    def put(self, phash: int, note: str, result: dict) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[(phash, note)] = (time.time() + self.ttl, result)
+            self._items.move_to_end((phash, note))
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._items),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+image_results = ImageResultCache()
@@ -0,0 +1,279 @@
+# food_index.py
+"""
+食物名称索引（food_data 在导入时构建一次）
+
+三种查找方式，都不随食物表线性扫描：
+- 精确查找：cn_name / en_name / aliases 归一化后的 dict
+- 文本中找食物：所有名称编译成一个 Aho–Corasick 自动机，
+  一遍扫描找出「米饭加两个鸡蛋」里出现的全部食物名及位置
+- 模糊匹配：字符二元组（首尾加边界符）倒排索引 + Dice 相似度，
+  处理「西蓝花」「鸡胸」这类写法不完全一致的片段
+
+归一化是逐字符的（全角转半角 + 小写），不改变文本长度，
+所以返回的 span 可以直接用在原始文本上。
+
+索引里只存食物在 items 里的下标，命中时才取 items[下标]；items 可以是 list，
+也可以是 food_db.FoodTable 这类按需解码的只读序列。
+查找逻辑只通过 _exact_ref / _scan / _name / _candidates / _item 访问索引数据，
+food_db.SqliteFoodIndex 覆盖这几个方法，改为查询库文件里预先建好的索引表。
+"""
+
+import re
+import unicodedata
+from collections import Counter, deque
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# 模糊匹配的最低 Dice 相似度
+FUZZY_THRESHOLD = 0.5
+# 每个片段最多对多少个候选名称做窗口比对
+FUZZY_MAX_CANDIDATES = 20
+
+# 精确匹配之外的剩余文本按这些分隔：标点、空白、常见连接词
+_SEGMENT_SPLIT = re.compile(r"[\s,，。.、;；!！?？+＋&/]+|加上|还有|以及|和|跟|配|加|与")
+# 片段开头的数量词（两个 / 200g / 一碗），模糊匹配前去掉（用 match(pos) 锚定开头）
+_LEADING_QTY = re.compile(
+    r"(?:\d+(?:\.\d+)?|[零一二两三四五六七八九十半]+)\s*"
+    r"(?:kg|g|ml|千克|公斤|毫升|克|斤|两|个|份|碗|杯|根|片|只|块|听|罐|瓶|盒|串|勺|盘|颗|条|袋|支)?"
+)
+
+
+def normalize_chars(text: str) -> str:
+    """逐字符 NFKC + 小写；某个字符归一化后长度变化时保留原字符，保证长度不变。"""
+    out = []
+    for ch in text:
+        n = unicodedata.normalize("NFKC", ch).lower()
+        out.append(n if len(n) == 1 else ch)
+    return "".join(out)
+
+
+def normalize_key(text: str) -> str:
+    """精确查找用的 key：逐字符归一化后去掉所有空白。"""
+    return "".join(normalize_chars(text).split())
+
+
+def _bigrams(text: str) -> Set[str]:
+    padded = "^" + text + "$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def _item_names(items: Sequence[dict]):
+    """(下标, cn_name, en_name, aliases)；FoodTable 有 names() 时只读名称列。"""
+    if hasattr(items, "names"):
+        return items.names()
+    return ((pos, item["cn_name"], item["en_name"], item.get("aliases", []))
+            for pos, item in enumerate(items))
+
+
+class FoodIndex:
+    def __init__(self, items: Sequence[dict]):
+        self.items = items
+        self.exact: Dict[str, int] = {}          # 归一化名称 -> 食物下标
+        # 所有名称（含别名）及其食物下标，列表下标即名称 id
+        self._names: List[Tuple[str, int]] = []
+        for pos, cn_name, en_name, aliases in _item_names(items):
+            for name in [cn_name, en_name, *aliases]:
+                key = normalize_key(name)
+                if not key or key in self.exact:
+                    # 同一个别名出现在多个食物里时，保留先出现的
+                    continue
+                self.exact[key] = pos
+                self._names.append((normalize_chars(name).strip(), pos))
+
+        self._build_automaton()
+        self._build_ngram_index()
+
+    # ----- Aho–Corasick -----
+
+    def _build_automaton(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]   # 在该状态结束的名称 id
+        for name_id, (name, _) in enumerate(self._names):
+            state = 0
+            for ch in name:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state].append(name_id)
+
+        # BFS 建 fail 指针；根的直接子节点 fail 指向根
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                if state:
+                    self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _scan(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回所有 (start, end, name_id) 匹配，可能互相重叠。"""
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for name_id in self._out[state]:
+                length = len(self._names[name_id][0])
+                matches.append((i + 1 - length, i + 1, name_id))
+        return matches
+
+    # ----- 字符 n-gram 模糊匹配 -----
+
+    def _build_ngram_index(self) -> None:
+        self._name_grams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        for name_id, (name, _) in enumerate(self._names):
+            grams = _bigrams(name.replace(" ", ""))
+            self._name_grams.append(grams)
+            for g in grams:
+                self._postings.setdefault(g, []).append(name_id)
+
+    # ----- 索引数据的访问（SqliteFoodIndex 覆盖） -----
+
+    def _exact_ref(self, key: str) -> Optional[int]:
+        """归一化 key -> 食物引用（这里是 items 的下标），没有返回 None。"""
+        return self.exact.get(key)
+
+    def _name(self, name_id: int) -> Tuple[str, int]:
+        """名称 id -> (归一化名称, 食物引用)。"""
+        return self._names[name_id]
+
+    def _item(self, ref: int) -> dict:
+        return self.items[ref]
+
+    def _candidates(self, grams: Set[str], limit: Optional[int]) -> List[Tuple[int, int, str, int]]:
+        """
+        和 grams 有共同二元组的名称，按共同个数从多到少，最多 limit 个（None 为全部）。
+        每项为 (名称 id, 共同个数, 归一化名称, 名称的二元组个数)。
+        """
+        shared = Counter()
+        for g in grams:
+            for name_id in self._postings.get(g, ()):
+                shared[name_id] += 1
+        return [(name_id, n, self._names[name_id][0], len(self._name_grams[name_id]))
+                for name_id, n in shared.most_common(limit)]
+
+    def _best_window(self, text: str, start: int, end: int,
+                     threshold: float) -> Optional[Tuple[float, int, int, int]]:
+        """
+        在 text[start:end] 里找与某个名称最相似的窗口，返回 (相似度, 窗口起点, 窗口终点, 名称 id)。
+        候选名称来自片段内二元组的倒排表，只和长度相近（±1）的窗口比较，
+        这样「吃了点鸡胸」里的「鸡胸」也能对上「鸡胸肉」。
+        """
+        seg = text[start:end]
+        seg_grams = {seg[i:i + 2] for i in range(len(seg) - 1)}
+
+        best = None
+        window_grams: Dict[Tuple[int, int], Set[str]] = {}
+        for name_id, _, name, _ in self._candidates(seg_grams, FUZZY_MAX_CANDIDATES):
+            name_grams = _bigrams(name.replace(" ", ""))
+            n = len(name)
+            for w in range(max(2, n - 1), min(len(seg), n + 1) + 1):
+                for ws in range(0, len(seg) - w + 1):
+                    grams = window_grams.get((ws, w))
+                    if grams is None:
+                        grams = window_grams[(ws, w)] = _bigrams(seg[ws:ws + w])
+                    score = 2 * len(grams & name_grams) / (len(grams) + len(name_grams))
+                    if score >= threshold and (best is None or score > best[0]):
+                        best = (score, start + ws, start + ws + w, name_id)
+        return best
+
+    def _fuzzy_spans(self, text: str, start: int, end: int, threshold: float, out: list) -> None:
+        """取最相似的窗口，再对它左右两边递归，一个片段里可以找出多个食物。"""
+        m = _LEADING_QTY.match(text, start, end)
+        if m:
+            start = m.end()
+        if end - start < 2:
+            return
+        best = self._best_window(text, start, end, threshold)
+        if best is None:
+            return
+        out.append(best)
+        self._fuzzy_spans(text, start, best[1], threshold, out)
+        self._fuzzy_spans(text, best[2], end, threshold, out)
+
+    # ----- 对外接口 -----
+
+    def lookup(self, name: str) -> Optional[dict]:
+        ref = self._exact_ref(normalize_key(name))
+        return None if ref is None else self._item(ref)
+
+    def find(self, text: str, fuzzy: bool = True) -> List[dict]:
+        """
+        找出文本中提到的所有食物，每个命中为
+            {"item", "name", "start", "end", "score", "match": "exact" | "fuzzy"}
+        先取最左最长、互不重叠的精确匹配（score=1.0），
+        剩余片段再做模糊匹配，按 score 从高到低、位置从前到后排序。
+        """
+        norm = normalize_chars(text)
+        hits = []
+        covered = [False] * len(norm)
+        for start, end, name_id in sorted(self._scan(norm), key=lambda m: (m[0], m[0] - m[1])):
+            if any(covered[start:end]):
+                continue
+            for i in range(start, end):
+                covered[i] = True
+            name, ref = self._name(name_id)
+            hits.append({"item": self._item(ref), "name": name, "start": start, "end": end,
+                         "score": 1.0, "match": "exact"})
+
+        if fuzzy:
+            found: List[Tuple[float, int, int, int]] = []
+            for start, end in _uncovered_spans(covered):
+                for seg_start, seg_end in _segments(norm, start, end):
+                    self._fuzzy_spans(norm, seg_start, seg_end, FUZZY_THRESHOLD, found)
+            for score, start, end, name_id in found:
+                name, ref = self._name(name_id)
+                hits.append({"item": self._item(ref), "name": name, "start": start, "end": end,
+                             "score": round(score, 3), "match": "fuzzy"})
+
+        hits.sort(key=lambda h: (-h["score"], h["start"]))
+        return hits
+
+    def related(self, text: str, k: int) -> List[dict]:
+        """
+        按字符二元组重合度给名称打分（名称有多大比例的二元组出现在 text 里），
+        返回最相关的 k 个不重复食物。用于在 find 之外补充「相近」的条目。
+        """
+        norm = normalize_key(text)
+        candidates = self._candidates({norm[i:i + 2] for i in range(len(norm) - 1)}, None)
+        ranked = sorted(candidates, key=lambda c: (-c[1] / c[3], c[0]))
+        items, seen = [], set()
+        for name_id, _, _, _ in ranked:
+            ref = self._name(name_id)[1]
+            if ref not in seen:
+                seen.add(ref)
+                items.append(self._item(ref))
+                if len(items) >= k:
+                    break
+        return items
+
+
+def _uncovered_spans(covered: List[bool]):
+    start = None
+    for i, c in enumerate(covered + [True]):
+        if not c and start is None:
+            start = i
+        elif c and start is not None:
+            yield start, i
+            start = None
+
+
+def _segments(text: str, start: int, end: int):
+    pos = start
+    for m in _SEGMENT_SPLIT.finditer(text, start, end):
+        if m.start() > pos:
+            yield pos, m.start()
+        pos = m.end()
+    if pos < end:
+        yield pos, end
@@ -0,0 +1,159 @@
+# food_resolver.py
+"""
+食物热量的本地快速解析：不调大模型，直接查 food_data.FOOD_ITEMS
+
+能处理「食物名 + 分量」这类简单描述，例如：
+    "一碗米饭"、"200g 鸡胸肉"、"两个鸡蛋"、"半斤牛肉"、"一听可乐"、"香蕉"
+
+解析步骤：
+1. 归一化（全角转半角、小写）后，先整句查名字索引（别名里本身就有「一碗米饭」这种写法）
+2. 否则抽出分量表达式（数字 / 中文数字 + 单位），去掉「大概」「左右」等虚词，
+   剩下的部分必须恰好是某个食物的中文名 / 英文名 / 别名
+3. 质量单位按克换算，体积单位按 1ml≈1g，个 / 碗 / 杯 等按 typical_portion_g 计份数
+
+剩余部分不是一个已知食物（比如「鸡胸肉沙拉」「米饭加两个鸡蛋」）就返回 None，
+交给大模型处理，宁可不命中也不给出错误的结果。
+"""
+
+import re
+import unicodedata
+from typing import Optional, Tuple
+
+from food_data import lookup_food
+
+# 质量 / 体积单位 -> 克（毫升按 1:1 近似）
+MASS_UNITS = {
+    "g": 1, "克": 1, "公克": 1,
+    "kg": 1000, "千克": 1000, "公斤": 1000,
+    "斤": 500,
+    "ml": 1, "毫升": 1,
+    "l": 1000, "升": 1000,
+}
+# 计数单位：按 typical_portion_g 计份数
+COUNT_UNITS = (
+    "个", "份", "碗", "杯", "根", "片", "只", "块", "听", "罐", "瓶",
+    "盒", "串", "勺", "盘", "颗", "条", "袋", "支",
+)
+# 「两」只有跟在数字后面时才当重量单位（二两米饭），单独的「两个」是数字
+LIANG_G = 50
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5,
+              "六": 6, "七": 7, "八": 8, "九": 9}
+_NUM = r"(\d+(?:\.\d+)?|[零一二两三四五六七八九十]+|半)"
+_UNIT = "|".join(
+    sorted(list(MASS_UNITS) + list(COUNT_UNITS) + ["两"], key=len, reverse=True)
+)
+_QTY_RE = re.compile(_NUM + r"\s*(" + _UNIT + r")")
+_FILLER_RE = re.compile(r"大概|大约|约|左右|差不多|吃了|喝了|来了|一共|的|[,，。.、!！~～\s]")
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).strip().lower()
+
+
+def _name_key(text: str) -> str:
+    """查名字索引用的 key：去掉空白、标点和虚词。"""
+    return _FILLER_RE.sub("", text)
+
+
+def _parse_number(s: str) -> Optional[float]:
+    if s == "半":
+        return 0.5
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    # 中文数字，支持到 99：三 / 十 / 十二 / 二十 / 二十五
+    if "十" in s:
+        tens, _, ones = s.partition("十")
+        t = _CN_DIGITS.get(tens, None) if tens else 1
+        o = _CN_DIGITS.get(ones, None) if ones else 0
+        if t is None or o is None:
+            return None
+        return float(t * 10 + o)
+    if len(s) == 1 and s in _CN_DIGITS:
+        return float(_CN_DIGITS[s])
+    return None
+
+
+def _extract_quantity(text: str) -> Tuple[str, Optional[float], Optional[str]]:
+    """抽出第一个分量表达式，返回 (剩余文本, 数量, 单位)。"""
+    m = _QTY_RE.search(text)
+    if not m:
+        return text, None, None
+    num = _parse_number(m.group(1))
+    if num is None:
+        return text, None, None
+    return text[:m.start()] + text[m.end():], num, m.group(2)
+
+
+def _health_score(item: dict) -> int:
+    category = item["category"]
+    if category in ("蔬菜", "水果"):
+        return 5
+    if category in ("饮料", "甜点"):
+        return 2
+    if item.get("fat_per_100g", 0) >= 20:
+        return 2
+    if category == "肉蛋鱼" and item.get("protein_per_100g", 0) >= 15:
+        return 4
+    return 3
+
+
+_ADVICE = {
+    5: "热量低、营养密度高，可以放心多吃一些。",
+    4: "优质蛋白来源，搭配蔬菜和适量主食更均衡。",
+    3: "注意控制分量，搭配蔬菜和蛋白质一起吃。",
+    2: "热量或糖 / 脂肪偏高，建议减少分量或降低食用频率。",
+}
+
+
+def resolve_food_query(query: str) -> Optional[dict]:
+    """
+    能在食物表里确定解析就返回
+        {"name", "calories", "health_score", "advice", "grams", "item",
+         "protein_g", "fat_g", "carb_g"}
+    否则返回 None。营养素在食物表里缺失时对应值为 None。
+    """
+    text = normalize(query)
+    if not text:
+        return None
+
+    num, unit = None, None
+    item = lookup_food(_name_key(text))
+    if item is None:
+        rest, num, unit = _extract_quantity(text)
+        item = lookup_food(_name_key(rest))
+        if item is None:
+            return None
+
+    if unit is None:
+        grams = item["typical_portion_g"]
+    elif unit in MASS_UNITS:
+        grams = num * MASS_UNITS[unit]
+    elif unit == "两":
+        grams = num * LIANG_G
+    else:
+        grams = num * item["typical_portion_g"]
+
+    calories = int(round(item["kcal_per_100g"] * grams / 100))
+    score = _health_score(item)
+    unit_label = "ml" if item["unit"] == "ml" else "g"
+    return {
+        "name": item["cn_name"],
+        "calories": calories,
+        "health_score": score,
+        "advice": f"按约 {grams:g}{unit_label} 估算。{_ADVICE[score]}",
+        "grams": grams,
+        "item": item,
+        **macros_for(item, grams),
+    }
+
+
+def macros_for(item: dict, grams: float) -> dict:
+    """按食物表的每 100g 含量折算成 grams 克的蛋白质 / 脂肪 / 碳水（克）。"""
+    out = {}
+    for key in ("protein", "fat", "carb"):
+        per_100g = item.get(f"{key}_per_100g")
+        out[f"{key}_g"] = round(per_100g * grams / 100, 1) if per_100g is not None else None
+    return out
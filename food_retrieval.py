@@ -0,0 +1,275 @@
+# food_retrieval.py
+"""
+给 prompt 挑选食物表：只放和当前请求相关的 top-k 条，而不是整张表
+
+- 热量估算（/api/ai/food-calorie）：先取描述里提到的食物（find_foods），
+  再按名称字符重合度补充相近条目（related_foods），最多 FOOD_PROMPT_TOP_K 条；
+  批量估算把各条描述的结果轮流合并
+- 食谱推荐（/api/ai/meal-plan）：按 diet_type / restrictions 过滤，按目标打分，
+  再按类别轮流取（主食、蛋白质、蔬菜、水果……），保证搭配齐全，最多 MEAL_PROMPT_TOP_K 条
+
+两者最后都按 FOOD_PROMPT_MAX_TOKENS 截断，食物库再大，prompt 里的表格大小也是固定上限。
+is_food_allowed 也给本地生成食谱等逻辑复用。
+"""
+
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from food_data import find_foods, get_food_items, related_foods
+
+FOOD_PROMPT_TOP_K = int(os.getenv("FOOD_PROMPT_TOP_K", "12"))
+MEAL_PROMPT_TOP_K = int(os.getenv("MEAL_PROMPT_TOP_K", "16"))
+# 表格部分的 token 上限（粗略估算，见 estimate_tokens）
+FOOD_PROMPT_MAX_TOKENS = int(os.getenv("FOOD_PROMPT_MAX_TOKENS", "400"))
+
+# ========= 饮食类型 / 禁忌过滤 =========
+# 食物条目没有配料字段，按名称关键词判断（外部食物库同样适用）
+
+MEAT_WORDS = ("肉", "鸡", "鸭", "鹅", "鱼", "虾", "蟹", "贝", "猪", "羊", "排骨",
+              "翅", "火腿", "香肠", "培根", "牛排")
+EGG_WORDS = ("蛋",)
+DAIRY_WORDS = ("奶", "乳", "酪", "芝士", "黄油", "冰淇淋", "冰激凌", "雪糕")
+# 这些词含「奶 / 鸡」等字但并不是对应食材
+_SAFE_WORDS = ("牛油果", "椰奶", "豆奶", "豆乳", "鸡毛菜", "高蛋白")
+
+NUT_WORDS = ("坚果", "花生", "核桃", "杏仁", "腰果", "榛子", "开心果", "碧根果", "松子",
+             "夏威夷果", "peanut", "nut")
+
+# 常见禁忌写法 -> 需要排除的关键词。先去掉「过敏」「不吃」等外壳（见 _restriction_words），
+# 命中多个键时全部排除；一个都没对上时按去壳后的词匹配名称
+RESTRICTION_WORDS: Dict[str, tuple] = {
+    "海鲜": ("鱼", "虾", "蟹", "贝"),
+    "seafood": ("鱼", "虾", "蟹", "贝"),
+    "虾": ("虾",),
+    "shrimp": ("虾", "shrimp"),
+    "蟹": ("蟹",),
+    "crab": ("蟹", "crab"),
+    "乳糖": DAIRY_WORDS,
+    "乳制品": DAIRY_WORDS,
+    "牛奶": DAIRY_WORDS,
+    "奶": DAIRY_WORDS,
+    "milk": DAIRY_WORDS,
+    "lactose": DAIRY_WORDS,
+    "dairy": DAIRY_WORDS,
+    "花生": ("花生", "peanut"),
+    "peanut": ("花生", "peanut"),
+    "坚果": NUT_WORDS,
+    "nut": NUT_WORDS,
+    "猪肉": ("猪", "五花", "红烧肉", "排骨", "火腿", "培根", "香肠", "饺子"),
+    "pork": ("猪", "五花", "红烧肉", "排骨", "火腿", "培根", "香肠", "饺子"),
+    "牛肉": ("牛肉", "牛排"),
+    "beef": ("牛肉", "牛排"),
+    "鸡蛋": EGG_WORDS,
+    "蛋": EGG_WORDS,
+    "egg": EGG_WORDS,
+    "麸质": ("面", "馒头", "包", "饺子", "饼干", "曲奇", "蛋糕"),
+    "gluten": ("面", "馒头", "包", "饺子", "饼干", "曲奇", "蛋糕"),
+    "糖": ("可乐", "奶茶", "果汁", "橙汁", "蛋糕", "饼干", "曲奇", "冰淇淋"),
+    "sugar": ("可乐", "奶茶", "果汁", "橙汁", "蛋糕", "饼干", "曲奇", "冰淇淋"),
+    "油炸": ("炸",),
+    "fried": ("炸",),
+    "辣": ("辣",),
+    "spicy": ("辣",),
+}
+
+# 禁忌的常见外壳：「对花生过敏」「不吃猪肉」「乳糖不耐受」「忌辣」「no pork」……
+_RESTRICTION_PREFIX = re.compile(r"^(对于|对|不能吃|不能喝|不吃|不喝|不要|忌口|忌|戒|无|no\s+|avoid\s+)")
+_RESTRICTION_SUFFIX = re.compile(r"(过敏|不耐受|不耐|忌口|\s*allergy|\s*allergic|\s*intolerance|\s*intolerant|-?free)$")
+# 「花生、虾过敏」这类一条里写了多样
+_RESTRICTION_SEP = re.compile(r"[、,，/;；]+|和|及|与")
+
+LOW_CARB_MAX = 20          # low-carb 时排除每 100g 碳水超过该值的食物
+# 食谱里按这个顺序轮流取类别，靠前的类别优先进表
+CATEGORY_ORDER = ("主食", "肉蛋鱼", "豆制品", "蔬菜", "奶制品", "水果", "饮料", "甜点")
+
+
+def _names_text(item: dict) -> str:
+    text = " ".join([item["cn_name"], item.get("en_name", ""), *item.get("aliases", [])]).lower()
+    for w in _SAFE_WORDS:
+        text = text.replace(w, "")
+    return text
+
+
+def _contains(text: str, words: Iterable[str]) -> bool:
+    return any(w in text for w in words)
+
+
+@lru_cache(maxsize=1024)
+def _restriction_words(restriction: str) -> tuple:
+    """一条禁忌 -> 名称里出现就要排除的关键词。每个食物都要判断一次，结果按禁忌缓存。"""
+    words = []
+    text = re.sub(r"[:：]", " ", restriction.strip().lower())
+    for part in _RESTRICTION_SEP.split(text):
+        core = _RESTRICTION_SUFFIX.sub("", _RESTRICTION_PREFIX.sub("", part.strip())).strip()
+        if not core:
+            continue
+        # 长的键先匹配并从词里去掉，「乳糖」不会再命中「糖」，「牛奶」不会再命中「奶」
+        matched, rest = [], core
+        for k in sorted(RESTRICTION_WORDS, key=len, reverse=True):
+            if k in rest:
+                matched.extend(RESTRICTION_WORDS[k])
+                rest = rest.replace(k, " ")
+        # 对不上已知写法时不能放行：至少按去壳后的词排除
+        words.extend(matched or [core])
+    return tuple(dict.fromkeys(words))
+
+
+def is_food_allowed(item: dict, diet_type: str = "none", restrictions: Iterable[str] = ()) -> bool:
+    """按饮食类型（vegetarian / vegan / low-carb）和禁忌判断一个食物能不能吃。"""
+    text = _names_text(item)
+    diet = (diet_type or "none").lower()
+    # 「鸡蛋」「鸭蛋」里的鸡 / 鸭不算肉
+    meat_text = text.replace("鸡蛋", "").replace("鸭蛋", "")
+    is_meat = _contains(meat_text, MEAT_WORDS) or (
+        item.get("category") == "肉蛋鱼" and not _contains(text, EGG_WORDS)
+    )
+
+    if diet in ("vegetarian", "素食", "蛋奶素"):
+        if is_meat:
+            return False
+    elif diet in ("vegan", "纯素"):
+        if is_meat or item.get("category") in ("肉蛋鱼", "奶制品") \
+                or _contains(text, EGG_WORDS + DAIRY_WORDS):
+            return False
+    elif diet in ("low-carb", "low_carb", "keto", "低碳", "生酮"):
+        if item.get("carb_per_100g", 0) > LOW_CARB_MAX:
+            return False
+
+    for r in restrictions:
+        r = r.strip().lower()
+        if not r:
+            continue
+        if _contains(text, _restriction_words(r)) or r == item.get("category"):
+            return False
+    return True
+
+
+# ========= token 预算 =========
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算：中日韩字符按 1 个 token，其他字符按 4 个一个 token。"""
+    wide = sum(1 for ch in text if ord(ch) > 0x2E80)
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def fit_to_budget(lines: List[str], max_tokens: int = FOOD_PROMPT_MAX_TOKENS) -> List[str]:
+    """按顺序保留行，直到超出 token 预算。"""
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+# ========= 表格行 =========
+
+def _food_line(item: dict, with_macros: bool = False) -> str:
+    unit = "ml" if item.get("unit") == "ml" else "g"
+    names = item["cn_name"]
+    aliases = [a for a in item.get("aliases", []) if a != item["cn_name"]][:2]
+    if aliases:
+        names += f"（{'/'.join(aliases)}）"
+    line = f"- {names}: {int(item['kcal_per_100g'])} kcal/100{unit}"
+    if with_macros and item.get("protein_per_100g") is not None:
+        line += f"，蛋白质 {item['protein_per_100g']:g}g"
+    return line + f"，一份约 {item['typical_portion_g']:g}{unit}"
+
+
+def _unique(items: Iterable[dict]) -> List[dict]:
+    seen, out = set(), []
+    for item in items:
+        if item["id"] not in seen:
+            seen.add(item["id"])
+            out.append(item)
+    return out
+
+
+def select_foods_for_query(query: str, k: int = FOOD_PROMPT_TOP_K) -> List[dict]:
+    """描述里提到的食物在前，再补充名称相近的食物。"""
+    hits = [h["item"] for h in find_foods(query)]
+    return _unique(hits + related_foods(query, k))[:k]
+
+
+def food_table_for_query(query: str, k: int = FOOD_PROMPT_TOP_K,
+                         max_tokens: int = FOOD_PROMPT_MAX_TOKENS) -> str:
+    lines = fit_to_budget([_food_line(item) for item in select_foods_for_query(query, k)], max_tokens)
+    return "\n".join(lines) if lines else "（食物表中没有相近的食物，请按常识估算）"
+
+
+def food_table_for_queries(queries: List[str], k: int = FOOD_PROMPT_TOP_K,
+                           max_tokens: int = FOOD_PROMPT_MAX_TOKENS) -> str:
+    """批量估算用：依次取每条描述的相关食物，合并去重后整体按 token 预算截断。"""
+    per_query = [select_foods_for_query(q, k) for q in queries]
+    # 轮流取，预算不够时每条描述都至少保留最相关的几条
+    merged = []
+    for rank in range(k):
+        merged.extend(items[rank] for items in per_query if rank < len(items))
+    lines = fit_to_budget([_food_line(item) for item in _unique(merged)], max_tokens)
+    return "\n".join(lines) if lines else "（食物表中没有相近的食物，请按常识估算）"
+
+
+def _diet_score(item: dict, goal: str) -> float:
+    """越大越优先：减脂看蛋白质占热量比和低能量密度，增肌看蛋白质含量。"""
+    kcal = max(float(item["kcal_per_100g"]), 1.0)
+    protein = float(item.get("protein_per_100g") or 0)
+    protein_ratio = protein * 4 / kcal
+    if goal == "lose":
+        return protein_ratio - kcal / 1000
+    if goal == "gain":
+        return protein / 30 + protein_ratio / 2
+    return protein_ratio
+
+
+def select_foods_for_diet(diet_type: str = "none", restrictions: Iterable[str] = (),
+                          goal: str = "maintain", tastes: Iterable[str] = (),
+                          k: int = MEAL_PROMPT_TOP_K,
+                          items: Optional[List[dict]] = None) -> List[dict]:
+    """过滤掉不能吃的，按目标打分，口味偏好提到的食物优先，再按类别轮流取。"""
+    restrictions = list(restrictions)
+    items = [i for i in (items if items is not None else get_food_items())
+             if is_food_allowed(i, diet_type, restrictions)]
+
+    preferred = set()
+    taste_text = " ".join(tastes)
+    if taste_text.strip():
+        preferred = {h["item"]["id"] for h in find_foods(taste_text)}
+
+    by_category: Dict[str, List[dict]] = {}
+    for item in sorted(items, key=lambda i: (i["id"] not in preferred, -_diet_score(i, goal))):
+        by_category.setdefault(item.get("category", ""), []).append(item)
+    order = [c for c in CATEGORY_ORDER if c in by_category] + \
+            [c for c in by_category if c not in CATEGORY_ORDER]
+    # 饮料、甜点只在其他类别取完后才补
+    main = [c for c in order if c not in ("饮料", "甜点")]
+    extra = [c for c in order if c in ("饮料", "甜点")]
+
+    picked: List[dict] = []
+    for group in (main, extra):
+        queues = [list(by_category[c]) for c in group]
+        while len(picked) < k and any(queues):
+            for q in queues:
+                if q and len(picked) < k:
+                    picked.append(q.pop(0))
+    return picked
+
+
+def food_table_for_diet(diet_type: str = "none", restrictions: Iterable[str] = (),
+                        goal: str = "maintain", tastes: Iterable[str] = (),
+                        k: int = MEAL_PROMPT_TOP_K,
+                        max_tokens: int = FOOD_PROMPT_MAX_TOKENS) -> str:
+    return _diet_table(diet_type, tuple(restrictions), goal, tuple(tastes), k, max_tokens)
+
+
+# 要遍历整张食物表，一周计划每天的 prompt 参数又相同；结果只是几行文字，按参数缓存
+@lru_cache(maxsize=256)
+def _diet_table(diet_type: str, restrictions: tuple, goal: str, tastes: tuple,
+                k: int, max_tokens: int) -> str:
+    items = select_foods_for_diet(diet_type, restrictions, goal, tastes, k)
+    lines = fit_to_budget([_food_line(item, with_macros=True) for item in items], max_tokens)
+    return "\n".join(lines)
@@ -0,0 +1,356 @@
+# job_queue.py
+"""
+大模型任务的后台队列（异步任务模式）
+
+生成一周计划、食谱这类请求要跑几十秒，一直占着 HTTP 连接，反向代理 30 秒就断了。
+异步任务模式下：
+- POST /api/ai/jobs/{kind}   请求体和对应的同步接口一样，立刻返回 202 + 任务 id
+- GET  /api/ai/jobs/{id}     查询状态：queued / running / succeeded / failed，
+                             完成后带上 result（和同步接口的响应一样）或 error
+kind 为 meal-plan / workout-plan / weekly-plan / food-calorie / food-calorie-batch，
+由各路由模块用 @job_kind 注册。
+
+- 优先级：?priority=high|normal|low，同优先级先进先出
+- 队列有上限（JOB_QUEUE_SIZE），满了返回 503 + Retry-After
+- 结果保留 JOB_RESULT_TTL 秒，过期后查询返回 404
+- 可选 ?callback_url=https://...：任务结束后把和 GET 一样的 JSON POST 过去（webhook）。
+  默认关闭；只有主机在 JOB_WEBHOOK_ALLOWED_HOSTS 里的地址才接受，
+  防止借服务器之手访问本机、内网或云厂商的元数据地址（SSRF）
+
+任务存放后端通过 JOB_BACKEND 选择：
+- memory : 进程内优先队列 + dict（默认），重启后任务丢失
+- redis  : Redis 或兼容 Redis 协议的本地服务（JOB_REDIS_URL），需要 pip install redis。
+           多个进程共享同一个队列，每个进程都起 JOB_WORKERS 个 worker
+
+    JOB_BACKEND=memory
+    JOB_WORKERS=4            每个进程的 worker 数（真正打到大模型的并发仍受 LLM_MAX_CONCURRENCY 限制）
+    JOB_QUEUE_SIZE=100       排队中的任务上限
+    JOB_RESULT_TTL=900       结果保留时间（秒）
+    JOB_WEBHOOK_TIMEOUT=10   回调请求的超时（秒）
+    JOB_WEBHOOK_ALLOWED_HOSTS=hooks.example.com,*.example.org   允许回调的主机，为空则不接受回调
+"""
+
+import asyncio
+import fnmatch
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, Type
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")
+JOB_REDIS_URL = os.getenv("JOB_REDIS_URL", "redis://localhost:6379/0")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "900"))
+JOB_WEBHOOK_TIMEOUT = float(os.getenv("JOB_WEBHOOK_TIMEOUT", "10"))
+JOB_WEBHOOK_ALLOWED_HOSTS = [
+    h.strip().lower() for h in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()
+]
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+router = APIRouter(prefix="/api/ai", tags=["ai-jobs"])
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def webhook_allowed(url: str) -> bool:
+    """只接受 http(s)，且主机匹配 JOB_WEBHOOK_ALLOWED_HOSTS（支持 *.example.com）。"""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        return False
+    return any(fnmatch.fnmatchcase(host, pattern) for pattern in JOB_WEBHOOK_ALLOWED_HOSTS)
+
+
+# ========= 任务类型 =========
+
+JobHandler = Callable[[BaseModel], Awaitable[BaseModel]]
+_kinds: Dict[str, Tuple[Type[BaseModel], JobHandler]] = {}
+
+
+def job_kind(name: str, request_model: Type[BaseModel]):
+    """注册一种任务：handler 接收校验好的请求模型，返回响应模型。"""
+    def decorator(handler: JobHandler) -> JobHandler:
+        _kinds[name] = (request_model, handler)
+        return handler
+    return decorator
+
+
+# ========= 存放后端 =========
+# 任务是可 JSON 序列化的 dict：
+# id / kind / status / priority / payload / callback_url / created_at / started_at / finished_at / result / error
+
+class MemoryJobBackend:
+    """进程内：asyncio.PriorityQueue 排队，dict 保存任务。"""
+
+    def __init__(self, maxsize: int = JOB_QUEUE_SIZE, ttl: float = JOB_RESULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._jobs: Dict[str, Tuple[float, dict]] = {}   # id -> (过期时间, 任务)，未结束的任务不过期
+        self._seq = itertools.count()
+
+    @property
+    def queue(self) -> asyncio.PriorityQueue:
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue(self.maxsize)
+        return self._queue
+
+    async def enqueue(self, job: dict) -> None:
+        try:
+            self.queue.put_nowait((PRIORITIES[job["priority"]], next(self._seq), job["id"]))
+        except asyncio.QueueFull:
+            raise QueueFullError() from None
+        self._jobs[job["id"]] = (float("inf"), job)
+
+    async def dequeue(self) -> str:
+        return (await self.queue.get())[2]
+
+    async def save(self, job: dict) -> None:
+        expires_at = time.time() + self.ttl if job["finished_at"] else float("inf")
+        self._jobs[job["id"]] = (expires_at, job)
+        self._purge()
+
+    async def load(self, job_id: str) -> Optional[dict]:
+        entry = self._jobs.get(job_id)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def depth(self) -> Optional[int]:
+        return self.queue.qsize()
+
+    def _purge(self) -> None:
+        now = time.time()
+        for job_id in [k for k, (exp, _) in self._jobs.items() if exp < now]:
+            del self._jobs[job_id]
+
+
+class RedisJobBackend:
+    """
+    Redis（或兼容协议的本地服务）：任务 JSON 存在 {prefix}:job:{id}，结束后设过期时间；
+    排队用有序集合 {prefix}:queue，score = 优先级 * 1e13 + 入队毫秒数，BZPOPMIN 取最小的。
+    """
+
+    def __init__(self, url: str = JOB_REDIS_URL, maxsize: int = JOB_QUEUE_SIZE,
+                 ttl: float = JOB_RESULT_TTL, prefix: str = "healthcube:jobs"):
+        import redis.asyncio as redis   # 只有 JOB_BACKEND=redis 时才需要
+        self._redis = redis.from_url(url, decode_responses=True)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._queue_key = f"{prefix}:queue"
+        self._job_prefix = f"{prefix}:job:"
+
+    async def enqueue(self, job: dict) -> None:
+        # 先查长度再入队不是原子的，多进程同时提交时可能略超上限
+        if await self._redis.zcard(self._queue_key) >= self.maxsize:
+            raise QueueFullError()
+        score = PRIORITIES[job["priority"]] * 1e13 + time.time() * 1000
+        await self._redis.set(self._job_prefix + job["id"], json.dumps(job, ensure_ascii=False))
+        await self._redis.zadd(self._queue_key, {job["id"]: score})
+
+    async def dequeue(self) -> str:
+        while True:
+            item = await self._redis.bzpopmin(self._queue_key, timeout=5)
+            if item:
+                return item[1]
+
+    async def save(self, job: dict) -> None:
+        ttl = int(self.ttl) if job["finished_at"] else None
+        await self._redis.set(self._job_prefix + job["id"], json.dumps(job, ensure_ascii=False), ex=ttl)
+
+    async def load(self, job_id: str) -> Optional[dict]:
+        raw = await self._redis.get(self._job_prefix + job_id)
+        return json.loads(raw) if raw else None
+
+    def depth(self) -> Optional[int]:
+        return None   # 要查 Redis，stats 里不给
+
+
+def _create_backend():
+    if JOB_BACKEND == "memory":
+        return MemoryJobBackend()
+    if JOB_BACKEND == "redis":
+        return RedisJobBackend()
+    raise RuntimeError(f"未知的 JOB_BACKEND: {JOB_BACKEND}")
+
+
+# ========= 队列与 worker =========
+
+class JobQueue:
+    def __init__(self, backend, workers: int = JOB_WORKERS):
+        self.backend = backend
+        self.workers = workers
+        self._tasks: Set[asyncio.Task] = set()
+        self._webhooks: Set[asyncio.Task] = set()
+        self.running = 0
+        self.counts = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0,
+                       "webhooks": 0, "webhook_errors": 0, "worker_errors": 0}
+
+    def start(self) -> None:
+        """启动 worker；已经在跑就什么也不做（提交任务时也会调用，保证有人消费）。"""
+        if self._tasks:
+            return
+        for _ in range(self.workers):
+            self._tasks.add(asyncio.ensure_future(self._worker()))
+
+    async def stop(self) -> None:
+        for task in self._tasks | self._webhooks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._webhooks, return_exceptions=True)
+        self._tasks.clear()
+        self._webhooks.clear()
+
+    async def submit(self, kind: str, payload: dict, priority: str = "normal",
+                     callback_url: Optional[str] = None) -> dict:
+        job = {
+            "id": uuid.uuid4().hex, "kind": kind, "status": "queued", "priority": priority,
+            "payload": payload, "callback_url": callback_url,
+            "created_at": time.time(), "started_at": None, "finished_at": None,
+            "result": None, "error": None,
+        }
+        try:
+            await self.backend.enqueue(job)
+        except QueueFullError:
+            self.counts["rejected"] += 1
+            raise
+        self.counts["submitted"] += 1
+        self.start()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.backend.load(job_id)
+
+    async def _worker(self) -> None:
+        # 后端出错（例如 Redis 断线）只记日志，稍等后继续，worker 不退出
+        while True:
+            try:
+                job_id = await self.backend.dequeue()
+                job = await self.backend.load(job_id)
+                if job is None:
+                    continue
+                self.running += 1
+                try:
+                    await self._run(job)
+                finally:
+                    self.running -= 1
+            except Exception:
+                self.counts["worker_errors"] += 1
+                logger.exception("后台任务 worker 出错")
+                await asyncio.sleep(1)
+
+    async def _run(self, job: dict) -> None:
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        await self.backend.save(job)
+        try:
+            request_model, handler = _kinds[job["kind"]]
+            result = await handler(request_model(**job["payload"]))
+            job["status"] = "succeeded"
+            job["result"] = result.model_dump() if isinstance(result, BaseModel) else result
+            self.counts["succeeded"] += 1
+        except asyncio.CancelledError:
+            raise
+        except HTTPException as e:
+            job["status"] = "failed"
+            job["error"] = {"status_code": e.status_code, "detail": e.detail}
+            self.counts["failed"] += 1
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = {"status_code": 500, "detail": str(e)}
+            self.counts["failed"] += 1
+        job["finished_at"] = time.time()
+        await self.backend.save(job)
+
+        if job["callback_url"] and webhook_allowed(job["callback_url"]):
+            task = asyncio.ensure_future(self._notify(job))
+            self._webhooks.add(task)
+            task.add_done_callback(self._webhooks.discard)
+
+    async def _notify(self, job: dict) -> None:
+        """回调失败重试一次，仍失败只计数（结果还能通过 GET 查到）。"""
+        body = _public(job)
+        # 不跟随重定向，否则允许的主机可以把请求转到内网地址
+        async with httpx.AsyncClient(timeout=JOB_WEBHOOK_TIMEOUT, follow_redirects=False) as client:
+            for attempt in range(2):
+                try:
+                    resp = await client.post(job["callback_url"], json=body)
+                    if resp.status_code < 500:
+                        self.counts["webhooks"] += 1
+                        return
+                except httpx.HTTPError:
+                    pass
+                if attempt == 0:
+                    await asyncio.sleep(1)
+        self.counts["webhook_errors"] += 1
+
+    def stats(self) -> dict:
+        """本进程的计数；Redis 后端下排队数不统计。"""
+        return dict(self.counts, workers=len(self._tasks), running=self.running,
+                    queued=self.backend.depth())
+
+
+job_queue = JobQueue(_create_backend())
+
+
+# ========= 路由 =========
+
+class JobInfo(BaseModel):
+    id: str
+    kind: str
+    status: str          # queued / running / succeeded / failed
+    priority: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Any] = None
+    error: Optional[dict] = None
+    status_url: str
+
+
+def _public(job: dict) -> dict:
+    """对外的任务信息：去掉请求体和回调地址。"""
+    return JobInfo(**{k: v for k, v in job.items() if k not in ("payload", "callback_url")},
+                   status_url=f"{router.prefix}/jobs/{job['id']}").model_dump()
+
+
+@router.post("/jobs/{kind}", response_model=JobInfo, status_code=202)
+async def submit_job(kind: str, payload: dict = Body(...),
+                     priority: str = Query("normal", pattern="^(high|normal|low)$"),
+                     callback_url: Optional[str] = Query(None, pattern="^https?://",
+                                                         description="任务结束后 POST 结果到这个地址")):
+    """提交后台任务，请求体与对应的同步接口相同。"""
+    if kind not in _kinds:
+        raise HTTPException(status_code=404, detail=f"未知的任务类型: {kind}，可选: {', '.join(sorted(_kinds))}")
+    if callback_url and not webhook_allowed(callback_url):
+        raise HTTPException(status_code=400, detail="callback_url 的主机不在允许列表里（JOB_WEBHOOK_ALLOWED_HOSTS）")
+    try:
+        req = _kinds[kind][0](**payload)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False, include_context=False))
+    try:
+        job = await job_queue.submit(kind, req.model_dump(), priority, callback_url)
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="任务队列已满，请稍后再试", headers={"Retry-After": "10"})
+    return _public(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或结果已过期")
+    return _public(job)
@@ -0,0 +1,195 @@
+# json_repair.py
+"""
+从大模型输出里宽松地取出 JSON
+
+模型偶尔会在 JSON 前后加说明文字、用 ```json 包裹、留尾逗号、用中文标点等，
+直接 json.loads 会失败，只能重新请求。这里按顺序尝试：
+
+1. 整段直接 json.loads
+2. 找到第一个 { 或 [，按括号配对（跳过字符串内部）截出完整的 JSON；
+   输出被截断、括号没配齐时补上缺的引号和括号
+3. 逐字符修复常见问题后再解析：
+   - 尾逗号 {"a": 1,}  [1, 2,]
+   - 字符串外的中文标点 “ ” ， ：
+   - 单引号字符串 'abc'、没加引号的 key {name: "x"}
+   - Python 写法 True / False / None，NaN / Infinity
+   - // 行注释和 /* */ 块注释
+
+都不行才抛 JSONRepairError（ValueError 子类），由调用方决定是否重新请求。
+repair_stats() 给出直接解析 / 修复后解析 / 失败 / 解析出来但不符合响应模型 /
+重新请求的次数，以及修复率和失败率。
+"""
+
+import json
+import re
+import threading
+from typing import Any, Tuple
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+_FENCE = re.compile(r"```(?:json|JSON)?")
+_OPENERS = {"{": "}", "[": "]"}
+_WORD_MAP = {"True": "true", "False": "false", "None": "null",
+             "NaN": "null", "Infinity": "null", "undefined": "null"}
+_PUNCT_MAP = {"，": ",", "：": ":", "“": '"', "”": '"', "｛": "{", "｝": "}", "［": "[", "］": "]"}
+
+
+def _find_start(text: str) -> int:
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return min(starts) if starts else -1
+
+
+def _balanced_slice(text: str, start: int) -> str:
+    """从 start 开始截到与之配对的右括号；没配齐（被截断）时补齐缺的引号和括号。"""
+    stack = []
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _OPENERS:
+            stack.append(_OPENERS[ch])
+        elif ch in "}]":
+            if stack and stack[-1] == ch:
+                stack.pop()
+            if not stack:
+                return text[start:i + 1]
+    tail = '"' if in_string else ""
+    return text[start:].rstrip().rstrip(",") + tail + "".join(reversed(stack))
+
+
+def _repair(text: str) -> str:
+    """逐字符修复，只改动字符串外面的内容。"""
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        # 字符串：双引号原样保留；单引号 / 中文引号转成双引号
+        if ch in "\"'“":
+            close = {'"': '"', "'": "'", "“": "”"}[ch]
+            j = i + 1
+            buf = []
+            while j < n and text[j] != close:
+                if text[j] == "\\" and j + 1 < n:
+                    buf.append(text[j:j + 2])
+                    j += 2
+                    continue
+                if text[j] == '"' and close != '"':
+                    buf.append('\\"')
+                else:
+                    buf.append(text[j])
+                j += 1
+            out.append('"' + "".join(buf) + '"')
+            i = j + 1
+            continue
+        # 注释
+        if text.startswith("//", i):
+            j = text.find("\n", i)
+            i = n if j < 0 else j
+            continue
+        if text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            continue
+        ch = _PUNCT_MAP.get(ch, ch)
+        # 尾逗号：后面（跳过空白）紧跟 } 或 ]
+        if ch == ",":
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and _PUNCT_MAP.get(text[j], text[j]) in "}]":
+                i += 1
+                continue
+        # 裸单词：Python 字面量，或没加引号的 key
+        if ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] in "_-"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k].isspace():
+                k += 1
+            if k < n and _PUNCT_MAP.get(text[k], text[k]) == ":":
+                out.append(json.dumps(word))
+            elif word in ("true", "false", "null"):
+                out.append(word)
+            else:
+                out.append(_WORD_MAP.get(word, json.dumps(word)))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _loads(text: str) -> Any:
+    # NaN / Infinity 转成 null，否则返回响应时序列化会失败
+    return json.loads(text, parse_constant=lambda _: None)
+
+
+def extract_json(text: str) -> Tuple[Any, bool]:
+    """返回 (解析结果, 是否经过修复)。无法修复时抛 JSONRepairError。"""
+    stripped = text.strip()
+    try:
+        return _loads(stripped), False
+    except ValueError:
+        pass
+
+    body = _FENCE.sub("", stripped)
+    start = _find_start(body)
+    if start < 0:
+        raise JSONRepairError("输出中没有 JSON 对象或数组")
+    candidate = _balanced_slice(body, start)
+    try:
+        return _loads(candidate), True
+    except ValueError:
+        pass
+    try:
+        return _loads(_balanced_slice(_repair(candidate), 0)), True
+    except ValueError as e:
+        raise JSONRepairError(f"无法修复的 JSON: {e}") from e
+
+
+# ========= 统计 =========
+
+_lock = threading.Lock()
+# clean / repaired / failed 是每次解析的结果，invalid 和 retries 是调用方记的
+_stats = {"clean": 0, "repaired": 0, "failed": 0, "invalid": 0, "retries": 0}
+
+
+def record(outcome: str) -> None:
+    with _lock:
+        _stats[outcome] += 1
+
+
+def parse_llm_json(text: str) -> Any:
+    """extract_json 并记录统计。"""
+    try:
+        value, repaired = extract_json(text)
+    except JSONRepairError:
+        record("failed")
+        raise
+    record("repaired" if repaired else "clean")
+    return value
+
+
+def repair_stats() -> dict:
+    with _lock:
+        total = _stats["clean"] + _stats["repaired"] + _stats["failed"]
+        return dict(
+            _stats,
+            repair_rate=round(_stats["repaired"] / total, 4) if total else 0.0,
+            failure_rate=round(_stats["failed"] / total, 4) if total else 0.0,
+        )
@@ -0,0 +1,80 @@
+# json_stream.py
+"""
+增量 JSON 解析：大模型一边输出，一边取出数组里已经写完整的元素
+
+例如模型正在输出
+    {"daily_calorie_target": 1800, "meals": [{"meal_type": "早餐", ...}, {"meal_ty
+第一个 {...} 的右括号一到就能拿到第一顿饭，不必等整个 JSON 结束。
+
+只关心顶层对象里某个 key 对应的数组（meals / sessions），
+数组前面的 ```json 之类的包裹、其他字段都直接跳过；整个文本最后仍可以交给
+parse_json_from_llm 做一次完整解析，拿到顶层的其他字段。
+"""
+
+import json
+from typing import List
+
+
+class JsonArrayStream:
+    """
+    逐块喂入文本（feed），返回本次新完成的数组元素（已 json.loads 的对象）。
+    只跟踪字符串 / 转义 / 括号深度，每个字符只看一次。
+    """
+
+    def __init__(self, array_key: str):
+        self.array_key = array_key
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_string = None     # 最近一个结束的字符串（顶层对象里就是 key）
+        self._array_depth = None     # 目标数组所在的深度（[ 之后的深度）
+        self._item_start = -1
+        self._done = False
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.text += chunk
+        items = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._depth += 1
+                if (ch == "[" and self._depth == 2 and self._array_depth is None
+                        and not self._done and self._last_string == self.array_key):
+                    self._array_depth = 2
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._item_start = i
+            elif ch in "}]":
+                if ch == "}" and self._array_depth is not None \
+                        and self._depth == self._array_depth + 1 and self._item_start >= 0:
+                    try:
+                        items.append(json.loads(text[self._item_start:i + 1]))
+                    except ValueError:
+                        # 单个元素写坏了就跳过，整体结果仍以最终解析为准
+                        pass
+                    self._item_start = -1
+                elif ch == "]" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._array_depth = None
+                    self._done = True
+                self._depth -= 1
+            elif ch == "," and self._depth == 1:
+                self._last_string = None
+        self._pos = len(text)
+        return items
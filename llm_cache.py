@@ -0,0 +1,147 @@
+# llm_cache.py
+"""
+大模型响应缓存
+
+相同的模型 + system prompt + 归一化后的 user prompt + temperature 只调用一次大模型，
+之后直接返回解析好的 JSON。两级：
+- 内存 LRU，带 TTL（LLM_CACHE_SIZE 条，LLM_CACHE_TTL 秒）
+- 可选的 SQLite 磁盘层（配置 LLM_CACHE_DB 才启用），重启后依然有效
+
+单个请求可以带 `Cache-Control: no-cache` 请求头跳过缓存读取（结果仍会写回缓存）。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Header
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")   # 为空则不启用磁盘层
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """全角转半角（NFKC）、合并连续空白、去掉首尾空白。"""
+    return _WS.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def make_cache_key(model: str, system_prompt: str, user_prompt: str, temperature: float) -> str:
+    raw = json.dumps(
+        [model, system_prompt.strip(), normalize_prompt(user_prompt), round(temperature, 3)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """内存 LRU + TTL，外加可选的 SQLite 磁盘层。值为可 JSON 序列化的对象。"""
+
+    def __init__(self, maxsize: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL,
+                 db_path: str = LLM_CACHE_DB):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (过期时间, 值)
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @property
+    def has_disk(self) -> bool:
+        return self._db is not None
+
+    def get_memory(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+            if self._db is None:
+                self.misses += 1
+        return None
+
+    def get_disk(self, key: str):
+        """内存未命中后再查磁盘，命中则提升回内存。"""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= time.time():
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            value = json.loads(row[0])
+            self._put_memory(key, value, row[1])
+            return value
+
+    def get(self, key: str):
+        value = self.get_memory(key)
+        if value is None:
+            value = self.get_disk(key)
+        return value
+
+    def _put_memory(self, key: str, value, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def put(self, key: str, value) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value, ensure_ascii=False), expires_at),
+                    )
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self._db is not None,
+            }
+
+
+llm_cache = LLMCache()
+
+
+def cache_bypass(cache_control: Optional[str] = Header(None)) -> bool:
+    """路由依赖：请求头 Cache-Control 含 no-cache 时跳过缓存读取。"""
+    return bool(cache_control) and "no-cache" in cache_control.lower()
@@ -1,18 +1,28 @@
 # llm_image_calorie.py
-from typing import Optional
+import asyncio
+import os
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Response, UploadFile
+from pydantic import BaseModel, Field
 
-from food_data import FOOD_CALORIE_TABLE
-from llm_utils import call_llm, parse_json_from_llm
+from food_data import lookup_food
+from food_image import IMAGE_MAX_UPLOAD_BYTES, IMAGE_MAX_UPLOAD_MB, image_results, preprocess_image
+from food_resolver import macros_for, resolve_food_query
+from food_retrieval import food_table_for_queries, food_table_for_query
+from job_queue import job_kind
+from llm_cache import cache_bypass
+from llm_utils import call_llm_json_async, llm_http_error
 
 router = APIRouter(prefix="/api/ai", tags=["ai-food"])
 
+# 批量估算单次最多几条
+FOOD_BATCH_MAX = int(os.getenv("FOOD_BATCH_MAX", "30"))
+
 
 class FoodCalorieRequest(BaseModel):
     query: str = "一份鸡胸肉沙拉，大概 200g"
-    # 以后要接图片，可以再加 image_url / image_base64 字段
+    # 照片走 multipart 上传的 /food-calorie/image，不放进 JSON 里
 
 
 class FoodCalorieResponse(BaseModel):
@@ -23,11 +33,47 @@ class FoodCalorieResponse(BaseModel):
     matched_from_table: bool = False
 
 
+class FoodCalorieBatchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=FOOD_BATCH_MAX,
+                               examples=[["一碗米饭", "两个鸡蛋", "番茄炒蛋一份", "一杯奶茶"]])
+
+
+class FoodCalorieBatchItem(FoodCalorieResponse):
+    query: str
+    grams: Optional[float] = None
+    protein_g: Optional[float] = None
+    fat_g: Optional[float] = None
+    carb_g: Optional[float] = None
+
+
+class MacroTotals(BaseModel):
+    calories: int
+    protein_g: float
+    fat_g: float
+    carb_g: float
+
+
+class FoodCalorieBatchResponse(BaseModel):
+    items: List[FoodCalorieBatchItem]
+    totals: MacroTotals
+    llm_items: int     # 其中有几条是交给大模型估算的
+
+
 @router.post("/food-calorie", response_model=FoodCalorieResponse)
-def estimate_food_calorie(req: FoodCalorieRequest):
-    table_text = "\n".join(
-        [f"- {name}: {kcal} kcal" for name, kcal in FOOD_CALORIE_TABLE.items()]
-    )
+async def estimate_food_calorie(req: FoodCalorieRequest, bypass_cache: bool = Depends(cache_bypass)):
+    # 「食物名 + 分量」能在食物表里直接算出来的，不再调大模型
+    hit = resolve_food_query(req.query)
+    if hit is not None:
+        return FoodCalorieResponse(
+            name=hit["name"],
+            calories=hit["calories"],
+            health_score=hit["health_score"],
+            advice=hit["advice"],
+            matched_from_table=True,
+        )
+
+    # 只放和描述相关的几条，prompt 大小不随食物库增长
+    table_text = food_table_for_query(req.query)
 
     system_prompt = (
         "你是一名专业营养师，擅长根据食物描述估算热量。"
@@ -42,20 +88,226 @@ def estimate_food_calorie(req: FoodCalorieRequest):
     user_prompt = f"""
 用户描述的食物：{req.query}
 
-可参考的食物热量表（每 100g 或每份）：
+可参考的食物热量表（每 100g / 100ml，附一份的大致分量）：
 {table_text}
 """
 
     try:
-        raw = call_llm(system_prompt, user_prompt)
-        data = parse_json_from_llm(raw)
+        return await call_llm_json_async(
+            system_prompt, user_prompt, use_cache=not bypass_cache, endpoint="food-calorie",
+            validate=_to_food_calorie,
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"LLM 调用失败: {e}")
+        raise llm_http_error(e)
+
 
+def _to_food_calorie(data: dict) -> FoodCalorieResponse:
     return FoodCalorieResponse(
-        name=data.get("name", "未识别食物"),
-        calories=int(data.get("calories", 300)),
-        health_score=int(data.get("health_score", 3)),
-        advice=data.get("advice", "注意控制总热量和油脂摄入。"),
+        name=data.get("name") or "未识别食物",
+        calories=_to_int(data.get("calories"), 300),
+        health_score=_to_int(data.get("health_score"), 3),
+        advice=data.get("advice") or "注意控制总热量和油脂摄入。",
         matched_from_table=bool(data.get("matched_from_table", False)),
     )
+
+
+# 上传按块读，超过上限立刻停止（starlette 把 multipart 文件流式写入临时文件，不整体进内存）
+_UPLOAD_CHUNK = 256 * 1024
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    chunks, size = [], 0
+    while True:
+        chunk = await file.read(_UPLOAD_CHUNK)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > IMAGE_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"图片不能超过 {IMAGE_MAX_UPLOAD_MB:g} MB")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@router.post("/food-calorie/image", response_model=FoodCalorieResponse)
+async def estimate_food_calorie_image(response: Response,
+                                      file: UploadFile = File(..., description="食物照片（JPEG / PNG / WebP 等）"),
+                                      note: str = Form("", description="可选的文字补充，例如「一人份」「少油」"),
+                                      bypass_cache: bool = Depends(cache_bypass)):
+    """
+    看图估算热量：照片先在本地缩放、转成 JPEG（见 food_image），再交给视觉模型。
+    感知哈希相同或相近的照片（配同样的文字说明）直接返回上次的结果，响应头 X-Image-Cache: hit。
+    """
+    raw = await _read_upload(file)
+    try:
+        jpeg, phash = await asyncio.to_thread(preprocess_image, raw)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    note = note.strip()
+    if not bypass_cache:
+        cached = image_results.get(phash, note)
+        if cached is not None:
+            response.headers["X-Image-Cache"] = "hit"
+            return FoodCalorieResponse(**cached)
+
+    system_prompt = (
+        "你是一名专业营养师，擅长根据食物照片估算热量。"
+        "先识别照片里的每一种食物，再根据餐具大小估计分量，最后估算总热量。"
+        "必须以 JSON 形式回答："
+        '{"name": 食物名称（多种食物用、分隔）, "calories": 估算总热量整数kcal, '
+        '"health_score": 1到5的整数评分, "advice": "一句中文建议", '
+        '"matched_from_table": false}。'
+        "照片里没有食物时 name 为「未识别食物」、calories 为 0。"
+        "不要输出任何解释性文字。"
+    )
+    user_prompt = "请估算照片中食物的热量。"
+    if note:
+        user_prompt += f"""
+用户补充说明：{note}
+
+可参考的食物热量表（每 100g / 100ml，附一份的大致分量）：
+{food_table_for_query(note)}
+"""
+
+    try:
+        result = await call_llm_json_async(
+            system_prompt, user_prompt, use_cache=not bypass_cache, endpoint="food-image",
+            validate=_to_food_calorie, images=[jpeg],
+        )
+    except Exception as e:
+        raise llm_http_error(e)
+    image_results.put(phash, note, result.model_dump())
+    response.headers["X-Image-Cache"] = "miss"
+    return result
+
+
+@router.post("/food-calorie/batch", response_model=FoodCalorieBatchResponse)
+async def estimate_food_calorie_batch(req: FoodCalorieBatchRequest,
+                                      bypass_cache: bool = Depends(cache_bypass)):
+    """
+    一顿饭的多个食物一次估算：能在食物表里直接算的本地算，
+    其余的（去重后）合并成一次大模型调用，返回 JSON 数组。
+    """
+    results: Dict[int, FoodCalorieBatchItem] = {}
+    pending: List[str] = []            # 需要大模型估算的描述，去重
+    for i, query in enumerate(req.queries):
+        hit = resolve_food_query(query)
+        if hit is not None:
+            results[i] = FoodCalorieBatchItem(
+                query=query,
+                name=hit["name"],
+                calories=hit["calories"],
+                health_score=hit["health_score"],
+                advice=hit["advice"],
+                matched_from_table=True,
+                grams=hit["grams"],
+                protein_g=hit["protein_g"],
+                fat_g=hit["fat_g"],
+                carb_g=hit["carb_g"],
+            )
+        elif query not in pending:
+            pending.append(query)
+
+    estimated: Dict[str, FoodCalorieBatchItem] = {}
+    if pending:
+        estimated = await _estimate_batch_with_llm(pending, bypass_cache)
+
+    items = [results[i] if i in results else estimated[q] for i, q in enumerate(req.queries)]
+    totals = MacroTotals(
+        calories=sum(it.calories for it in items),
+        protein_g=round(sum(it.protein_g or 0 for it in items), 1),
+        fat_g=round(sum(it.fat_g or 0 for it in items), 1),
+        carb_g=round(sum(it.carb_g or 0 for it in items), 1),
+    )
+    return FoodCalorieBatchResponse(items=items, totals=totals, llm_items=len(pending))
+
+
+@job_kind("food-calorie", FoodCalorieRequest)
+async def _food_calorie_job(req: FoodCalorieRequest) -> FoodCalorieResponse:
+    return await estimate_food_calorie(req, bypass_cache=False)
+
+
+@job_kind("food-calorie-batch", FoodCalorieBatchRequest)
+async def _food_calorie_batch_job(req: FoodCalorieBatchRequest) -> FoodCalorieBatchResponse:
+    return await estimate_food_calorie_batch(req, bypass_cache=False)
+
+
+async def _estimate_batch_with_llm(queries: List[str], bypass_cache: bool) -> Dict[str, FoodCalorieBatchItem]:
+    table_text = food_table_for_queries(queries)
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(queries))
+
+    system_prompt = (
+        "你是一名专业营养师，擅长根据食物描述估算热量和营养素。"
+        "用户会给出多条编号的食物描述，请逐条估算，优先参考给出的食物热量表。"
+        "必须只返回一个 JSON 数组，每条描述对应一个元素："
+        '{"index": 编号, "name": 食物名称, "grams": 估算重量克数, "calories": 估算总热量整数kcal, '
+        '"protein_g": 蛋白质克数, "fat_g": 脂肪克数, "carb_g": 碳水克数, '
+        '"health_score": 1到5的整数评分, "advice": "一句中文建议", '
+        '"matched_food": 表中最接近的食物中文名或null}。'
+        "不要输出任何解释性文字。"
+    )
+    user_prompt = f"""
+食物描述：
+{numbered}
+
+可参考的食物热量表（每 100g / 100ml，附一份的大致分量）：
+{table_text}
+"""
+
+    try:
+        rows = await call_llm_json_async(
+            system_prompt, user_prompt, use_cache=not bypass_cache, endpoint="food-calorie",
+            validate=_batch_rows,
+        )
+    except Exception as e:
+        raise llm_http_error(e)
+
+    by_index = {}
+    for pos, row in enumerate(rows):
+        if isinstance(row, dict):
+            by_index.setdefault(_to_int(row.get("index"), pos), row)
+
+    out = {}
+    for i, query in enumerate(queries):
+        row = by_index.get(i, {})
+        grams = _to_float(row.get("grams"))
+        macros = {k: _to_float(row.get(k)) for k in ("protein_g", "fat_g", "carb_g")}
+        # 模型没给的营养素，对上了食物表且有重量时按食物表折算
+        item = lookup_food(str(row["matched_food"])) if row.get("matched_food") else None
+        if item is not None and grams:
+            table_macros = macros_for(item, grams)
+            macros = {k: v if v is not None else table_macros[k] for k, v in macros.items()}
+        out[query] = FoodCalorieBatchItem(
+            query=query,
+            # 模型可能给 null，字段缺失或为空都用默认值
+            name=str(row.get("name") or "未识别食物"),
+            calories=_to_int(row.get("calories"), 300),
+            health_score=_to_int(row.get("health_score"), 3),
+            advice=str(row.get("advice") or "注意控制总热量和油脂摄入。"),
+            matched_from_table=item is not None,
+            grams=grams,
+            **macros,
+        )
+    return out
+
+
+def _batch_rows(data) -> list:
+    """批量估算的结果：JSON 数组，或 {"items": [...]}；都不是时抛异常重新请求。"""
+    rows = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(rows, list):
+        raise ValueError("批量估算结果不是数组")
+    return rows
+
+
+def _to_int(value, default: int) -> int:
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return round(float(value), 1)
+    except (TypeError, ValueError):
+        return None
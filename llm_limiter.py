@@ -0,0 +1,207 @@
+# llm_limiter.py
+"""
+大模型上游调用的限流与重试
+
+- 全局并发上限（LLM_MAX_CONCURRENCY）：超出的调用排队等待，不再一拥而上
+- 令牌桶限速（LLM_RATE_PER_SEC / LLM_RATE_BURST）：按服务商配额匀速放行，0 表示不限速
+- 单次调用超时（LLM_CALL_TIMEOUT 秒）
+- 429 / 5xx / 超时 / 连接错误时按「指数退避 + 全抖动」重试（LLM_MAX_RETRIES 次），
+  响应带 Retry-After 时至少等这么久；429 的 Retry-After 会让令牌桶整体暂停，
+  其他排队的调用也一起等，避免继续撞限流
+- 重试用尽仍失败时抛 LLMUnavailableError，路由据此返回 503 + Retry-After，而不是 500
+
+排队深度、在途数、重试 / 限流 / 超时次数等见 stats()，汇总在 /api/ai/llm-metrics。
+openai 客户端自带的重试要关掉（max_retries=0），统一由这里处理。
+"""
+
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", "0"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", str(max(1, LLM_MAX_CONCURRENCY))))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "90"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))    # 第一次退避的上限（秒）
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "20"))       # 单次退避的上限（秒）
+
+
+class LLMUnavailableError(Exception):
+    """上游限流或持续出错，重试用尽。retry_after 为建议客户端等待的秒数。"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶：rate 个/秒，最多攒 burst 个。rate <= 0 时不限速。"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause_until(self, deadline: float) -> None:
+        """收到 429 + Retry-After 后，deadline（monotonic）之前谁都不放行。"""
+        self._paused_until = max(self._paused_until, deadline)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    return
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """从响应头里取 Retry-After（秒数或 HTTP 日期），也认 retry-after-ms。"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+class LLMLimiter:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rate: float = LLM_RATE_PER_SEC, burst: int = LLM_RATE_BURST,
+                 timeout: float = LLM_CALL_TIMEOUT, max_retries: int = LLM_MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self.waiting = 0
+        self.active = 0
+        self.max_waiting = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0       # 收到 429 的次数
+        self.timeouts = 0
+        self.failures = 0        # 重试用尽或不可重试的失败
+        self._admitted = 0
+        self._wait_total = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        """排队拿到一个并发名额并通过令牌桶后进入；退出时归还名额。"""
+        start = time.monotonic()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+            try:
+                await self._bucket.acquire()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self._admitted += 1
+        self._wait_total += time.monotonic() - start
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def saturated(self) -> bool:
+        """并发名额已用满或已有调用在排队，再发新调用只会排队（给可有可无的后台调用判断用）。"""
+        return self.waiting > 0 or self.active >= self.max_concurrency
+
+    async def call(self, fn: Callable[[], Awaitable[T]], acquire: bool = True) -> T:
+        """
+        带超时和重试地执行 fn。acquire=True 时每次尝试各自排队拿名额，
+        退避等待期间不占名额；流式调用已经在外层持有 slot() 时传 acquire=False。
+        """
+        self.calls += 1
+        attempt = 0
+        while True:
+            try:
+                if acquire:
+                    async with self.slot():
+                        return await asyncio.wait_for(fn(), self.timeout)
+                return await asyncio.wait_for(fn(), self.timeout)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                if isinstance(e, openai.APIStatusError) and e.status_code == 429:
+                    self.throttled += 1
+                retry_after = _retry_after(e)
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    if _is_retryable(e):
+                        raise LLMUnavailableError(f"大模型服务繁忙: {e}", retry_after) from e
+                    raise
+                if retry_after is not None and isinstance(e, openai.APIStatusError) and e.status_code == 429:
+                    self._bucket.pause_until(time.monotonic() + retry_after)
+                delay = random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt))
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rate_per_sec": self._bucket.rate,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "active": self.active,
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "avg_wait_ms": round(self._wait_total / self._admitted * 1000, 1) if self._admitted else 0.0,
+        }
+
+
+llm_limiter = LLMLimiter()
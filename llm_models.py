@@ -0,0 +1,164 @@
+# llm_models.py
+"""
+按接口选择模型，并在超时 / 出错时降级到更快的模型
+
+- 食物热量估算这类短回答用小模型（LLM_FAST_MODEL_NAME），
+  整天食谱 / 训练计划用大模型（LLM_MODEL_NAME），看图估算用视觉模型（LLM_VL_MODEL_NAME）
+- 主模型出错时立刻改用备用模型；主模型超过 SLO 还没返回时，
+  同时向备用模型发起请求，谁先返回用谁（另一个取消）
+- 每个模型记录调用次数、成功率、最近 200 次的延迟分位数；每个接口记录降级次数
+
+每个接口都可以用环境变量覆盖，接口名大写、- 换成 _：
+    LLM_MODEL_MEAL_PLAN=qwen-max
+    LLM_FALLBACK_MEAL_PLAN=qwen-plus     # 设为空字符串则不降级
+    LLM_SLO_MS_MEAL_PLAN=20000
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+LLM_MODEL = os.getenv("LLM_MODEL_NAME", "qwen-max")
+# 默认地址是 DashScope 时小模型用 qwen-turbo，换了服务商则默认和主模型相同
+_DEFAULT_FAST = "qwen-turbo" if "dashscope" in os.getenv("LLM_BASE_URL", "dashscope") else LLM_MODEL
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL_NAME", _DEFAULT_FAST)
+# 看图估算热量用的视觉模型
+LLM_VL_MODEL = os.getenv("LLM_VL_MODEL_NAME", "qwen-vl-max")
+
+LATENCY_WINDOW = 200
+
+
+class ModelRoute:
+    def __init__(self, endpoint: str, model: str, fallback: Optional[str], slo_ms: Optional[int]):
+        env = endpoint.upper().replace("-", "_")
+        self.endpoint = endpoint
+        self.model = os.getenv(f"LLM_MODEL_{env}", model)
+        fallback = os.getenv(f"LLM_FALLBACK_{env}", fallback or "")
+        self.fallback = fallback if fallback and fallback != self.model else None
+        slo = os.getenv(f"LLM_SLO_MS_{env}")
+        self.slo_ms = int(slo) if slo else slo_ms
+
+    def to_dict(self) -> dict:
+        return {"model": self.model, "fallback": self.fallback, "slo_ms": self.slo_ms}
+
+
+ROUTES: Dict[str, ModelRoute] = {
+    r.endpoint: r for r in (
+        ModelRoute("food-calorie", LLM_FAST_MODEL, None, 8000),
+        ModelRoute("food-image", LLM_VL_MODEL, None, None),
+        ModelRoute("meal-plan", LLM_MODEL, LLM_FAST_MODEL, 20000),
+        ModelRoute("workout-plan", LLM_MODEL, LLM_FAST_MODEL, 20000),
+    )
+}
+DEFAULT_ROUTE = ModelRoute("default", LLM_MODEL, None, None)
+
+
+def route_for(endpoint: Optional[str]) -> ModelRoute:
+    return ROUTES.get(endpoint or "", DEFAULT_ROUTE)
+
+
+# ========= 统计 =========
+
+class ModelStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, dict] = {}
+        self._endpoints: Dict[str, dict] = {}
+
+    def record(self, model: str, ok: bool, seconds: float) -> None:
+        with self._lock:
+            m = self._models.setdefault(
+                model, {"calls": 0, "ok": 0, "latencies": deque(maxlen=LATENCY_WINDOW)}
+            )
+            m["calls"] += 1
+            if ok:
+                m["ok"] += 1
+                m["latencies"].append(seconds)
+
+    def record_fallback(self, endpoint: str, reason: str) -> None:
+        with self._lock:
+            e = self._endpoints.setdefault(endpoint, {"error": 0, "slo": 0})
+            e[reason] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            models = {}
+            for name, m in self._models.items():
+                lat = sorted(m["latencies"])
+                models[name] = {
+                    "calls": m["calls"],
+                    "success_rate": round(m["ok"] / m["calls"], 4) if m["calls"] else 0.0,
+                    "p50_ms": _percentile_ms(lat, 0.5),
+                    "p95_ms": _percentile_ms(lat, 0.95),
+                }
+            return {
+                "routes": {name: r.to_dict() for name, r in ROUTES.items()},
+                "models": models,
+                "fallbacks": {k: dict(v) for k, v in self._endpoints.items()},
+            }
+
+
+def _percentile_ms(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return round(sorted_values[idx] * 1000, 1)
+
+
+model_stats = ModelStats()
+
+
+async def _timed(model: str, call: Callable[[str], Awaitable[T]]) -> T:
+    start = time.monotonic()
+    try:
+        result = await call(model)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        model_stats.record(model, False, time.monotonic() - start)
+        raise
+    model_stats.record(model, True, time.monotonic() - start)
+    return result
+
+
+async def call_with_fallback(route: ModelRoute, call: Callable[[str], Awaitable[T]]) -> Tuple[T, str]:
+    """
+    按路由调用 call(model)，返回 (结果, 实际使用的模型)。
+    没有备用模型时就是一次普通调用。
+    """
+    if route.fallback is None:
+        return await _timed(route.model, call), route.model
+
+    primary = asyncio.ensure_future(_timed(route.model, call))
+    backup = None
+    slo = route.slo_ms / 1000 if route.slo_ms else None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=slo)
+        if done:
+            if primary.exception() is None:
+                return primary.result(), route.model
+            model_stats.record_fallback(route.endpoint, "error")
+            return await _timed(route.fallback, call), route.fallback
+
+        # 超过 SLO：主模型继续跑，同时请求备用模型，取先成功的那个
+        model_stats.record_fallback(route.endpoint, "slo")
+        backup = asyncio.ensure_future(_timed(route.fallback, call))
+        pending = {primary, backup}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result(), (route.model if task is primary else route.fallback)
+        # 两个都失败：抛主模型的异常
+        raise primary.exception()
+    finally:
+        for task in (primary, backup):
+            if task is not None and not task.done():
+                task.cancel()
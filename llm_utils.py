@@ -1,32 +1,85 @@
 # llm_utils.py
 """
-大模型通用工具：读取 .env，封装统一的 call_llm、parse_json_from_llm
+大模型通用工具：读取 .env，封装统一的 call_llm、call_llm_async、parse_json_from_llm
+
+- call_llm       同步版本，给脚本 / 同步代码用
+- call_llm_async 异步版本：等待大模型的 5~30s 里不占线程池，
+                 所有请求共用一个 AsyncOpenAI 客户端和一个调好参数的 HTTP 连接池
+- call_llm_json_async  调用 + 解析 JSON + 响应缓存（见 llm_cache），/api/ai/* 路由都用它；
+                       相同 prompt 的并发请求合并成一次调用（见 single_flight）；
+                       输出有小毛病时就地修复（见 json_repair），修不好或不符合响应模型才重新请求
+- stream_llm_json_async 流式调用，数组里每个元素写完整就先产出（见 json_stream），给 SSE 接口用
+- llm_metrics    汇总缓存、限流等运行指标，给 /api/ai/llm-metrics 用
+- llm_http_error 把调用异常转成 HTTPException（限流 / 上游不可用时 503 + Retry-After）
+
+所有异步调用都经过 llm_limiter（并发上限、令牌桶、超时、429/5xx 退避重试）。
+传了 endpoint 的调用按 llm_models 的路由选模型，出错 / 超过 SLO 时降级到备用模型。
 
 依赖:
-    pip install openai python-dotenv
+    pip install openai python-dotenv httpx
 """
 
-import json
+import asyncio
+import base64
+import hashlib
 import os
+import time
+from typing import Any, AsyncIterator, Callable, Optional, Sequence, Tuple, TypeVar
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from fastapi import HTTPException
+from openai import AsyncOpenAI, OpenAI
 
+# llm_cache / llm_limiter / llm_models 在导入时读取配置，先加载 .env
 load_dotenv()
 
+import json_repair
+from json_stream import JsonArrayStream
+from llm_cache import llm_cache, make_cache_key
+from llm_limiter import LLM_CALL_TIMEOUT, LLMUnavailableError, llm_limiter
+from llm_models import LLM_MODEL, call_with_fallback, model_stats, route_for
+from single_flight import SingleFlight
+
 _api_key = os.getenv("LLM_API_KEY")
 if not _api_key:
     raise RuntimeError("缺少环境变量 LLM_API_KEY，请在 .env 中配置")
 
-client = OpenAI(
+_base_url = os.getenv(
+    "LLM_BASE_URL",
+    "https://dashscope.aliyuncs.com/compatible-mode/v1",  # 默认按 Qwen 兼容地址
+)
+
+client = OpenAI(api_key=_api_key, base_url=_base_url, timeout=LLM_CALL_TIMEOUT)
+
+# 异步客户端的连接池：上百个并发生成请求复用少量 keep-alive 连接
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "50"))
+
+async_client = AsyncOpenAI(
     api_key=_api_key,
-    base_url=os.getenv(
-        "LLM_BASE_URL",
-        "https://dashscope.aliyuncs.com/compatible-mode/v1",  # 默认按 Qwen 兼容地址
+    base_url=_base_url,
+    # 重试由 llm_limiter 统一处理（带 Retry-After 和全局暂停），这里不再叠加一层
+    max_retries=0,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=30,
+        ),
+        # 生成整份计划可能要几十秒，读超时放宽，连接超时保持较短
+        timeout=httpx.Timeout(120, connect=10),
     ),
 )
 
-LLM_MODEL = os.getenv("LLM_MODEL_NAME", "qwen-max")
+T = TypeVar("T")
+
+# 输出无法修复成 JSON（或不符合响应模型）时重新请求几次
+LLM_JSON_RETRIES = int(os.getenv("LLM_JSON_RETRIES", "1"))
+_JSON_RETRY_HINT = "\n\n注意：上一次的输出不是合法的 JSON 或缺少字段。请严格按要求只输出一个 JSON，不要有其他文字。"
+
+# 正在进行中的 JSON 调用，按缓存 key 合并
+_json_flights = SingleFlight()
 
 
 def call_llm(system_prompt: str, user_prompt: str, temperature: float = 0.7) -> str:
@@ -42,12 +95,215 @@ def call_llm(system_prompt: str, user_prompt: str, temperature: float = 0.7) ->
     return resp.choices[0].message.content
 
 
-def parse_json_from_llm(text: str) -> dict:
+def _messages(system_prompt: str, user_prompt: str, images: Sequence[bytes] = ()) -> list:
+    """带图片时按 OpenAI 兼容的多模态格式，图片以 data URL（JPEG）内联。"""
+    if not images:
+        content: Any = user_prompt
+    else:
+        content = [
+            {"type": "image_url",
+             "image_url": {"url": "data:image/jpeg;base64," + base64.b64encode(img).decode("ascii")}}
+            for img in images
+        ] + [{"type": "text", "text": user_prompt}]
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content},
+    ]
+
+
+async def call_llm_async(system_prompt: str, user_prompt: str, temperature: float = 0.7,
+                         model: str = LLM_MODEL, images: Sequence[bytes] = ()) -> str:
+    """
+    call_llm 的异步版本，共用 async_client 的连接池，经 llm_limiter 限流、超时和重试。
+    images 是 JPEG 字节，需要视觉模型（见 llm_models 的 food-image 路由）。
+    """
+    resp = await llm_limiter.call(lambda: async_client.chat.completions.create(
+        model=model,
+        messages=_messages(system_prompt, user_prompt, images),
+        temperature=temperature,
+    ))
+    return resp.choices[0].message.content
+
+
+async def stream_llm_async(
+    system_prompt: str, user_prompt: str, temperature: float = 0.7, model: str = LLM_MODEL
+) -> AsyncIterator[str]:
+    """
+    流式调用，逐段产出模型输出的文本。
+    整个流式过程占用一个 llm_limiter 名额；只有建立流（拿到响应头）这一步会重试，
+    开始输出之后出错直接抛出。
+    """
+    async with llm_limiter.slot():
+        stream = await llm_limiter.call(lambda: async_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=temperature,
+            stream=True,
+        ), acquire=False)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+async def aclose_llm_clients() -> None:
+    """应用退出时关闭连接池"""
+    await async_client.close()
+
+
+def parse_json_from_llm(text: str) -> Any:
     """
-    处理 ```json ... ``` 这种包裹格式，并转成 dict
+    从模型输出里取出 JSON：容忍 ```json 包裹、前后的说明文字、尾逗号、
+    中文标点、被截断的结尾等（见 json_repair）。实在修不好时抛 ValueError。
     """
-    cleaned = text.strip()
-    if cleaned.startswith("```"):
-        cleaned = cleaned.strip("`")
-        cleaned = cleaned.replace("json\n", "").replace("json\r\n", "")
-    return json.loads(cleaned)
+    return json_repair.parse_llm_json(text)
+
+
+async def call_llm_json_async(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.7,
+    use_cache: bool = True,
+    endpoint: Optional[str] = None,
+    validate: Optional[Callable[[Any], T]] = None,
+    images: Sequence[bytes] = (),
+) -> Any:
+    """
+    调用大模型并解析 JSON，结果按 (模型, prompt, 图片, temperature) 缓存。
+    use_cache=False 时跳过缓存读取，但新结果仍会写入缓存。
+    只有解析成功的结果才会进缓存。
+    缓存未命中时，同一个 key 正在进行的调用会被复用（同样适用于 use_cache=False，
+    因为在途的调用本身就是新结果）。
+    endpoint 决定用哪个模型（见 llm_models）；降级到备用模型得到的结果不写缓存。
+
+    validate 把解析出的 JSON 转成响应模型（出错时抛 ValueError / TypeError 等），
+    传了就返回它的结果。输出修复不了或转换失败时重新请求，最多 LLM_JSON_RETRIES 次。
+    """
+    route = route_for(endpoint)
+    # 图片按内容摘要参与缓存 key
+    digests = "".join(f"\n[image:{hashlib.sha256(img).hexdigest()}]" for img in images)
+    key = make_cache_key(route.model, system_prompt, user_prompt + digests, temperature)
+    data = await _cache_get(key, use_cache)
+    if data is not None:
+        try:
+            return validate(data) if validate else data
+        except (ValueError, TypeError, AttributeError, KeyError):
+            pass    # 缓存里是旧格式，当作未命中
+
+    async def call(model: str) -> Tuple[Any, Any]:
+        prompt = user_prompt
+        for attempt in range(LLM_JSON_RETRIES + 1):
+            raw = await call_llm_async(system_prompt, prompt, temperature, model=model, images=images)
+            try:
+                data = parse_json_from_llm(raw)
+            except ValueError:
+                if attempt >= LLM_JSON_RETRIES:
+                    raise
+            else:
+                try:
+                    return data, (validate(data) if validate else data)
+                except (ValueError, TypeError, AttributeError, KeyError):
+                    json_repair.record("invalid")
+                    if attempt >= LLM_JSON_RETRIES:
+                        raise
+            json_repair.record("retries")
+            prompt = user_prompt + _JSON_RETRY_HINT
+
+    async def fetch() -> Any:
+        (data, result), model = await call_with_fallback(route, call)
+        if model == route.model:
+            await _cache_put(key, data)
+        return result
+
+    return await _json_flights.do(key, fetch)
+
+
+async def stream_llm_json_async(
+    system_prompt: str,
+    user_prompt: str,
+    array_key: str,
+    temperature: float = 0.7,
+    use_cache: bool = True,
+    endpoint: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    流式版本的 call_llm_json_async，依次产出：
+        ("item", 元素)  顶层 array_key 数组里每写完一个元素就产出一次
+        ("done", 完整 JSON)  模型输出结束后的整体解析结果（解析失败时为 {}）
+    和 call_llm_json_async 共用同一个缓存 key；命中缓存时直接按同样的顺序产出。
+    主模型在输出第一段文本之前出错时改用备用模型；已经开始输出后出错直接抛出。
+    """
+    route = route_for(endpoint)
+    key = make_cache_key(route.model, system_prompt, user_prompt, temperature)
+    data = await _cache_get(key, use_cache)
+    if data is not None:
+        for item in data.get(array_key) or []:
+            yield "item", item
+        yield "done", data
+        return
+
+    models = [route.model] + ([route.fallback] if route.fallback else [])
+    for i, model in enumerate(models):
+        parser = JsonArrayStream(array_key)
+        start = time.monotonic()
+        try:
+            async for delta in stream_llm_async(system_prompt, user_prompt, temperature, model=model):
+                for item in parser.feed(delta):
+                    yield "item", item
+        except Exception:
+            model_stats.record(model, False, time.monotonic() - start)
+            if parser.text or i == len(models) - 1:
+                raise
+            model_stats.record_fallback(route.endpoint, "error")
+            continue
+        model_stats.record(model, True, time.monotonic() - start)
+        break
+
+    try:
+        data = parse_json_from_llm(parser.text)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        yield "done", {}
+        return
+    if model == route.model:
+        await _cache_put(key, data)
+    yield "done", data
+
+
+async def _cache_get(key: str, use_cache: bool):
+    if not use_cache:
+        llm_cache.record_bypass()
+        return None
+    data = llm_cache.get_memory(key)
+    if data is None and llm_cache.has_disk:
+        data = await asyncio.to_thread(llm_cache.get_disk, key)
+    return data
+
+
+async def _cache_put(key: str, data: dict) -> None:
+    if llm_cache.has_disk:
+        await asyncio.to_thread(llm_cache.put, key, data)
+    else:
+        llm_cache.put(key, data)
+
+
+def llm_metrics() -> dict:
+    """大模型调用相关的运行指标"""
+    return {
+        "cache": llm_cache.stats(),
+        "single_flight": _json_flights.stats(),
+        "limiter": llm_limiter.stats(),
+        "models": model_stats.snapshot(),
+        "json": json_repair.repair_stats(),
+    }
+
+
+def llm_http_error(e: Exception) -> HTTPException:
+    """路由里统一把大模型调用异常转成 HTTP 错误。"""
+    if isinstance(e, LLMUnavailableError):
+        headers = {"Retry-After": str(max(1, round(e.retry_after)))} if e.retry_after else None
+        return HTTPException(status_code=503, detail=str(e), headers=headers)
+    return HTTPException(status_code=500, detail=f"LLM 调用失败: {e}")
@@ -0,0 +1,240 @@
+# plan_templates.py
+"""
+食谱 / 训练计划模板缓存
+
+大部分请求只在细节上不同：同样的目标、饮食类型，热量预算差几十 kcal，
+身高体重略有差别。这里把请求归到粗粒度的「桶」里：
+- 食谱：性别、年龄段（10 岁一档）、BMI 分档、活动水平、目标、饮食类型、禁忌、口味、
+        热量预算（按 PLAN_TEMPLATE_KCAL_STEP 取整，即 ±50 kcal）
+- 训练：性别、年龄段、BMI 分档、目标、可用时间（按 PLAN_TEMPLATE_MINUTES_STEP 取整）、
+        每周天数、器械、身体限制
+同一个桶里已经生成过计划时直接拿来用，按精确的热量预算 / 可用时间等比缩放
+（食谱缩放每顿热量和描述里的克数，训练缩放每个小节的时长），不再调大模型。
+
+桶里还没有模板时照常调用大模型，结果存为该桶的模板。打开 PLAN_TEMPLATE_PREFILL 后
+还会在后台生成相邻的桶（热量 ±1 档 / 时间 ±1 档），后面的请求更容易命中。
+预生成每次未命中要多花两次大模型调用，和用户请求抢 llm_limiter 的名额，所以默认关闭；
+打开时同时在生成的不超过 PLAN_TEMPLATE_PREFILL_CONCURRENCY 个，
+llm_limiter 已经满载（有调用在排队）时直接跳过，不排队。
+
+    PLAN_TEMPLATE_SIZE=512        最多保存多少个模板，0 为关闭
+    PLAN_TEMPLATE_TTL=86400       模板有效期（秒）
+    PLAN_TEMPLATE_PREFILL=0       是否在后台生成相邻的桶
+    PLAN_TEMPLATE_PREFILL_CONCURRENCY=1  后台同时生成的模板数上限
+
+请求头 `Cache-Control: no-cache` 同样跳过模板（新结果仍会存为模板）。
+"""
+
+import asyncio
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Set
+
+from llm_limiter import llm_limiter
+
+PLAN_TEMPLATE_SIZE = int(os.getenv("PLAN_TEMPLATE_SIZE", "512"))
+PLAN_TEMPLATE_TTL = float(os.getenv("PLAN_TEMPLATE_TTL", "86400"))
+PLAN_TEMPLATE_KCAL_STEP = int(os.getenv("PLAN_TEMPLATE_KCAL_STEP", "100"))
+PLAN_TEMPLATE_MINUTES_STEP = int(os.getenv("PLAN_TEMPLATE_MINUTES_STEP", "15"))
+PLAN_TEMPLATE_PREFILL = os.getenv("PLAN_TEMPLATE_PREFILL", "0") not in ("0", "false", "")
+PLAN_TEMPLATE_PREFILL_CONCURRENCY = int(os.getenv("PLAN_TEMPLATE_PREFILL_CONCURRENCY", "1"))
+
+
+# ========= 分桶 =========
+
+def _bmi_class(height_cm: float, weight_kg: float) -> str:
+    """按国内标准分档：偏瘦 / 正常 / 超重 / 肥胖。"""
+    if not height_cm:
+        return "unknown"
+    bmi = weight_kg / (height_cm / 100) ** 2
+    if bmi < 18.5:
+        return "under"
+    if bmi < 24:
+        return "normal"
+    if bmi < 28:
+        return "over"
+    return "obese"
+
+
+def _words(values) -> str:
+    return ",".join(sorted({v.strip().lower() for v in values if v.strip()}))
+
+
+def _profile_bucket(profile) -> str:
+    return "|".join([
+        profile.gender.lower(),
+        str(profile.age // 10 * 10),
+        _bmi_class(profile.height, profile.weight),
+        (profile.activity_level or "").lower(),
+    ])
+
+
+def bucket_calories(calories: int) -> int:
+    return max(PLAN_TEMPLATE_KCAL_STEP, round(calories / PLAN_TEMPLATE_KCAL_STEP) * PLAN_TEMPLATE_KCAL_STEP)
+
+
+def bucket_minutes(minutes: int) -> int:
+    return max(PLAN_TEMPLATE_MINUTES_STEP,
+               round(minutes / PLAN_TEMPLATE_MINUTES_STEP) * PLAN_TEMPLATE_MINUTES_STEP)
+
+
+def meal_bucket(profile, prefs) -> str:
+    return "meal|" + "|".join([
+        _profile_bucket(profile),
+        prefs.goal.lower(),
+        (prefs.diet_type or "none").lower(),
+        _words(prefs.restrictions),
+        _words(prefs.tastes),
+        str(bucket_calories(prefs.calories_budget)),
+    ])
+
+
+def workout_bucket(profile, prefs) -> str:
+    return "workout|" + "|".join([
+        _profile_bucket(profile),
+        prefs.goal.lower(),
+        str(bucket_minutes(prefs.available_minutes)),
+        str(prefs.frequency_per_week),
+        _words(prefs.equipment),
+        _words(prefs.limitations),
+    ])
+
+
+# ========= 缩放 =========
+
+# 描述里的分量：150g、200 克、250ml 以及 (220 kcal)
+_AMOUNT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(g|克|ml|毫升|kcal|千卡)(?![a-zA-Z])")
+
+
+def _scale_amounts(text: str, factor: float) -> str:
+    def repl(m: "re.Match") -> str:
+        value = float(m.group(1)) * factor
+        sep = " " if m.group(0)[len(m.group(1)):].startswith(" ") else ""
+        return f"{round(value):d}{sep}{m.group(2)}"
+    return _AMOUNT_RE.sub(repl, text)
+
+
+def rescale_meal_plan(plan: dict, calories_budget: int) -> dict:
+    """把模板（MealPlanResponse 的 dict）等比缩放到 calories_budget。"""
+    plan = copy.deepcopy(plan)
+    total = sum(m["calories"] for m in plan["meals"])
+    factor = calories_budget / total if total else 1.0
+    if abs(factor - 1) > 0.005:
+        for m in plan["meals"]:
+            m["calories"] = round(m["calories"] * factor)
+            m["description"] = _scale_amounts(m["description"], factor)
+    plan["daily_calorie_target"] = calories_budget
+    return plan
+
+
+def rescale_workout_plan(plan: dict, available_minutes: int) -> dict:
+    """把模板（WorkoutPlanResponse 的 dict）的各小节时长按比例调整，总时长不超过 available_minutes。"""
+    plan = copy.deepcopy(plan)
+    sessions = plan["sessions"]
+    total = sum(s["duration_minutes"] for s in sessions)
+    if total and total != available_minutes:
+        factor = available_minutes / total
+        for s in sessions:
+            s["duration_minutes"] = max(1, int(s["duration_minutes"] * factor))
+        # 取整丢掉的分钟补给最长的小节（一般是主训练）
+        rest = available_minutes - sum(s["duration_minutes"] for s in sessions)
+        if rest > 0:
+            max(sessions, key=lambda s: s["duration_minutes"])["duration_minutes"] += rest
+    plan["total_duration"] = sum(s["duration_minutes"] for s in sessions)
+    return plan
+
+
+# ========= 模板存储 =========
+
+class PlanTemplateStore:
+    """内存 LRU + TTL。值是计划的 dict（model_dump 的结果）。"""
+
+    def __init__(self, maxsize: int = PLAN_TEMPLATE_SIZE, ttl: float = PLAN_TEMPLATE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (过期时间, 计划)
+        self._filling: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.fill_errors = 0
+        self.fills_skipped = 0   # 预生成名额已满或 llm_limiter 满载而跳过的次数
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            entry = self._items.get(key)
+            return entry is not None and entry[0] >= time.time()
+
+    def put(self, key: str, plan: dict) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl, plan)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def fill_in_background(self, key: str, generate: Callable[[], Awaitable[dict]]) -> None:
+        """
+        桶里没有模板、也没有正在生成时，起一个后台任务生成并存入。
+        预生成只用空闲的上游容量：名额已满或 llm_limiter 满载时跳过，不排队。
+        """
+        if not (self.enabled and PLAN_TEMPLATE_PREFILL) or key in self._filling or self.contains(key):
+            return
+        if len(self._filling) >= PLAN_TEMPLATE_PREFILL_CONCURRENCY or llm_limiter.saturated():
+            self.fills_skipped += 1
+            return
+        self._filling.add(key)
+
+        async def run():
+            try:
+                self.put(key, await generate())
+                self.fills += 1
+            except Exception:
+                self.fill_errors += 1
+            finally:
+                self._filling.discard(key)
+
+        task = asyncio.ensure_future(run())
+        # 保留引用，避免任务还没跑完就被回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "filling": len(self._filling),
+                "fills": self.fills,
+                "fill_errors": self.fill_errors,
+                "fills_skipped": self.fills_skipped,
+            }
+
+
+plan_templates = PlanTemplateStore()
@@ -0,0 +1,50 @@
+# single_flight.py
+"""
+并发请求合并（single-flight）
+
+同一个 key 的调用正在进行时，后来的调用不再发起新的请求，
+而是等待同一个结果（或同一个异常）。典型场景是很多客户端同时发来
+默认的「一份鸡胸肉沙拉，大概 200g」，只需要调用一次大模型。
+
+实际调用放在独立的 Task 里，并用 asyncio.shield 等待：
+某个等待方断开连接被取消时，不会连带取消其他等待方共享的调用。
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0      # 真正发起调用的次数
+        self.coalesced = 0    # 搭上已有调用的次数
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待方都已取消时，避免 "Task exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        total = self.leaders + self.coalesced
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
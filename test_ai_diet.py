@@ -14,7 +14,10 @@ def test_food_calorie_api():
         "一碗牛肉面，加了一个鸡蛋",
         "星巴克大杯拿铁咖啡",
         "麦当劳巨无霸汉堡套餐",
-        "一个苹果"
+        "一个苹果",
+        # 以下可直接在食物表中解析，不经过大模型
+        "两个鸡蛋",
+        "200g 鸡胸肉",
     ]
     
     print("=" * 60)
@@ -54,5 +57,32 @@ def test_food_calorie_api():
     print("测试完成")
     print("=" * 60)
 
+def test_food_calorie_batch_api():
+    """测试一顿饭批量估算 API"""
+    queries = ["一碗米饭", "两个鸡蛋", "番茄炒蛋一份", "一杯奶茶", "麻辣香锅"]
+
+    print("\n" + "=" * 60)
+    print("批量估算: " + "、".join(queries))
+    print("=" * 60)
+
+    try:
+        response = requests.post(API_URL + "/batch", json={"queries": queries}, timeout=60)
+        if response.status_code == 200:
+            data = response.json()
+            for item in data["items"]:
+                source = "食物表" if item["matched_from_table"] else "AI"
+                print(f"  {item['query']}: {item['name']} {item['calories']} kcal ({source})")
+            totals = data["totals"]
+            print(f"✓ 合计 {totals['calories']} kcal，蛋白质 {totals['protein_g']}g，"
+                  f"脂肪 {totals['fat_g']}g，碳水 {totals['carb_g']}g（大模型估算 {data['llm_items']} 条）")
+        else:
+            print(f"✗ 请求失败: HTTP {response.status_code}")
+            print(f"  错误信息: {response.text}")
+    except requests.exceptions.ConnectionError:
+        print("✗ 连接失败: 请确保后端服务已启动 (python app.py)")
+    except Exception as e:
+        print(f"✗ 发生错误: {e}")
+
 if __name__ == "__main__":
     test_food_calorie_api()
+    test_food_calorie_batch_api()
@@ -4,6 +4,7 @@
 """
 import requests
 import json
+import time
 
 API_URL = "http://localhost:8000"
 
@@ -47,6 +48,75 @@ def test_meal_plan():
     except Exception as e:
         print(f"✗ 错误: {e}")
 
+def test_meal_plan_stream():
+    """测试AI饮食计划流式生成（SSE）"""
+    print_section("测试 AI 饮食计划流式生成")
+
+    data = {
+        "profile": {"gender": "female", "age": 28, "height": 162.0, "weight": 55.0},
+        "preferences": {"goal": "maintain", "calories_budget": 1600}
+    }
+
+    try:
+        start = time.time()
+        events = []
+        with requests.post(f"{API_URL}/api/ai/meal-plan/stream", json=data, stream=True, timeout=60) as response:
+            if response.status_code != 200:
+                print(f"✗ 请求失败: HTTP {response.status_code}")
+                return
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("event:"):
+                    event = line[6:].strip()
+                    events.append(event)
+                    print(f"  {time.time() - start:5.1f}s  {event}")
+        if events and events[-1] == "done":
+            print(f"✓ 流式生成成功，共 {events.count('meal')} 顿")
+        else:
+            print(f"✗ 没有收到 done 事件: {events}")
+    except Exception as e:
+        print(f"✗ 错误: {e}")
+
+def test_meal_plan_restrictions():
+    """测试本地食谱（mode=fast，大模型不可用时的兜底也是它）不会放入过敏 / 忌口的食物"""
+    print_section("测试 食谱禁忌过滤（mode=fast）")
+
+    # 禁忌写法 -> 食谱菜名里不能出现的字
+    cases = {
+        "牛奶过敏": ("奶",),
+        "不吃牛奶": ("奶",),
+        "对虾过敏": ("虾",),
+        "不吃虾": ("虾",),
+        "海鲜过敏": ("虾", "鱼"),
+        "不吃猪肉": ("猪", "五花", "饺子"),
+        "鸡蛋过敏": ("蛋",),
+        "乳糖不耐受": ("奶",),
+    }
+    profile = {"gender": "female", "age": 30, "height": 165.0, "weight": 60.0}
+
+    for restriction, banned in cases.items():
+        data = {
+            "profile": profile,
+            "preferences": {"goal": "gain", "calories_budget": 2600, "restrictions": [restriction]},
+        }
+        try:
+            names = []
+            response = requests.post(f"{API_URL}/api/ai/meal-plan?mode=fast", json=data, timeout=30)
+            if response.status_code == 200:
+                names = [m["name"] for m in response.json()["meals"]]
+            week = requests.post(f"{API_URL}/api/ai/weekly-plan?mode=fast",
+                                 json={"profile": profile, "diet": data["preferences"]}, timeout=30)
+            if response.status_code != 200 or week.status_code != 200:
+                print(f"✗ {restriction}: HTTP {response.status_code} / {week.status_code}")
+                continue
+            names += [m["name"] for d in week.json()["meal_days"] for m in d["plan"]["meals"]]
+            bad = [n for n in names if any(w in n for w in banned)]
+            if bad:
+                print(f"✗ {restriction}: 食谱里出现了 {bad[:3]}")
+            else:
+                print(f"✓ {restriction}: {len(names)} 道菜均未包含 {'/'.join(banned)}")
+        except Exception as e:
+            print(f"✗ {restriction}: {e}")
+
 def test_workout_plan():
     """测试AI运动计划生成"""
     print_section("测试 AI 运动计划生成")
@@ -82,6 +152,59 @@ def test_workout_plan():
     except Exception as e:
         print(f"✗ 错误: {e}")
 
+def test_weekly_plan():
+    """测试一周计划生成（按天并发生成）"""
+    print_section("测试一周计划生成")
+
+    data = {
+        "profile": {"gender": "male", "age": 25, "height": 170.0, "weight": 65.0},
+        "diet": {"goal": "lose", "calories_budget": 1800},
+        "workout": {"goal": "lose", "available_minutes": 45, "frequency_per_week": 3}
+    }
+
+    try:
+        start = time.time()
+        response = requests.post(f"{API_URL}/api/ai/weekly-plan", json=data, timeout=90)
+        if response.status_code == 200:
+            result = response.json()
+            print(f"✓ 一周计划生成成功，用时 {time.time() - start:.1f}s，完整: {result['complete']}")
+            for day in result['meal_days']:
+                names = [m['name'] for m in day['plan']['meals']] if day['plan'] else []
+                print(f"  - {day['day']} [{day['status']}] {' / '.join(names)}")
+            for day in result['workout_days']:
+                print(f"  - {day['day']} 训练 {day['focus']} [{day['status']}]")
+        else:
+            print(f"✗ 请求失败: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"✗ 错误: {e}")
+
+def test_plan_job():
+    """测试后台任务模式（提交后轮询结果）"""
+    print_section("测试后台任务模式")
+
+    data = {
+        "profile": {"gender": "female", "age": 28, "height": 162.0, "weight": 55.0},
+        "preferences": {"goal": "maintain", "calories_budget": 1900}
+    }
+
+    try:
+        response = requests.post(f"{API_URL}/api/ai/jobs/meal-plan?priority=high", json=data, timeout=10)
+        if response.status_code != 202:
+            print(f"✗ 提交失败: HTTP {response.status_code}")
+            return
+        job = response.json()
+        print(f"✓ 任务已提交: {job['id']}")
+        start = time.time()
+        while job['status'] in ('queued', 'running') and time.time() - start < 90:
+            time.sleep(1)
+            job = requests.get(f"{API_URL}{job['status_url']}", timeout=10).json()
+        if job['status'] == 'succeeded':
+            print(f"✓ 任务完成，用时 {time.time() - start:.1f}s，共 {len(job['result']['meals'])} 餐")
+        else:
+            print(f"✗ 任务状态: {job['status']} {job.get('error')}")
+    except Exception as e:
+        print(f"✗ 错误: {e}")
+
 def test_food_calorie():
     """测试AI食物热量识别"""
     print_section("测试 AI 食物热量识别")
@@ -157,6 +280,58 @@ def test_body_data():
     except Exception as e:
         print(f"✗ 错误: {e}")
 
+def test_body_data_bulk():
+    """测试身体数据批量导入 / 导出 / 统计"""
+    print_section("测试身体数据批量导入与统计")
+
+    rows = [
+        {"weight": 66.0 - i * 0.2, "height": 170.0, "gender": "male", "age": 25,
+         "date": f"2025-11-{i + 1:02d}", "time": "07:30"}
+        for i in range(7)
+    ]
+    body = "\n".join(json.dumps(r) for r in rows)
+
+    print("\n1. 批量导入 (NDJSON)")
+    try:
+        response = requests.post(
+            f"{API_URL}/api/user/body-data/bulk",
+            data=body.encode("utf-8"),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        if response.status_code == 200:
+            result = response.json()
+            print(f"✓ 导入成功: {result['imported']} 条 (id {result['first_id']}-{result['last_id']})")
+        else:
+            print(f"✗ 导入失败: HTTP {response.status_code}")
+            print(f"  错误信息: {response.text}")
+    except Exception as e:
+        print(f"✗ 错误: {e}")
+
+    print("\n2. 流式导出")
+    try:
+        response = requests.get(f"{API_URL}/api/user/body-data/export", stream=True)
+        if response.status_code == 200:
+            count = sum(1 for line in response.iter_lines() if line)
+            print(f"✓ 导出成功: {count} 条")
+        else:
+            print(f"✗ 导出失败: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"✗ 错误: {e}")
+
+    print("\n3. 趋势统计")
+    try:
+        response = requests.get(f"{API_URL}/api/user/body-data/stats")
+        if response.status_code == 200:
+            result = response.json()
+            trend = result["trend"]["weight"]
+            print("✓ 获取成功")
+            print(f"  日聚合: {len(result['daily'])} 天, 周聚合: {len(result['weekly'])} 周")
+            print(f"  体重趋势: {trend['slope_per_week']} kg/周 (样本 {trend['n']})")
+        else:
+            print(f"✗ 获取失败: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"✗ 错误: {e}")
+
 def test_api_docs():
     """测试API文档访问"""
     print_section("测试 API 文档")
@@ -188,9 +363,14 @@ def main():
     
     # 运行所有测试
     test_meal_plan()
+    test_meal_plan_stream()
+    test_meal_plan_restrictions()
     test_workout_plan()
+    test_weekly_plan()
+    test_plan_job()
     test_food_calorie()
     test_body_data()
+    test_body_data_bulk()
     test_api_docs()
     
     print("\n" + "=" * 60)
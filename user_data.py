@@ -1,14 +1,27 @@
-from datetime import datetime
+import csv
+from collections import OrderedDict, deque
+from datetime import date, datetime
 import json
 import os
-from typing import List, Optional
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+
+from body_stats import get_stats, on_record_added, on_record_deleted
+from body_store import DEFAULT_USER, USER_ID_PATTERN, get_store
 
 router = APIRouter(prefix="/api/user", tags=["user-data"])
 
-DATA_FILE = "user_body_data.json"
+# 批量导入单次最多接受的行数
+BULK_MAX_ROWS = int(os.getenv("BODY_DATA_BULK_MAX_ROWS", "100000"))
+# 导出时每次从 store 取多少条
+EXPORT_BATCH_SIZE = 500
+# BodyRecord 模型缓存的条数上限，超出后丢掉最久没用的
+MODEL_CACHE_SIZE = int(os.getenv("BODY_DATA_MODEL_CACHE_SIZE", "50000"))
 
 
 class BodyRecordInput(BaseModel):
@@ -22,6 +35,18 @@ class BodyRecordInput(BaseModel):
     age: int
 
 
+class BulkRecordInput(BodyRecordInput):
+    # 设备导出的数据一般带测量时间，不带则按导入时刻
+    date: Optional[str] = Field(None, description="YYYY-MM-DD")
+    time: Optional[str] = Field(None, description="HH:MM")
+
+
+class BulkImportResponse(BaseModel):
+    imported: int
+    first_id: Optional[int] = None
+    last_id: Optional[int] = None
+
+
 class BodyRecord(BodyRecordInput):
     id: int
     date: str
@@ -30,37 +55,91 @@ class BodyRecord(BodyRecordInput):
     whr: Optional[float] = None
 
 
+class MetricAggregate(BaseModel):
+    count: int
+    mean: float
+    min: float
+    max: float
+    last: float
+
+
+class StatsBucket(BaseModel):
+    period: str                                # 2025-11-20 / 2025-W47 / 2025-11
+    metrics: Dict[str, MetricAggregate]        # weight / bmi / whr / body_fat
+
+
+class MovingAveragePoint(BaseModel):
+    date: str
+    ma7: float
+    ma30: float
+
+
+class MetricTrend(BaseModel):
+    n: int
+    slope_per_day: Optional[float] = None      # 线性回归斜率，单位/天
+    slope_per_week: Optional[float] = None
+
+
+class BodyStatsResponse(BaseModel):
+    daily: List[StatsBucket]
+    weekly: List[StatsBucket]
+    monthly: List[StatsBucket]
+    moving_averages: Dict[str, List[MovingAveragePoint]]
+    trend: Dict[str, MetricTrend]
+
+
 class HistoryResponse(BaseModel):
     records: List[BodyRecord]
+    next_after_id: Optional[int] = None    # order=asc 还有下一页时，作为下次请求的 after_id
+    next_before_id: Optional[int] = None   # order=desc 还有下一页时，作为下次请求的 before_id
 
 
-def _load_records() -> List[dict]:
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+def current_user(
+    x_user_id: Optional[str] = Header(None, description="用户标识，不传则为默认用户"),
+) -> str:
+    """从 X-User-Id 请求头取用户标识，每个用户的数据单独分片存储。"""
+    user = x_user_id or DEFAULT_USER
+    if not USER_ID_PATTERN.match(user):
+        raise HTTPException(status_code=400, detail="非法的用户标识")
+    return user
 
 
-def _save_records(records: List[dict]) -> None:
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(records, f, ensure_ascii=False, indent=2)
+# 记录创建后不会再修改、id 也不复用，所以 BodyRecord 按 (用户, id) 缓存一次即可，
+# 历史接口直接返回这些现成的模型，不必每次逐条重新校验。按 LRU 最多保留 MODEL_CACHE_SIZE 条。
+_model_cache: "OrderedDict[Tuple[str, int], BodyRecord]" = OrderedDict()
+_model_cache_lock = threading.Lock()
+_model_stats = {"hits": 0, "misses": 0}
 
 
-@router.post("/body-data", response_model=BodyRecord)
-def save_body_data(data: BodyRecordInput):
-    records = _load_records()
-    new_id = records[-1]["id"] + 1 if records else 1
+def _to_models(user: str, records: List[dict]) -> List[BodyRecord]:
+    models = []
+    with _model_cache_lock:
+        for r in records:
+            key = (user, r["id"])
+            m = _model_cache.get(key)
+            if m is None:
+                m = BodyRecord(**r)
+                _model_cache[key] = m
+                _model_stats["misses"] += 1
+            else:
+                _model_cache.move_to_end(key)
+                _model_stats["hits"] += 1
+            models.append(m)
+        while len(_model_cache) > MODEL_CACHE_SIZE:
+            _model_cache.popitem(last=False)
+    return models
+
 
+def _build_record(data: BodyRecordInput, date_str: str, time_str: str) -> dict:
+    """计算 BMI / 腰臀比并拼出待保存的记录（不含 id）。"""
     bmi = round(data.weight / ((data.height / 100) ** 2), 1)
     whr = None
     if data.waist and data.hip:
         whr = round(data.waist / data.hip, 2)
 
-    now = datetime.now()
-    rec = {
-        "id": new_id,
-        "date": now.date().isoformat(),
-        "time": now.strftime("%H:%M"),
+    return {
+        "date": date_str,
+        "time": time_str,
         "weight": data.weight,
         "height": data.height,
         "chest": data.chest,
@@ -72,22 +151,208 @@ def save_body_data(data: BodyRecordInput):
         "bmi": bmi,
         "whr": whr,
     }
-    records.append(rec)
-    _save_records(records)
-    return rec
+
+
+@router.post("/body-data", response_model=BodyRecord)
+def save_body_data(data: BodyRecordInput, user: str = Depends(current_user)):
+    now = datetime.now()
+    rec = _build_record(data, now.date().isoformat(), now.strftime("%H:%M"))
+    saved = get_store(user).add_record(rec)
+    on_record_added(user, saved)
+    return saved
+
+
+def _parse_bulk_row(row: dict, now: datetime) -> dict:
+    # CSV 里的空单元格当作未填写
+    row = {k: v for k, v in row.items() if v not in ("", None)}
+    data = BulkRecordInput(**row)
+    if data.date is not None:
+        date.fromisoformat(data.date)
+    time_str = now.strftime("%H:%M")
+    if data.time is not None:
+        # 统一成两位数的 HH:MM，按时间排序（趋势统计的 last）才可靠
+        time_str = datetime.strptime(data.time, "%H:%M").strftime("%H:%M")
+    return _build_record(data, data.date or now.date().isoformat(), time_str)
+
+
+class _LineFeed:
+    """
+    给同一个 csv.reader 喂行：只在攒够一条完整记录（引号成对）后才读，
+    所以带引号的多行单元格也能正确解析，而 reader 不会在中途读到空。
+    """
+
+    def __init__(self):
+        self.lines: deque = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def _iter_lines(request: Request):
+    """按块读取请求体并切成行，不把整个请求体读进内存。"""
+    buf = b""
+    async for chunk in request.stream():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buf:
+        yield buf.decode("utf-8-sig").rstrip("\r")
+
+
+@router.post("/body-data/bulk", response_model=BulkImportResponse)
+async def bulk_import_body_data(
+    request: Request,
+    format: Optional[str] = Query(None, description="ndjson / csv，不传则按 Content-Type 判断"),
+    user: str = Depends(current_user),
+):
+    """
+    批量导入体测数据：请求体为 NDJSON（每行一个 JSON 对象）或带表头的 CSV。
+    边读边解析校验，任意一行出错则整批不写入；全部通过后一次性落盘。
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format 只能是 ndjson 或 csv")
+
+    now = datetime.now()
+    rows: List[dict] = []
+    errors: List[str] = []
+    header: Optional[List[str]] = None
+    line_no = 0
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    quotes = 0          # 当前 CSV 记录里已读到的引号数，奇数说明单元格还没结束
+    start_no = 0        # 当前记录开始的行号
+
+    async for line in _iter_lines(request):
+        line_no += 1
+        if fmt == "csv":
+            if not feed.lines:
+                if not line.strip():
+                    continue
+                start_no = line_no
+            feed.lines.append(line + "\n")
+            quotes += line.count('"')
+            if quotes % 2:
+                continue
+            quotes = 0
+        elif not line.strip():
+            continue
+        else:
+            start_no = line_no
+        try:
+            if fmt == "csv":
+                values = next(reader)
+                if header is None:
+                    header = [h.strip() for h in values]
+                    continue
+                raw = dict(zip(header, values))
+            else:
+                raw = json.loads(line)
+                if not isinstance(raw, dict):
+                    raise ValueError("每行必须是一个 JSON 对象")
+            rows.append(_parse_bulk_row(raw, now))
+        except (ValueError, ValidationError, TypeError, csv.Error) as e:
+            errors.append(f"第 {start_no} 行: {e}")
+            if len(errors) >= 20:
+                break
+        if len(rows) > BULK_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"单次最多导入 {BULK_MAX_ROWS} 条")
+
+    if feed.lines and not errors:
+        errors.append(f"第 {start_no} 行: 引号没有闭合")
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    saved = await run_in_threadpool(get_store(user).add_records, rows)
+    for rec in saved:
+        on_record_added(user, rec)
+    return BulkImportResponse(
+        imported=len(saved),
+        first_id=saved[0]["id"] if saved else None,
+        last_id=saved[-1]["id"] if saved else None,
+    )
+
+
+@router.get("/body-data/export")
+def export_body_data(
+    since: Optional[str] = Query(None, description="起始日期 YYYY-MM-DD（含）"),
+    until: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（含）"),
+    user: str = Depends(current_user),
+):
+    """以 NDJSON 流式导出，按游标分批从 store 取数，不在内存里拼整个列表。"""
+    store = get_store(user)
+
+    def generate() -> Iterator[bytes]:
+        after_id = None
+        while True:
+            records, after_id = store.query_records(
+                since=since, until=until, after_id=after_id, limit=EXPORT_BATCH_SIZE
+            )
+            for rec in records:
+                yield (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+            if after_id is None:
+                break
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="body_data.ndjson"'},
+    )
 
 
 @router.get("/body-data/history", response_model=HistoryResponse)
-def get_history():
-    records = _load_records()
-    return {"records": records}
+def get_history(
+    since: Optional[str] = Query(None, description="起始日期 YYYY-MM-DD（含）"),
+    until: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（含）"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页条数，不传则返回全部"),
+    after_id: Optional[int] = Query(None, description="游标：只返回 id 大于它的记录"),
+    before_id: Optional[int] = Query(None, description="游标：只返回 id 小于它的记录"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="asc 从旧到新，desc 从新到旧"),
+    user: str = Depends(current_user),
+):
+    """按 id 分页；desc 时第一页就是最新的记录，翻页用 next_before_id。"""
+    newest_first = order == "desc"
+    records, cursor = get_store(user).query_records(
+        since=since, until=until, after_id=after_id, limit=limit,
+        before_id=before_id, newest_first=newest_first,
+    )
+    if newest_first:
+        return HistoryResponse(records=_to_models(user, records), next_before_id=cursor)
+    return HistoryResponse(records=_to_models(user, records), next_after_id=cursor)
+
+
+@router.get("/body-data/stats", response_model=BodyStatsResponse)
+def get_body_stats(
+    since: Optional[str] = Query(None, description="只返回该日期（含）之后的序列"),
+    user: str = Depends(current_user),
+):
+    """日 / 周 / 月聚合、7/30 日移动平均和线性回归斜率，均为增量维护。"""
+    return get_stats(user).snapshot(since=since)
+
+
+@router.get("/body-data/cache-stats")
+def get_cache_stats(user: str = Depends(current_user)):
+    """记录缓存与 BodyRecord 模型缓存的命中情况，方便观察轮询负载。"""
+    store = get_store(user)
+    with _model_cache_lock:
+        models = dict(_model_stats, cached_models=len(_model_cache))
+    return {
+        "records": store.cache_stats() if hasattr(store, "cache_stats") else None,
+        "models": models,
+    }
 
 
 @router.delete("/body-data/{record_id}")
-def delete_record(record_id: int):
-    records = _load_records()
-    new_records = [r for r in records if r["id"] != record_id]
-    if len(new_records) == len(records):
+def delete_record(record_id: int, user: str = Depends(current_user)):
+    if not get_store(user).delete_record(record_id):
         raise HTTPException(status_code=404, detail="记录不存在")
-    _save_records(new_records)
+    on_record_deleted(user, record_id)
+    with _model_cache_lock:
+        _model_cache.pop((user, record_id), None)
     return {"ok": True}